@@ -0,0 +1,333 @@
+# analytics.py - Spending trends for the financial_insights prompt, computed with NumPy
+#
+# One projected query reads a user's last ANALYTICS_LOOKBACK_DAYS of expenses
+# (date, category_norm, amount). Those fields are all in the
+# user_date_category_amount index, so Mongo can answer from the index alone.
+# The rows become three columnar arrays: day index, amount and category
+# code. Week-over-week deltas, category shares, rolling averages, unusual
+# expenses and spike days are then a few vectorized passes (bincount,
+# cumsum, sort). The result is a small dict of facts, cached per user
+# until that user's next insert. format_facts turns it into prompt lines, so
+# the model quotes real trends instead of inventing them.
+import os
+import time
+import asyncio
+from collections import OrderedDict, defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from renderer import format_inr
+
+ANALYTICS_ENABLED = os.getenv("ANALYTICS_ENABLED", "true").lower() in ("1", "true", "yes")
+# 13 whole weeks: enough history for medians and a trailing 4-week baseline
+ANALYTICS_LOOKBACK_DAYS = int(os.getenv("ANALYTICS_LOOKBACK_DAYS", "91"))
+# Robust z-score (median / MAD within the category) above which an expense counts as unusual
+ANALYTICS_SPIKE_Z = float(os.getenv("ANALYTICS_SPIKE_Z", "4"))
+# Categories need this many expenses before any of them can be called unusual
+ANALYTICS_SPIKE_MIN_COUNT = int(os.getenv("ANALYTICS_SPIKE_MIN_COUNT", "5"))
+# z-score of a day's total against the 28 days before it
+ANALYTICS_SPIKE_DAY_Z = float(os.getenv("ANALYTICS_SPIKE_DAY_Z", "3"))
+ANALYTICS_CACHE_MAX_USERS = int(os.getenv("ANALYTICS_CACHE_MAX_USERS", "2048"))
+# Inserts on other workers don't reach this worker's cache; this bounds how stale it gets
+ANALYTICS_CACHE_TTL_S = float(os.getenv("ANALYTICS_CACHE_TTL_S", "600"))
+# Above this many rows the conversion and math run off the event loop
+ANALYTICS_THREAD_MIN_ROWS = int(os.getenv("ANALYTICS_THREAD_MIN_ROWS", "5000"))
+
+PROJECTION = {"_id": 0, "date": 1, "category_norm": 1, "amount": 1}
+_BASELINE_DAYS = 28
+
+
+class ExpenseColumns(NamedTuple):
+    """A user's expenses as parallel arrays; day 0 is the first day of the window."""
+    day: np.ndarray       # int64
+    amount: np.ndarray    # float64
+    category: np.ndarray  # int64 index into names
+    names: List[str]
+
+
+def to_columns(docs: List[Dict], start: datetime, days: int) -> ExpenseColumns:
+    """Projected expense documents -> ExpenseColumns, dropping anything outside [start, start + days)."""
+    n = len(docs)
+    day = np.fromiter(((d["date"] - start).days for d in docs), dtype=np.int64, count=n)
+    amount = np.fromiter((d.get("amount", 0.0) for d in docs), dtype=np.float64, count=n)
+    codes: Dict[str, int] = {}
+    category = np.fromiter((codes.setdefault(d.get("category_norm") or "miscellaneous", len(codes)) for d in docs),
+                           dtype=np.int64, count=n)
+    keep = (day >= 0) & (day < days)
+    if not keep.all():
+        day, amount, category = day[keep], amount[keep], category[keep]
+    return ExpenseColumns(day, amount, category, list(codes))
+
+
+def _pct_change(current: float, previous: float) -> Optional[float]:
+    return round((current - previous) / previous * 100, 1) if previous > 0 else None
+
+
+def _group_median(values: np.ndarray, groups: np.ndarray, starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Median of values per group; empty groups come out as 0.
+
+    One float sort on group * span + value orders by (group, value), several
+    times faster than np.lexsort; the offset comes back off afterwards.
+    """
+    low = float(values.min())
+    span = float(values.max()) - low + 1.0
+    ordered = np.sort(groups * span + (values - low))
+    offsets = np.arange(len(counts)) * span - low
+    last = len(values) - 1
+    lower, upper = np.clip(starts + (counts - 1) // 2, 0, last), np.clip(starts + counts // 2, 0, last)
+    median = (ordered[lower] + ordered[upper]) / 2 - offsets
+    return np.where(counts > 0, median, 0.0)
+
+
+def compute_facts(columns: ExpenseColumns, start: datetime, days: int = ANALYTICS_LOOKBACK_DAYS,
+                  monthly_income: Optional[float] = None, top: int = 3) -> Dict:
+    """Trend facts over [start, start + days); the last day of the window is "today"."""
+    day, amount, category, names = columns
+    n = len(amount)
+    facts = {"as_of": (start + timedelta(days=days - 1)).date().isoformat(), "lookback_days": days,
+             "transactions": int(n)}
+    if n == 0:
+        return facts
+
+    label = lambda code: names[code].title()  # noqa: E731
+    when = lambda d: (start + timedelta(days=int(d))).strftime("%d %b")  # noqa: E731
+    daily = np.bincount(day, weights=amount, minlength=days)
+    by_category = np.bincount(category * days + day, weights=amount, minlength=len(names) * days) \
+        .reshape(len(names), days)
+
+    # Week over week, month over month
+    week, prev_week = daily[-7:].sum(), daily[-14:-7].sum()
+    month, prev_month = daily[-30:].sum(), daily[-60:-30].sum()
+    facts.update(
+        last_7_days=round(float(week), 2), previous_7_days=round(float(prev_week), 2),
+        week_change_pct=_pct_change(week, prev_week),
+        last_30_days=round(float(month), 2), previous_30_days=round(float(prev_month), 2),
+        month_change_pct=_pct_change(month, prev_month) if days >= 60 else None,
+        weekly_totals=[round(float(w), 2) for w in daily[-(days // 7) * 7:].reshape(-1, 7).sum(axis=1)[-4:]],
+    )
+
+    # Rolling averages: the 7-day window ending today against longer ones
+    cumulative = np.concatenate(([0.0], np.cumsum(daily)))
+    rolling_7 = (cumulative[7:] - cumulative[:-7]) / 7
+    facts["avg_daily"] = {"7d": round(float(rolling_7[-1]), 2), "30d": round(float(month / 30), 2),
+                          f"{days}d": round(float(cumulative[-1] / days), 2),
+                          "7d_high": round(float(rolling_7.max()), 2)}
+
+    # Category shares of the last 30 days, and the biggest weekly movers
+    category_month = by_category[:, -30:].sum(axis=1)
+    order = np.argsort(-category_month)
+    facts["category_shares"] = [
+        {"category": label(c), "total": round(float(category_month[c]), 2),
+         "share_pct": round(float(category_month[c] / month * 100), 1)}
+        for c in order[:top + 2] if category_month[c] > 0]
+    movers = by_category[:, -7:].sum(axis=1) - by_category[:, -14:-7].sum(axis=1)
+    facts["week_movers"] = [{"category": label(c), "change": round(float(movers[c]), 2)}
+                            for c in np.argsort(-np.abs(movers))[:top] if movers[c] != 0]
+
+    # Unusual expenses: robust z-score against the category's median and MAD
+    counts = np.bincount(category, minlength=len(names))
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    median = _group_median(amount, category, starts, counts)
+    deviation = np.abs(amount - median[category])
+    mad = _group_median(deviation, category, starts, counts)
+    # MAD is 0 when most expenses are identical (a daily ₹40 coffee): fall back to 10% of the median
+    scale = np.maximum(1.4826 * mad, 0.1 * median)[category]
+    z = (amount - median[category]) / np.where(scale > 0, scale, np.inf)
+    unusual = np.flatnonzero((day >= days - 30) & (counts[category] >= ANALYTICS_SPIKE_MIN_COUNT)
+                             & (z > ANALYTICS_SPIKE_Z) & (amount >= 2 * median[category]))
+    unusual = unusual[np.argsort(-amount[unusual])][:top]
+    facts["unusual_expenses"] = [
+        {"date": when(day[i]), "category": label(category[i]), "amount": round(float(amount[i]), 2),
+         "times_typical": round(float(amount[i] / median[category[i]]), 1)} for i in unusual]
+
+    # Spike days: a day's total against the mean / std of the 28 days before it
+    squares = np.concatenate(([0.0], np.cumsum(daily * daily)))
+    if days > _BASELINE_DAYS:
+        ends = np.arange(_BASELINE_DAYS, days)
+        mean = (cumulative[ends] - cumulative[ends - _BASELINE_DAYS]) / _BASELINE_DAYS
+        std = np.sqrt(np.maximum((squares[ends] - squares[ends - _BASELINE_DAYS]) / _BASELINE_DAYS - mean ** 2, 0))
+        day_z = (daily[ends] - mean) / np.where(std > 0, std, np.inf)
+        spikes = np.flatnonzero((ends >= days - 30) & (day_z > ANALYTICS_SPIKE_DAY_Z) & (daily[ends] >= 2 * mean))
+        spikes = spikes[np.argsort(-daily[ends[spikes]])][:top]
+        facts["spike_days"] = [{"date": when(ends[i]), "total": round(float(daily[ends[i]]), 2),
+                                "times_avg": round(float(daily[ends[i]] / mean[i]), 1)} for i in spikes]
+
+    if monthly_income:
+        facts["savings_rate_pct"] = round(float((monthly_income - month) / monthly_income * 100), 1)
+    return facts
+
+
+def _signed_inr(amount: float) -> str:
+    return ("+" if amount > 0 else "") + format_inr(round(amount))
+
+
+def _change(pct: Optional[float], versus: str) -> str:
+    return f" ({pct:+.0f}% vs {versus})" if pct is not None else ""
+
+
+def format_facts(facts: Optional[Dict]) -> str:
+    """Compact prompt lines for compute_facts output ("" when there is nothing to say)."""
+    if not facts:
+        return ""
+    if not facts["transactions"]:
+        return f"- No expenses recorded in the last {facts['lookback_days']} days"
+    lines = [
+        f"- Last 7 days: {format_inr(round(facts['last_7_days']))}"
+        f"{_change(facts['week_change_pct'], 'the 7 days before')}",
+        f"- Last 30 days: {format_inr(round(facts['last_30_days']))}"
+        f"{_change(facts['month_change_pct'], 'the previous 30 days')}",
+        f"- Weekly totals, oldest first: {', '.join(format_inr(round(w)) for w in facts['weekly_totals'])}",
+        "- Daily average: " + ", ".join(f"{format_inr(round(v))} over {k}" for k, v in facts["avg_daily"].items()
+                                        if k != "7d_high") + f" (highest 7-day average {format_inr(round(facts['avg_daily']['7d_high']))})",
+    ]
+    if facts["category_shares"]:
+        lines.append("- Share of 30-day spending: "
+                     + ", ".join(f"{s['category']} {s['share_pct']:.0f}%" for s in facts["category_shares"]))
+    if facts["week_movers"]:
+        lines.append("- Biggest changes vs the week before: "
+                     + ", ".join(f"{m['category']} {_signed_inr(m['change'])}" for m in facts["week_movers"]))
+    if facts["unusual_expenses"]:
+        lines.append("- Unusually large expenses: " + ", ".join(
+            f"{format_inr(round(e['amount']))} on {e['category']} on {e['date']} ({e['times_typical']}x typical)"
+            for e in facts["unusual_expenses"]))
+    if facts.get("spike_days"):
+        lines.append("- Spike days: " + ", ".join(
+            f"{s['date']} {format_inr(round(s['total']))} ({s['times_avg']}x the usual day)"
+            for s in facts["spike_days"]))
+    if facts.get("savings_rate_pct") is not None:
+        lines.append(f"- Savings rate this month: {facts['savings_rate_pct']:.0f}% of income")
+    return "\n".join(lines)
+
+
+def fingerprint(facts: Optional[Dict]) -> str:
+    """Coarse summary for LLM cache keys: changes when the trends a reply would mention change."""
+    if not facts or not facts["transactions"]:
+        return "none"
+    tens = lambda pct: "-" if pct is None else str(int(round(pct, -1)))  # noqa: E731
+    return "|".join([tens(facts["week_change_pct"]), tens(facts["month_change_pct"]),
+                     ",".join(s["category"] for s in facts["category_shares"]),
+                     ",".join(e["date"] for e in facts["unusual_expenses"])])
+
+
+# ------------------ Per-user Cache ------------------
+class FactsCache:
+    """Facts per user, valid for one calendar day and until invalidate(user_id).
+
+    Each invalidation bumps the user's version; a computation that started
+    before an insert is not stored, so it can't overwrite newer data. Versions
+    are only kept for users that are cached or have a computation in flight.
+    """
+
+    def __init__(self, max_users: int = ANALYTICS_CACHE_MAX_USERS, ttl_s: float = ANALYTICS_CACHE_TTL_S):
+        self.max_users = max_users
+        self.ttl_s = ttl_s
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._in_flight = defaultdict(int)
+        self.counts = defaultdict(int)
+
+    def get(self, user_id: str, as_of: date) -> Optional[Dict]:
+        entry = self._data.get(user_id)
+        if entry is None or entry[0] != as_of or entry[1] < time.monotonic():
+            self.counts["misses"] += 1
+            return None
+        self._data.move_to_end(user_id)
+        self.counts["hits"] += 1
+        return entry[2]
+
+    def begin(self, user_id: str) -> int:
+        """Register a computation for user_id; returns the version to hand to finish()."""
+        self._in_flight[user_id] += 1
+        return self._versions.setdefault(user_id, 0)
+
+    def finish(self, user_id: str, as_of: date, version: int, facts: Optional[Dict]) -> None:
+        """End a computation from begin(), storing its facts unless the user was invalidated meanwhile."""
+        self._in_flight[user_id] -= 1
+        if not self._in_flight[user_id]:
+            del self._in_flight[user_id]
+        if facts is not None and version == self._versions.get(user_id):
+            self._data[user_id] = (as_of, time.monotonic() + self.ttl_s, facts)
+            self._data.move_to_end(user_id)
+            while len(self._data) > self.max_users:
+                evicted, _ = self._data.popitem(last=False)
+                self._forget(evicted)
+        self._forget(user_id)
+
+    def invalidate(self, user_id: str) -> None:
+        if user_id in self._versions:
+            self._versions[user_id] += 1
+        if self._data.pop(user_id, None) is not None:
+            self.counts["invalidations"] += 1
+        self._forget(user_id)
+
+    def _forget(self, user_id: str) -> None:
+        # Nothing cached and nothing computing: no stale result can arrive, so the version can go
+        if user_id not in self._data and user_id not in self._in_flight:
+            self._versions.pop(user_id, None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+facts_cache = FactsCache()
+
+
+class AnalyticsStats:
+    def __init__(self):
+        self.computed = 0
+        self.rows = 0
+        self.max_rows = 0
+        self.compute_ms = 0.0
+        self.max_compute_ms = 0.0
+
+    def record(self, rows: int, ms: float):
+        self.computed += 1
+        self.rows += rows
+        self.max_rows = max(self.max_rows, rows)
+        self.compute_ms += ms
+        self.max_compute_ms = max(self.max_compute_ms, ms)
+
+    def snapshot(self) -> Dict:
+        return {"enabled": ANALYTICS_ENABLED, "lookback_days": ANALYTICS_LOOKBACK_DAYS,
+                "cached_users": len(facts_cache), **facts_cache.counts, "computed": self.computed,
+                "avg_rows": round(self.rows / self.computed, 1) if self.computed else 0, "max_rows": self.max_rows,
+                "avg_compute_ms": round(self.compute_ms / self.computed, 2) if self.computed else 0,
+                "max_compute_ms": round(self.max_compute_ms, 2)}
+
+
+analytics_stats = AnalyticsStats()
+
+
+def invalidate(user_id: str) -> None:
+    """Call after writing expenses for user_id."""
+    facts_cache.invalidate(user_id)
+
+
+async def user_facts(expenses_collection, user_id: str, monthly_income: Optional[float] = None,
+                     today: Optional[date] = None) -> Optional[Dict]:
+    """compute_facts for the user's last ANALYTICS_LOOKBACK_DAYS, from cache when nothing changed."""
+    if not ANALYTICS_ENABLED:
+        return None
+    today = today or date.today()
+    cached = facts_cache.get(user_id, today)
+    if cached is not None:
+        return cached
+    days = ANALYTICS_LOOKBACK_DAYS
+    start = datetime.combine(today - timedelta(days=days - 1), datetime.min.time())
+
+    def compute(docs):
+        started = time.perf_counter()
+        facts = compute_facts(to_columns(docs, start, days), start, days, monthly_income)
+        analytics_stats.record(len(docs), (time.perf_counter() - started) * 1000)
+        return facts
+
+    version, facts = facts_cache.begin(user_id), None
+    try:
+        docs = await expenses_collection.find(
+            {"user_id": user_id, "date": {"$gte": start, "$lt": start + timedelta(days=days)}}, PROJECTION)
+        facts = await asyncio.to_thread(compute, docs) if len(docs) >= ANALYTICS_THREAD_MIN_ROWS else compute(docs)
+    finally:
+        facts_cache.finish(user_id, today, version, facts)
+    return facts
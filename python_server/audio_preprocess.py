@@ -0,0 +1,177 @@
+# audio_preprocess.py - Decode, trim silence, downmix/resample and re-encode audio before STT
+#
+# Browser recordings arrive as 48 kHz opus/webm, m4a or wav. Whisper only
+# needs 16 kHz mono speech, so we decode once, cut leading/trailing silence
+# with a vectorized energy VAD and re-encode as low-bitrate Opus/Ogg.
+# Decoding reads the upload's file object in chunks; the body is never copied
+# into memory. The stage first demuxes (cheap) to learn the duration, and only
+# decodes when Opus at OPUS_BITRATE is estimated to come out well below the
+# upload's size. Clips that wouldn't shrink, and tiny ones, go to STT as they are.
+# Needs PyAV (installed with faster-whisper); without it audio passes through.
+import io
+import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+AUDIO_PREPROCESS_ENABLED = os.getenv("AUDIO_PREPROCESS_ENABLED", "true").lower() in ("1", "true", "yes")
+TARGET_SAMPLE_RATE = 16000
+# Frames quieter than this many dB below the loudest frame count as silence
+VAD_THRESHOLD_DB = float(os.getenv("VAD_THRESHOLD_DB", "35"))
+VAD_FRAME_MS = 30
+VAD_PADDING_MS = int(os.getenv("VAD_PADDING_MS", "200"))
+OPUS_BITRATE = int(os.getenv("AUDIO_OPUS_BITRATE", "24000"))
+AUDIO_WORKERS = int(os.getenv("AUDIO_WORKERS", "2"))
+# Re-encode only when the estimated Opus output is at most this fraction of the upload
+AUDIO_MAX_OUTPUT_RATIO = float(os.getenv("AUDIO_MAX_OUTPUT_RATIO", "0.8"))
+# Uploads smaller than this go to STT untouched: there is little left to save
+AUDIO_PASSTHROUGH_BYTES = int(os.getenv("AUDIO_PASSTHROUGH_BYTES", "32768"))
+
+_executor: Optional[ThreadPoolExecutor] = None
+# Running totals across requests, for the metrics endpoint
+totals = {"requests": 0, "skipped": 0, "bytes_saved": 0, "seconds_trimmed": 0.0}
+
+
+def _decode(frames) -> np.ndarray:
+    import av
+
+    resampler = av.AudioResampler(format="flt", layout="mono", rate=TARGET_SAMPLE_RATE)
+    chunks = []
+    for frame in frames:
+        for resampled in resampler.resample(frame):
+            chunks.append(resampled.to_ndarray().reshape(-1))
+    for resampled in resampler.resample(None):
+        chunks.append(resampled.to_ndarray().reshape(-1))
+    return np.concatenate(chunks).astype(np.float32) if chunks else np.zeros(0, dtype=np.float32)
+
+
+def decode_to_mono_16k(source) -> np.ndarray:
+    """Decode any container PyAV understands (bytes or a binary file object) into float32 mono samples at 16 kHz."""
+    import av
+
+    with av.open(io.BytesIO(source) if isinstance(source, bytes) else source) as container:
+        return _decode(container.decode(audio=0))
+
+
+def _duration_s(container, stream, packets) -> float:
+    """Clip length from the container header, else from the demuxed packets."""
+    import av
+
+    if container.duration:
+        return container.duration / av.time_base
+    if stream.duration and stream.time_base:
+        return float(stream.duration * stream.time_base)
+    return float(sum(packet.duration or 0 for packet in packets) * stream.time_base)
+
+
+def trim_silence(samples: np.ndarray, sample_rate: int = TARGET_SAMPLE_RATE,
+                 threshold_db: float = VAD_THRESHOLD_DB, padding_ms: int = VAD_PADDING_MS) -> np.ndarray:
+    """Drop leading/trailing frames whose RMS is threshold_db below the loudest frame."""
+    frame = sample_rate * VAD_FRAME_MS // 1000
+    n_frames = len(samples) // frame
+    if n_frames == 0:
+        return samples
+    frames = samples[:n_frames * frame].reshape(n_frames, frame)
+    rms_db = 10 * np.log10(np.mean(frames * frames, axis=1) + 1e-12)
+    voiced = np.flatnonzero(rms_db > rms_db.max() - threshold_db)
+    if voiced.size == 0:
+        return samples[:0]
+    pad = padding_ms * sample_rate // 1000
+    start = max(voiced[0] * frame - pad, 0)
+    end = min((voiced[-1] + 1) * frame + pad, len(samples))
+    return samples[start:end]
+
+
+def encode_opus(samples: np.ndarray, sample_rate: int = TARGET_SAMPLE_RATE, bitrate: int = OPUS_BITRATE) -> bytes:
+    import av
+
+    buffer = io.BytesIO()
+    with av.open(buffer, mode="w", format="ogg") as container:
+        stream = container.add_stream("libopus", rate=sample_rate, layout="mono")
+        stream.bit_rate = bitrate
+        pcm = np.clip(samples * 32767, -32768, 32767).astype(np.int16).reshape(1, -1)
+        frame = av.AudioFrame.from_ndarray(pcm, format="s16", layout="mono")
+        frame.sample_rate = sample_rate
+        for packet in stream.encode(frame):
+            container.mux(packet)
+        for packet in stream.encode(None):
+            container.mux(packet)
+    return buffer.getvalue()
+
+
+def preprocess_file(file) -> Tuple[Optional[bytes], Dict]:
+    """Return (ogg/opus bytes, stats) for one recording read from a binary file object.
+
+    The bytes are None when re-encoding was skipped (stats["skipped"] says
+    why) and b"" when nothing rose above the VAD threshold; either way the
+    caller should send the original file to STT.
+    """
+    import av
+
+    start = time.perf_counter()
+    file.seek(0, os.SEEK_END)
+    size = file.tell()
+    file.seek(0)
+    stats = {"bytes_in": size, "bytes_out": size, "duration_in_s": None, "duration_out_s": None, "skipped": None}
+
+    def done(encoded: Optional[bytes], reason: Optional[str] = None):
+        if encoded is not None:
+            stats["bytes_out"] = len(encoded)
+        stats.update(skipped=reason, elapsed_ms=round((time.perf_counter() - start) * 1000, 1))
+        return encoded, stats
+
+    if size < AUDIO_PASSTHROUGH_BYTES:
+        return done(None, "small")
+    with av.open(file) as container:
+        stream = container.streams.audio[0]
+        # Demuxing only reads packet headers; decoding is the expensive part
+        packets = list(container.demux(stream))
+        duration = _duration_s(container, stream, packets)
+        stats["duration_in_s"] = stats["duration_out_s"] = round(duration, 2)
+        if duration * OPUS_BITRATE / 8 > size * AUDIO_MAX_OUTPUT_RATIO:
+            return done(None, "low_bitrate")
+        samples = _decode(frame for packet in packets for frame in packet.decode())
+    trimmed = trim_silence(samples)
+    stats["duration_in_s"] = round(len(samples) / TARGET_SAMPLE_RATE, 2)
+    stats["duration_out_s"] = round(len(trimmed) / TARGET_SAMPLE_RATE, 2)
+    if not trimmed.size:
+        return done(b"")
+    encoded = encode_opus(trimmed)
+    if len(encoded) >= size:
+        stats["duration_out_s"] = stats["duration_in_s"]
+        return done(None, "larger")
+    return done(encoded)
+
+
+def preprocess_bytes(data: bytes) -> Tuple[bytes, Dict]:
+    """preprocess_file for an in-memory recording; returns the original bytes when encoding was skipped."""
+    encoded, stats = preprocess_file(io.BytesIO(data))
+    return (data if encoded is None else encoded), stats
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=AUDIO_WORKERS, thread_name_prefix="finvoice-audio")
+    return _executor
+
+
+async def preprocess_upload(filename: str, file) -> Tuple[Optional[Tuple[str, io.BytesIO]], Dict]:
+    """Preprocess an open upload off the event loop.
+
+    Returns a new (filename, file) pair, or None when the original should be
+    sent to STT as it is (file is rewound for that).
+    """
+    encoded, stats = await asyncio.get_running_loop().run_in_executor(_get_executor(), preprocess_file, file)
+    totals["requests"] += 1
+    if not encoded:
+        totals["skipped"] += 1
+        file.seek(0)
+        return None, stats
+    totals["bytes_saved"] += stats["bytes_in"] - stats["bytes_out"]
+    totals["seconds_trimmed"] += stats["duration_in_s"] - stats["duration_out_s"]
+    base = os.path.splitext(os.path.basename(filename or "audio"))[0]
+    return (f"{base}.ogg", io.BytesIO(encoded)), stats
@@ -2,76 +2,111 @@
 import os
 from typing import TypedDict, Optional, List, Dict, Any
 from dotenv import load_dotenv
-import speech_recognition as sr
-from langchain_openai import ChatOpenAI
-from pydantic import BaseModel, Field
-from pymongo import MongoClient
-from datetime import datetime, timedelta
-import dateparser
+from datetime import datetime
 import json
-from openai import OpenAI
 import asyncio
-import re
+import time
+from collections import defaultdict
+from contextvars import ContextVar
 from bson.json_util import dumps
-
-# LangGraph
-from langgraph.graph import StateGraph, START, END
+from datastore import AsyncCollection, create_client, ping_client, close_client, normalize_category, MONGO_DB_NAME
+from indexes import ensure_indexes, ensure_category_norm
+from schemas import ExpenseIntent, RoutedIntent
+from expense_parser import parse_expense, parser_stats
+import time_resolver
+from time_resolver import TimeSpan, find_span, resolve_query_span
+import rollups
+import bulk_import
+import analytics
+import stt
+from audio_preprocess import AUDIO_PREPROCESS_ENABLED, preprocess_upload
+from llm_cache import CachedLLM, bucket_financials, normalize_prompt
+from llm_scheduler import LLMUnavailableError
+from renderer import get_renderer, use_llm_for
+from intent_rules import classify as classify_intent, router_stats, FAST_ROUTE_ENABLED, VALID_ROUTES
+import context
+import metrics
+from context import format_context, is_follow_up, prompt_stats
+from write_queue import write_queue
+import prompts
+from prompts import history_block
+from currency import fix_currency_formatting, CurrencyStreamFixer
+
+# langchain_openai / openai (~1 s) and langgraph are imported where the
+# clients and the graph are built, so tools that only need the helpers here
+# (rollups.py, indexes.py) start quickly; servers build both at startup.
 
 # ------------------ Load Environment ------------------
 load_dotenv()
 
+# "classic": router LLM then structured_llm in expense_manager
+# "single_shot": one structured router call also returns the ExpenseIntent fields
+WORKFLOW_MODE = os.getenv("WORKFLOW_MODE", "classic").lower()
+# Start loading financial data while the router LLM is still deciding
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "true").lower() in ("1", "true", "yes")
+
 # ------------------ Centralized LLM Setup ------------------
 llm_router = None
 llm_advisor = None
 llm_intent = None
 openai_client = None
 structured_llm = None
+routed_llm = None
 
 def initialize_llms():
-    global llm_router, llm_advisor, llm_intent, openai_client, structured_llm
-    
+    global llm_router, llm_advisor, llm_intent, openai_client, structured_llm, routed_llm
+    from langchain_openai import ChatOpenAI
+    from openai import OpenAI
+
+    # Every client goes through CachedLLM (see llm_cache.py for TTL/size settings);
+    # retries are left to llm_scheduler, which sees the shared rate-limit state
     if llm_router is None:
-        llm_router = ChatOpenAI(
+        llm_router = CachedLLM(ChatOpenAI(
             model="gpt-4o-mini", 
             temperature=0,
-            api_key=os.getenv("OPENAI_API_KEY")
-        )
+            api_key=os.getenv("OPENAI_API_KEY"),
+            max_retries=0
+        ), "router")
     
     if llm_advisor is None:
-        llm_advisor = ChatOpenAI(
+        llm_advisor = CachedLLM(ChatOpenAI(
             model="gpt-3.5-turbo", 
             temperature=0.7,
-            api_key=os.getenv("OPENAI_API_KEY")
-        )
+            api_key=os.getenv("OPENAI_API_KEY"),
+            max_retries=0,
+            tags=["advisor"]  # lets stream_message pick out reply tokens
+        ), "advisor")
     
     if llm_intent is None:
-        llm_intent = ChatOpenAI(
+        llm_intent = CachedLLM(ChatOpenAI(
             model="gpt-4o-mini", 
             temperature=0,
-            api_key=os.getenv("OPENAI_API_KEY")
-        )
+            api_key=os.getenv("OPENAI_API_KEY"),
+            max_retries=0
+        ), "intent")
     
     if openai_client is None:
         openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
     
     if structured_llm is None and llm_intent is not None:
-        structured_llm = llm_intent.with_structured_output(ExpenseIntent)
+        structured_llm = CachedLLM(llm_intent.with_structured_output(ExpenseIntent), "expense_intent", ExpenseIntent,
+                                   model=llm_intent.model)
+
+    if routed_llm is None and llm_router is not None:
+        routed_llm = CachedLLM(llm_router.with_structured_output(RoutedIntent), "routed_intent", RoutedIntent,
+                               model=llm_router.model)
 
-# Currency context
-CURRENCY_CONTEXT = "All amounts are in Indian Rupees (₹). Please use ₹ symbol instead of $ and mention rupees instead of dollars. Always use Indian currency format."
+# Prompt templates (and the currency instructions they share) live in prompts.py
 
 # ------------------ Structured Output Models ------------------
-class ExpenseIntent(BaseModel):
-    action: str = Field(description="The action user wants: 'add_expense' or 'query_expense'")
-    amount: Optional[float] = Field(description="Expense amount if mentioned, otherwise null")
-    category: Optional[str] = Field(description="Expense category like Food, Transport, etc. or null")
-    description: Optional[str] = Field(description="Description of the expense or query")
-    date: Optional[str] = Field(description="Date if mentioned, otherwise null")
+# ExpenseIntent lives in schemas.py so the local parser can build it too
 
 # ------------------ State Definition ------------------
 class AgentState(TypedDict):
     user_id: str
     audio_file_path: Optional[str]
+    audio_upload: Optional[tuple]  # (filename, binary file object) streamed straight to STT
+    audio_stats: Optional[dict]
     transcribed_text: Optional[str]
     selected_node: Optional[str]
     db_result: Optional[dict]
@@ -79,41 +114,198 @@ class AgentState(TypedDict):
     final_response: Optional[str]
     should_exit: bool
     conversation_history: List[Dict]
+    context_summary: Optional[str]
+    parsed_intent: Optional[dict]
+    started_at: float  # time.perf_counter() when the request entered the graph
+    timings: List[Dict]
+    prefetch: Optional[Any]  # asyncio.Task loading financial_data speculatively
+
+def context_block(state: AgentState) -> str:
+    """Token-budgeted conversation history for prompts ("" on a first turn)."""
+    return format_context(state.get("conversation_history") or [], state.get("context_summary"))
+
+def router_context_block(state: AgentState) -> str:
+    """context_block for follow-ups only: a standalone message routes (and hits the router cache) without it."""
+    return context_block(state) if is_follow_up(state["transcribed_text"]) else ""
+
+async def summarize_turns(previous: str, turns: List) -> str:
+    """Rolling summary for context.py; runs in the background after a reply."""
+    initialize_llms()
+    messages = "\n".join(f"{'User' if t.role == 'user' else 'FinVoice'}: {t.content}" for t in turns)
+    summary_prompt = prompts.SUMMARY.format_messages(previous=previous or "none", messages=messages)
+    prompt_stats.record("summary", summary_prompt)
+    response = await llm_router.ainvoke(summary_prompt)
+    return response.content.strip()
+
+context.set_summarizer(summarize_turns)
+
+# ------------------ Latency Breakdown ------------------
+class LatencyStats:
+    """Per-node (and prefetch) latency totals across requests."""
+
+    def __init__(self):
+        self.calls = defaultdict(int)
+        self.total_ms = defaultdict(float)
+        self.max_ms = defaultdict(float)
+        self.prefetch = defaultdict(int)
+
+    def record(self, name: str, ms: float):
+        self.calls[name] += 1
+        self.total_ms[name] += ms
+        self.max_ms[name] = max(self.max_ms[name], ms)
+
+    def snapshot(self) -> Dict:
+        nodes = {name: {"calls": calls, "avg_ms": round(self.total_ms[name] / calls, 2),
+                        "max_ms": round(self.max_ms[name], 2)}
+                 for name, calls in sorted(self.calls.items())}
+        return {"nodes": nodes, "prefetch": dict(self.prefetch), "write_queue": write_queue.snapshot()}
+
+latency_stats = LatencyStats()
+
+def record_timing(state: AgentState, name: str, started: float) -> None:
+    """Append {name, start_ms, ms} relative to the request start, so overlapping work shows up."""
+    now = time.perf_counter()
+    ms = (now - started) * 1000
+    latency_stats.record(name, ms)
+    state["timings"].append({"name": name, "start_ms": round((started - state["started_at"]) * 1000, 1),
+                             "ms": round(ms, 1)})
+
+def timed_node(name: str, node):
+    """Per-request timings plus metrics.py histograms/spans for one graph node."""
+    async def run(state: AgentState) -> AgentState:
+        started = time.perf_counter()
+        try:
+            with metrics.node_scope(name):
+                return await node(state)
+        finally:
+            record_timing(state, name, started)
+    return run
 
 # ------------------ Database Setup ------------------
-MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
+# Pool size, timeouts and driver selection are configured in datastore.py
 client = None
 db = None
+db_driver = None
+db_native = False
 expenses_collection = None
 goals_collection = None
+rollups_collection = None
+migrations_collection = None
+
+# A sync-wrapper call's own collections (see run_on_new_loop); None means the shared ones below
+_scoped_collections: ContextVar[Optional[Dict[str, AsyncCollection]]] = ContextVar("scoped_collections",
+                                                                                    default=None)
+
+def _open_collections(mongo_client, native: bool) -> Dict[str, AsyncCollection]:
+    database = mongo_client[MONGO_DB_NAME]
+    # "migrations" holds one marker document per completed data migration (see rollups.ensure_backfilled)
+    return {name: AsyncCollection(database[name], native)
+            for name in ("expenses", "goals", "expense_rollups", "migrations")}
 
 def initialize_database():
-    global client, db, expenses_collection, goals_collection
+    global client, db, db_driver, db_native, expenses_collection, goals_collection, rollups_collection
+    global migrations_collection
     
     if client is None:
-        client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=3000)
-        db = client["finvoice"]
-        expenses_collection = db["expenses"]
-        goals_collection = db["goals"]
+        client, db_driver, native = create_client()
+        db_native = native
+        db = client[MONGO_DB_NAME]
+        shared = _open_collections(client, native)
+        expenses_collection = shared["expenses"]
+        goals_collection = shared["goals"]
+        rollups_collection = shared["expense_rollups"]
+        migrations_collection = shared["migrations"]
+        print(f"🗄 MongoDB driver: {db_driver}")
+
+def collection(name: str) -> AsyncCollection:
+    """The named collection for the running call: a sync wrapper's own client, else the shared one."""
+    scoped = _scoped_collections.get()
+    if scoped is not None:
+        return scoped[name]
+    initialize_database()
+    return {"expenses": expenses_collection, "goals": goals_collection, "expense_rollups": rollups_collection,
+            "migrations": migrations_collection}[name]
+
+async def ping_database() -> None:
+    initialize_database()
+    await ping_client(client, db_native)
+
+async def ensure_database_indexes() -> List[str]:
+    initialize_database()
+    return await ensure_indexes({
+        "expenses": collection("expenses"),
+        "goals": collection("goals"),
+        "expense_rollups": collection("expense_rollups")
+    })
+
+async def migrate_database() -> int:
+    """Set category_norm on expenses that predate it; category filters match only that field."""
+    initialize_database()
+    return await ensure_category_norm(collection("expenses"), collection("migrations"))
+
+async def backfill_rollups() -> int:
+    """Build the daily rollups from existing expenses once; summaries read raw expenses until then."""
+    initialize_database()
+    return await rollups.ensure_backfilled(collection("expenses"), collection("expense_rollups"),
+                                           collection("migrations"))
 
 def resolve_date(date_str: Optional[str]) -> datetime:
-    if not date_str:
-        return datetime.now()
+    """Expense date for a spoken phrase; unknown phrases mean "now" (see time_resolver.py)."""
     try:
-        parsed_date = dateparser.parse(date_str, settings={"PREFER_DATES_FROM": "past"})
-        return parsed_date if parsed_date else datetime.now()
-    except:
+        return time_resolver.resolve_date(date_str) or datetime.now()
+    except Exception:
         return datetime.now()
 
-def get_user_expenses_summary(user_id: str, category: Optional[str] = None, time_period: int = 7) -> Dict:
+async def record_expense(expense_doc: Dict) -> None:
+    """Insert an expense and fold it into the daily rollups."""
+    initialize_database()
+    await collection("expenses").insert_one(expense_doc)
+    analytics.invalidate(expense_doc["user_id"])
+    if rollups.ROLLUPS_ENABLED:
+        await rollups.apply_expense(collection("expense_rollups"), expense_doc)
+
+async def import_expenses(user_id: str, lines, fmt: str = "csv") -> Dict:
+    """Bulk import a stream of CSV / JSON lines (see bulk_import.py)."""
+    initialize_database()
+    try:
+        return await bulk_import.import_rows(lines, fmt, user_id, collection("expenses"),
+                                             collection("expense_rollups"))
+    finally:
+        analytics.invalidate(user_id)
+
+async def get_user_expenses_summary(user_id: str, category: Optional[str] = None, time_period: int = 7,
+                                    span: Optional[TimeSpan] = None) -> Dict:
+    """Spending over the last `time_period` days, or over `span` when given."""
     initialize_database()
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=time_period)
+    if span is not None:
+        time_period = span.days
+    # Calendar ranges that don't end today ("in september") are labelled by name
+    period_label = span.label if span is not None and not span.trailing else None
+    if rollups.reads_enabled():
+        if span is not None:
+            results = await rollups.summarize(collection("expense_rollups"), user_id, time_period, category,
+                                              start=span.start, end=span.end)
+        else:
+            results = await rollups.summarize(collection("expense_rollups"), user_id, time_period, category)
+        return {
+            "total_amount": sum(r["total"] for r in results),
+            "transaction_count": sum(r["count"] for r in results),
+            "time_period_days": time_period,
+            "period_label": period_label,
+            "category_queried": category or "all",
+            "top_categories": [{"category": r["category"], "total": r["total"]} for r in results]
+        }
+
+    if span is not None:
+        date_match = {"$gte": span.start, "$lt": span.end}
+    else:
+        # Calendar days like the rollups: today plus the time_period - 1 before it
+        date_match = {"$gte": rollups.window_start(time_period)}
     
     pipeline = [
         {"$match": {
             "user_id": user_id,
-            "date": {"$gte": start_date, "$lte": end_date}
+            "date": date_match
         }},
         {"$group": {
             "_id": "$category",
@@ -124,9 +316,9 @@ def get_user_expenses_summary(user_id: str, category: Optional[str] = None, time
     ]
     
     if category:
-        pipeline[0]["$match"]["category"] = {"$regex": f"^{category}$", "$options": "i"}
+        pipeline[0]["$match"]["category_norm"] = normalize_category(category)
 
-    results = list(expenses_collection.aggregate(pipeline))
+    results = await collection("expenses").aggregate(pipeline)
     
     total_amount = sum(r["total_amount"] for r in results)
     transaction_count = sum(r["count"] for r in results)
@@ -135,94 +327,215 @@ def get_user_expenses_summary(user_id: str, category: Optional[str] = None, time
         "total_amount": total_amount,
         "transaction_count": transaction_count,
         "time_period_days": time_period,
+        "period_label": period_label,
         "category_queried": category or "all",
         "top_categories": [{"category": r["_id"], "total": r["total_amount"]} for r in results]
     }
 
-def get_user_financial_data(user_id: str) -> Dict:
+async def get_user_financial_data(user_id: str) -> Dict:
     initialize_database()
-    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    month_ago = today - timedelta(days=30)
-    
-    monthly_spending = sum(e["amount"] for e in expenses_collection.find({"user_id": user_id, "date": {"$gte": month_ago}}))
+    # The spending query and the goal count are independent: run them together
+    goals_count = collection("goals").count_documents({"user_id": user_id})
+    if rollups.reads_enabled():
+        # 31 calendar days, the same window as the raw query below (since midnight 30 days ago)
+        results, goals_count = await asyncio.gather(rollups.summarize(collection("expense_rollups"), user_id, 31),
+                                                    goals_count)
+        return {
+            "monthly_spending": sum(r["total"] for r in results),
+            "top_categories": [{"_id": r["category"], "total": r["total"]} for r in results[:3]],
+            "goals_count": goals_count
+        }
+
+    month_ago = rollups.window_start(31)
     
+    # One scan: total and top categories computed server-side, only two fields read
     pipeline = [
         {"$match": {"user_id": user_id, "date": {"$gte": month_ago}}},
-        {"$group": {"_id": "$category", "total": {"$sum": "$amount"}}},
-        {"$sort": {"total": -1}},
-        {"$limit": 3}
+        {"$project": {"_id": 0, "category": 1, "amount": 1}},
+        {"$facet": {
+            "total": [{"$group": {"_id": None, "monthly_spending": {"$sum": "$amount"}}}],
+            "top_categories": [
+                {"$group": {"_id": "$category", "total": {"$sum": "$amount"}}},
+                {"$sort": {"total": -1}},
+                {"$limit": 3}
+            ]
+        }}
     ]
-    top_categories = list(expenses_collection.aggregate(pipeline))
-    
-    goals = list(goals_collection.find({"user_id": user_id}).sort("created_at", -1))
+    results, goals_count = await asyncio.gather(collection("expenses").aggregate(pipeline), goals_count)
+    facets = results[0]
     
     return {
-        "monthly_spending": monthly_spending,
-        "top_categories": top_categories,
-        "goals_count": len(goals)
+        "monthly_spending": facets["total"][0]["monthly_spending"] if facets["total"] else 0,
+        "top_categories": facets["top_categories"],
+        "goals_count": goals_count
     }
 
+# ------------------ Speculative Prefetch ------------------
+PREFETCH_ROUTES = {"financial_insights", "goal_advisor"}
+
+def start_prefetch(state: AgentState) -> None:
+    """Load financial data in the background; the user_id is known before the route is."""
+    if not PREFETCH_ENABLED or state.get("prefetch") is not None:
+        return
+    started = time.perf_counter()
+
+    async def fetch():
+        data = await get_user_financial_data(state["user_id"])
+        record_timing(state, "prefetch_financial_data", started)
+        return data
+
+    state["prefetch"] = asyncio.create_task(fetch())
+    latency_stats.prefetch["started"] += 1
+
+def settle_prefetch(state: AgentState) -> None:
+    """Cancel the prefetch once the router picked a node that won't use it."""
+    task = state.get("prefetch")
+    if task is not None and state.get("selected_node") not in PREFETCH_ROUTES:
+        state["prefetch"] = None
+        task.cancel()
+        latency_stats.prefetch["wasted"] += 1
+
+async def load_financial_data(state: AgentState) -> Dict:
+    task, state["prefetch"] = state.get("prefetch"), None
+    if task is not None:
+        try:
+            data = await task
+            latency_stats.prefetch["used"] += 1
+            return data
+        except Exception as e:
+            print(f"⚠ Prefetch failed, querying again: {e}")
+    return await get_user_financial_data(state["user_id"])
+
+async def load_spending_trends(user_id: str) -> Optional[Dict]:
+    """analytics.user_facts, or None so insights still answer from the totals alone."""
+    try:
+        return await analytics.user_facts(collection("expenses"), user_id)
+    except Exception as e:
+        print(f"⚠ Spending trends failed: {e}")
+        return None
+
 # ------------------ Utilities ------------------
-def fix_currency_formatting(text: str) -> str:
-    if not text:
-        return text
-    text = text.replace('$', '₹')
-    text = text.replace('dollars', 'rupees').replace('Dollars', 'Rupees')
-    text = text.replace('USD', 'INR').replace('usd', 'inr')
-    text = re.sub(r'(\d+)\s*rupees', r'₹\1', text, flags=re.IGNORECASE)
-    text = re.sub(r'₹\s*(\d+)', r'₹\1', text)
-    text = re.sub(r'(\d+)\s*\$', r'₹\1', text)
-    return text
+def failure_reply(error: Exception, fallback: str) -> str:
+    """Say "busy, try again" when the model is rate-limited rather than a generic failure."""
+    if isinstance(error, LLMUnavailableError):
+        return get_renderer().busy()
+    return fallback
+
+# ------------------ Node 1: Audio Preprocessing ------------------
+async def audio_preprocess_node(state: AgentState) -> AgentState:
+    """Trim silence and re-encode as 16 kHz mono Opus so the STT upload is smaller."""
+    if not AUDIO_PREPROCESS_ENABLED or not (state.get("audio_upload") or state.get("audio_file_path")):
+        return state
+
+    opened = None
+    try:
+        if state.get("audio_upload"):
+            filename, audio_file = state["audio_upload"]
+        else:
+            filename, audio_file = state["audio_file_path"], open(state["audio_file_path"], "rb")
+            opened = audio_file
+        upload, stats = await preprocess_upload(filename, audio_file)
+        state["audio_stats"] = stats
+        if upload is None:
+            # Not worth re-encoding, or nothing above the VAD threshold: STT gets the original
+            return state
+        state["audio_upload"] = upload
+        print(f"🎚 Audio preprocessed: {stats['bytes_in']} → {stats['bytes_out']} bytes, "
+              f"{stats['duration_in_s']}s → {stats['duration_out_s']}s in {stats['elapsed_ms']}ms")
+    except Exception as e:
+        print(f"⚠ Audio preprocessing skipped: {e}")
+        if state.get("audio_upload"):
+            state["audio_upload"][1].seek(0)
+    finally:
+        if opened is not None:
+            opened.close()
+    return state
 
 # ------------------ Node 2: Speech-to-Text ------------------
-def speech_to_text_node(state: AgentState) -> AgentState:
-    if not state.get("audio_file_path"):
+# Backend (remote whisper-1 or local faster-whisper), concurrency cap and
+# timeout are configured in stt.py
+async def speech_to_text_node(state: AgentState) -> AgentState:
+    if not state.get("audio_file_path") and not state.get("audio_upload"):
         state["final_response"] = "No audio file provided"
         return state
 
     try:
-        initialize_llms()
-        with open(state["audio_file_path"], "rb") as audio_file:
-            transcription = openai_client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file,
-                language="en"
-            )
-        state["transcribed_text"] = transcription.text
-        if os.path.exists(state["audio_file_path"]):
+        state["transcribed_text"] = await stt.transcribe(state.get("audio_upload") or state["audio_file_path"])
+        if state.get("audio_file_path") and os.path.exists(state["audio_file_path"]):
             os.remove(state["audio_file_path"])
+    except asyncio.TimeoutError:
+        print(f"❌ Transcription timed out after {stt.STT_TIMEOUT_S}s")
+        state["final_response"] = "Sorry, transcription took too long. Please try a shorter recording."
     except Exception as e:
         print(f"❌ Transcription failed: {e}")
         state["final_response"] = "Sorry, I couldn't transcribe your audio. Please try again."
     return state
 
 # ------------------ Node 3: Smart Decision Router ------------------
-async def decision_router_node(state: AgentState) -> AgentState:
+def apply_fast_route(state: AgentState) -> bool:
+    """Route without an LLM call when the rule tables are confident."""
     if not state.get("transcribed_text"):
         state["selected_node"] = "conversation_manager"
+        return True
+    if FAST_ROUTE_ENABLED:
+        fast_route, confidence = classify_intent(state["transcribed_text"])
+        if fast_route:
+            router_stats.record_hit(fast_route)
+            state["selected_node"] = fast_route
+            return True
+    return False
+
+async def decision_router_node(state: AgentState) -> AgentState:
+    # Fast path: confident keyword/regex match skips the LLM round trip
+    if apply_fast_route(state):
         return state
+
     try:
         initialize_llms()
-        router_prompt = f"""
-        Analyze the user's request: "{state['transcribed_text']}"
-        Choose one specialist to handle the request.
-        
-        Specialist options:
-        - expense_manager: Use if the user wants to **add, track, or query specific expenses or spending**. Keywords: 'spent', 'expense', 'cost', 'bill', 'money on', 'spending', 'how much'.
-        - financial_insights: Use for general financial questions or trends that require analysis beyond a single transaction. Keywords: 'spending habits', 'savings rate', 'trends', 'most', 'least'.
-        - goal_advisor: Use for questions about financial goals, savings, or investments. Keywords: 'save money', 'budget', 'goals', 'invest'.
-        - conversation_manager: Use for small talk, greetings, or when the intent is unclear. Keywords: 'hello', 'hi', 'how are you', 'thank you'.
-        - exit_handler: Use when the user wants to end the conversation. Keywords: 'goodbye', 'bye', 'see you later'.
-
-        Provide only the name of the chosen specialist node, with no extra text or explanation.
-        """
+        start_prefetch(state)
+        history = router_context_block(state)
+        router_prompt = prompts.ROUTER.format_messages(history=history_block(history),
+                                                       message=state["transcribed_text"])
+        prompt_stats.record("decision_router", router_prompt, history)
         response = await llm_router.ainvoke(router_prompt)
         selected_node = response.content.strip().lower()
-        valid = ["expense_manager","financial_insights","goal_advisor","conversation_manager","exit_handler"]
-        state["selected_node"] = selected_node if selected_node in valid else "conversation_manager"
+        state["selected_node"] = selected_node if selected_node in VALID_ROUTES else "conversation_manager"
     except Exception as e:
         print(f"⚠ Router failed: {e}")
         state["selected_node"] = "conversation_manager"
+    settle_prefetch(state)
+    router_stats.record_miss(state["selected_node"])
+    return state
+
+async def single_shot_router_node(state: AgentState) -> AgentState:
+    """Router for WORKFLOW_MODE=single_shot: picks the specialist and extracts
+    the ExpenseIntent in one structured call, so expense_manager skips parsing."""
+    if apply_fast_route(state):
+        return state
+
+    try:
+        initialize_llms()
+        start_prefetch(state)
+        history = router_context_block(state)
+        router_prompt = prompts.SINGLE_SHOT_ROUTER.format_messages(history=history_block(history),
+                                                                   message=state["transcribed_text"])
+        prompt_stats.record("decision_router", router_prompt, history)
+        routed = await routed_llm.ainvoke(router_prompt)
+        selected_node = routed.selected_node.strip().lower()
+        state["selected_node"] = selected_node if selected_node in VALID_ROUTES else "conversation_manager"
+        if state["selected_node"] == "expense_manager" and routed.action in ("add_expense", "query_expense"):
+            state["parsed_intent"] = {
+                "action": routed.action,
+                "amount": routed.amount,
+                "category": routed.category,
+                "description": routed.description,
+                "date": routed.date
+            }
+    except Exception as e:
+        print(f"⚠ Single-shot router failed: {e}")
+        state["selected_node"] = "conversation_manager"
+    settle_prefetch(state)
+    router_stats.record_miss(state["selected_node"])
     return state
 
 # ------------------ Node 4: Smart Expense Manager ------------------
@@ -234,14 +547,29 @@ async def expense_manager_node(state: AgentState) -> AgentState:
         initialize_database()
 
         try:
-            parsed = await structured_llm.ainvoke(user_text)
-            expense_data = {
-                "action": parsed.action,
-                "amount": parsed.amount,
-                "category": parsed.category,
-                "description": parsed.description,
-                "date": parsed.date
-            }
+            if state.get("parsed_intent"):
+                # Single-shot mode: the router already extracted the intent
+                parser_stats.record("router")
+                expense_data = dict(state["parsed_intent"])
+            else:
+                # Local extractor first; the structured LLM only sees what it can't parse
+                parsed = parse_expense(user_text)
+                if parsed is not None:
+                    parser_stats.record("local")
+                else:
+                    parser_stats.record("llm_fallback")
+                    history = context_block(state)
+                    intent_prompt = prompts.EXPENSE_INTENT.format_messages(history=history_block(history),
+                                                                           message=user_text)
+                    prompt_stats.record("expense_manager", intent_prompt, history)
+                    parsed = await structured_llm.ainvoke(intent_prompt)
+                expense_data = {
+                    "action": parsed.action,
+                    "amount": parsed.amount,
+                    "category": parsed.category,
+                    "description": parsed.description,
+                    "date": parsed.date
+                }
         except Exception as e:
             print(f"❌ Structured parsing failed: {e}. Falling back to default query.")
             expense_data = {
@@ -263,49 +591,46 @@ async def expense_manager_node(state: AgentState) -> AgentState:
             expense_doc = {
                 "user_id": user_id,
                 "amount": float(amount),
-                "category": expense_data.get("category", "Miscellaneous"),
+                "category": expense_data.get("category") or "Miscellaneous",
+                "category_norm": normalize_category(expense_data.get("category")),
                 "description": expense_data.get("description", user_text),
                 "date": resolve_date(expense_data.get("date")),
                 "created_at": datetime.now()
             }
-            expenses_collection.insert_one(expense_doc)
+            await record_expense(expense_doc)
             
-            response_prompt = f"""
-            {CURRENCY_CONTEXT}
-            User added an expense: ₹{amount} for category '{expense_doc['category']}'.
-            Create a short confirmation with an emoji.
-            """
+            if not use_llm_for("expense_manager"):
+                state["final_response"] = get_renderer().expense_added(
+                    float(amount), expense_doc["category"], expense_data.get("date"))
+                return state
+
+            response_prompt = prompts.EXPENSE_ADDED.format_messages(amount=amount, category=expense_doc["category"])
+            prompt_stats.record("expense_manager", response_prompt)
             response = await llm_advisor.ainvoke(response_prompt)
             state["final_response"] = fix_currency_formatting(response.content)
         
         elif action == "query_expense":
             category = expense_data.get("category")
-            time_period = 7
-            text_lower = user_text.lower()
-            if "today" in text_lower:
-                time_period = 1
-            elif "last month" in text_lower:
-                time_period = 30
-            elif "last week" in text_lower:
-                time_period = 7
-
-            summary_data = get_user_expenses_summary(user_id, category, time_period)
+            # The user's own words first, then whatever date phrase the parser extracted
+            span = find_span(user_text) or resolve_query_span(expense_data.get("date"))
+            summary_data = await get_user_expenses_summary(user_id, category, 7, span=span)
+            time_period = summary_data["time_period_days"]
+            period_label = summary_data["period_label"]
             
             if summary_data['total_amount'] == 0:
-                 state["final_response"] = f"You have not spent any money on {category or 'anything'} in the last {time_period} days. Keep it up! 💸"
+                 state["final_response"] = get_renderer().no_spending(time_period, category, period_label)
                  return state
 
-            query_prompt = f"""
-            {CURRENCY_CONTEXT}
-            The user wants to know about their spending.
-            Summary of financial data:
-            - Total amount spent: ₹{summary_data['total_amount']:.2f}
-            - Number of transactions: {summary_data['transaction_count']}
-            - Time period: last {summary_data['time_period_days']} days
-            - Category queried: {summary_data['category_queried']}
-            
-            Generate a concise, helpful response using this summary. Use emojis.
-            """
+            if not use_llm_for("expense_manager"):
+                state["final_response"] = get_renderer().spending_summary(
+                    summary_data["total_amount"], summary_data["transaction_count"], time_period, category,
+                    period_label)
+                return state
+
+            query_prompt = prompts.SPENDING_SUMMARY.format_messages(
+                total_amount=summary_data["total_amount"], transaction_count=summary_data["transaction_count"],
+                period=period_label or f"last {time_period} days", category=summary_data["category_queried"])
+            prompt_stats.record("expense_manager", query_prompt)
             response = await llm_advisor.ainvoke(query_prompt)
             state["final_response"] = fix_currency_formatting(response.content)
         
@@ -313,31 +638,31 @@ async def expense_manager_node(state: AgentState) -> AgentState:
             state["final_response"] = "🤔 I'm not sure. Try 'add expense' or 'show my spending'."
     except Exception as e:
         print(f"❌ Expense node failed: {e}")
-        state["final_response"] = "❌ Sorry, I couldn't process that expense."
+        state["final_response"] = failure_reply(e, "❌ Sorry, I couldn't process that expense.")
     return state
 
 # ------------------ Node 5: Smart Financial Insights ------------------
 async def financial_insights_node(state: AgentState) -> AgentState:
     try:
         initialize_llms()
-        financial_data = get_user_financial_data(state["user_id"])
-        
-        prompt = f"""
-        {CURRENCY_CONTEXT}
-        User said: "{state['transcribed_text']}"
-        
-        Here is the user's financial data for the last 30 days:
-        - Total spending: ₹{financial_data['monthly_spending']:.2f}
-        - Top spending categories: {financial_data['top_categories']}
-
-        Provide some insights based on this data. The response should be under 4 sentences, use emojis, and offer trends or advice.
-        """
+        initialize_database()
+        financial_data, trends = await asyncio.gather(load_financial_data(state),
+                                                      load_spending_trends(state["user_id"]))
+        history = context_block(state)
         
-        response = await llm_advisor.ainvoke(prompt)
+        prompt = prompts.INSIGHTS.format_messages(
+            history=history_block(history), message=state["transcribed_text"],
+            monthly_spending=financial_data["monthly_spending"], top_categories=financial_data["top_categories"],
+            trends=prompts.trends_block(analytics.format_facts(trends)))
+
+        # Keyed per user on bucketed figures so small spending changes still hit
+        cache_key = f"insights|{state['user_id']}|{normalize_prompt(state['transcribed_text'])}|{bucket_financials(financial_data)}|{analytics.fingerprint(trends)}|{normalize_prompt(history)}"
+        prompt_stats.record("financial_insights", prompt, history)
+        response = await llm_advisor.ainvoke(prompt, cache_key=cache_key)
         state["final_response"] = fix_currency_formatting(response.content)
     except Exception as e:
         print(f"❌ Insights failed: {e}")
-        state["final_response"] = "❌ Insights generation failed."
+        state["final_response"] = failure_reply(e, "❌ Insights generation failed.")
     return state
 
 # ------------------ Node 6: Smart Goal Advisor ------------------
@@ -345,57 +670,58 @@ async def goal_advisor_node(state: AgentState) -> AgentState:
     try:
         initialize_llms()
         initialize_database()
-        financial_data = get_user_financial_data(state["user_id"])
-        
-        goal_prompt = f"""
-        {CURRENCY_CONTEXT}
-        User asked: "{state['transcribed_text']}"
-        Here is their recent financial data:
-        - Monthly spending: ₹{financial_data['monthly_spending']:.2f}
-        - Top categories: {financial_data['top_categories']}
+        financial_data = await load_financial_data(state)
+        history = context_block(state)
         
-        Give savings goals, investment advice, or budget tips. Make the response short, encouraging, and with emojis.
-        """
-        
-        response = await llm_advisor.ainvoke(goal_prompt)
+        goal_prompt = prompts.GOAL.format_messages(
+            history=history_block(history), message=state["transcribed_text"],
+            monthly_spending=financial_data["monthly_spending"], top_categories=financial_data["top_categories"])
+
+        cache_key = f"goal|{state['user_id']}|{normalize_prompt(state['transcribed_text'])}|{bucket_financials(financial_data)}|{normalize_prompt(history)}"
+        prompt_stats.record("goal_advisor", goal_prompt, history)
+        response = await llm_advisor.ainvoke(goal_prompt, cache_key=cache_key)
         state["final_response"] = fix_currency_formatting(response.content)
         if any(w in state["transcribed_text"].lower() for w in ["save","goal","target"]):
-            goals_collection.insert_one({
+            goal_doc = {
                 "user_id": state["user_id"],
                 "goal_text": state["transcribed_text"],
                 "advice_given": response.content,
                 "created_at": datetime.now()
-            })
+            }
+            # Nothing in the reply depends on this write, so it happens after the response
+            goals = collection("goals")
+            await write_queue.submit("goal", lambda: goals.insert_one(goal_doc))
     except Exception as e:
         print(f"❌ Goal advisor failed: {e}")
-        state["final_response"] = "❌ Goal advice failed."
+        state["final_response"] = failure_reply(e, "❌ Goal advice failed.")
     return state
 
 # ------------------ Node 7: Conversation Manager ------------------
 async def conversation_manager_node(state: AgentState) -> AgentState:
     try:
         initialize_llms()
-        conv_prompt = f"""
-        {CURRENCY_CONTEXT}
-        You are FinVoice, a friendly AI financial assistant.
-        User said: "{state['transcribed_text']}"
-        Reply naturally, under 3 sentences, with emojis. Your goal is to be helpful and direct the user to financial tasks.
-        """
+        history = context_block(state)
+        conv_prompt = prompts.CONVERSATION.format_messages(history=history_block(history),
+                                                           message=state["transcribed_text"])
+        prompt_stats.record("conversation_manager", conv_prompt, history)
         response = await llm_advisor.ainvoke(conv_prompt)
         state["final_response"] = fix_currency_formatting(response.content)
     except Exception as e:
         print(f"❌ Conversation failed: {e}")
-        state["final_response"] = "❌ Conversation failed."
+        state["final_response"] = failure_reply(e, "❌ Conversation failed.")
     return state
 
 # ------------------ Node 8: Exit Handler ------------------
 async def exit_handler_node(state: AgentState) -> AgentState:
     try:
+        if not use_llm_for("exit_handler"):
+            state["final_response"] = get_renderer().goodbye()
+            state["should_exit"] = True
+            return state
+
         initialize_llms()
-        goodbye_prompt = f"""
-        User said: "{state.get('transcribed_text','Goodbye')}"
-        Reply warmly with an emoji, and keep it short.
-        """
+        goodbye_prompt = prompts.GOODBYE.format_messages(message=state.get("transcribed_text") or "Goodbye")
+        prompt_stats.record("exit_handler", goodbye_prompt)
         response = await llm_advisor.ainvoke(goodbye_prompt)
         state["final_response"] = fix_currency_formatting(response.content)
         state["should_exit"] = True
@@ -405,17 +731,28 @@ async def exit_handler_node(state: AgentState) -> AgentState:
     return state
 
 # ------------------ Graph ------------------
-def build_workflow():
+def build_workflow(mode: Optional[str] = None):
+    from langgraph.graph import StateGraph, START, END
+
+    mode = (mode or WORKFLOW_MODE).lower()
+    router = single_shot_router_node if mode == "single_shot" else decision_router_node
+
     workflow = StateGraph(AgentState)
-    workflow.add_node("speech_to_text", speech_to_text_node)
-    workflow.add_node("decision_router", decision_router_node)
-    workflow.add_node("expense_manager", expense_manager_node)
-    workflow.add_node("financial_insights", financial_insights_node)
-    workflow.add_node("goal_advisor", goal_advisor_node)
-    workflow.add_node("conversation_manager", conversation_manager_node)
-    workflow.add_node("exit_handler", exit_handler_node)
-
-    workflow.add_edge(START, "speech_to_text")
+    nodes = {
+        "audio_preprocess": audio_preprocess_node,
+        "speech_to_text": speech_to_text_node,
+        "decision_router": router,
+        "expense_manager": expense_manager_node,
+        "financial_insights": financial_insights_node,
+        "goal_advisor": goal_advisor_node,
+        "conversation_manager": conversation_manager_node,
+        "exit_handler": exit_handler_node
+    }
+    for name, node in nodes.items():
+        workflow.add_node(name, timed_node(name, node))
+
+    workflow.add_edge(START, "audio_preprocess")
+    workflow.add_edge("audio_preprocess", "speech_to_text")
     workflow.add_edge("speech_to_text", "decision_router")
 
     def route(state: AgentState):
@@ -439,7 +776,7 @@ workflow = None
 def initialize_workflow():
     global workflow
     if workflow is None:
-        print("🔄 Initializing workflow...")
+        print(f"🔄 Initializing workflow ({WORKFLOW_MODE} mode)...")
         workflow = build_workflow()
         print("✅ Workflow initialized")
     return workflow
@@ -449,23 +786,46 @@ async def initialize_workflow_async():
     initialize_workflow()
 
 # ------------------ FastAPI Integration Helpers ------------------
+def new_agent_state(user_id: str, message: Optional[str] = None, audio_path: Optional[str] = None,
+                    audio_upload: Optional[tuple] = None, conversation_history: Optional[List[Dict]] = None,
+                    context_summary: Optional[str] = None) -> AgentState:
+    return AgentState(
+        user_id=user_id,
+        audio_file_path=audio_path,
+        audio_upload=audio_upload,
+        audio_stats=None,
+        transcribed_text=message,
+        selected_node=None, # Let the router decide
+        db_result=None,
+        financial_data={},
+        final_response=None,
+        should_exit=False,
+        conversation_history=conversation_history or [],
+        context_summary=context_summary,
+        parsed_intent=None,
+        started_at=time.perf_counter(),
+        timings=[],
+        prefetch=None
+    )
+
+async def prepare_agent_state(user_id: str, **kwargs) -> AgentState:
+    """new_agent_state with the user's recent history loaded from the session store."""
+    history, summary = [], None
+    if context.CONTEXT_ENABLED:
+        try:
+            history, summary = await context.load_context(user_id)
+        except Exception as e:
+            print(f"⚠ Could not load conversation context: {e}")
+    return new_agent_state(user_id, conversation_history=history, context_summary=summary or None, **kwargs)
+
 async def process_message(user_id: str, message: str) -> Dict[str, Any]:
     try:
         if workflow is None:
             initialize_workflow()
-        initial_state = AgentState(
-            user_id=user_id,
-            audio_file_path=None,
-            transcribed_text=message,
-            selected_node=None, # Let the router decide
-            db_result=None,
-            financial_data={},
-            final_response=None,
-            should_exit=False,
-            conversation_history=[]
-        )
+        initial_state = await prepare_agent_state(user_id, message=message)
         final_state = await workflow.ainvoke(initial_state)
-        return {"success": True, "response": final_state.get("final_response","No response"), "user_id": user_id}
+        return {"success": True, "response": final_state.get("final_response","No response"), "user_id": user_id,
+                "timings": final_state.get("timings")}
     except Exception as e:
         return {"success": False, "response": f"Error: {str(e)}", "user_id": user_id}
 
@@ -473,31 +833,80 @@ async def process_message(user_id: str, message: str) -> Dict[str, Any]:
 async def process_message_async(user_id: str, message: str) -> Dict[str, Any]:
     return await process_message(user_id, message)
 
-def process_message_sync(user_id: str, message: str) -> Dict[str, Any]:
+def run_on_new_loop(make_coro):
+    """Run a coroutine to completion on a fresh event loop (the sync wrappers).
+
+    A native async Mongo client belongs to the loop it first ran on, so the
+    call gets a client of its own, scoped to it through a context variable and
+    closed before the loop is. Sync drivers are loop-agnostic and are shared.
+    """
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
+    initialize_database()
+    own_client, token = None, None
+    if db_native:
+        own_client, _, native = create_client()
+        token = _scoped_collections.set(_open_collections(own_client, native))
     try:
-        return loop.run_until_complete(process_message_async(user_id, message))
+        result = loop.run_until_complete(make_coro())
+        # Queued writes belong to this loop; finish them before it closes
+        loop.run_until_complete(write_queue.drain())
+        return result
     finally:
-        loop.close()
+        try:
+            if own_client is not None:
+                loop.run_until_complete(close_client(own_client))
+        finally:
+            if token is not None:
+                _scoped_collections.reset(token)
+            loop.close()
+
+def process_message_sync(user_id: str, message: str) -> Dict[str, Any]:
+    return run_on_new_loop(lambda: process_message_async(user_id, message))
+
+# ------------------ Streaming ------------------
+GRAPH_NODES = {"audio_preprocess", "speech_to_text", "decision_router", *VALID_ROUTES}
+
+async def stream_message(user_id: str, message: str):
+    """Yield node transitions, reply token deltas and a final "done" event.
+
+    Token deltas only come from llm_advisor; template replies arrive in
+    the "done" event, whose response is authoritative.
+    """
+    if workflow is None:
+        initialize_workflow()
+    fixer = CurrencyStreamFixer()
+    final_state = {}
+    try:
+        initial_state = await prepare_agent_state(user_id, message=message)
+        async for event in workflow.astream_events(initial_state, version="v2"):
+            kind = event["event"]
+            if kind == "on_chain_start" and event["name"] in GRAPH_NODES \
+                    and event.get("metadata", {}).get("langgraph_node") == event["name"]:
+                yield {"type": "node", "node": event["name"]}
+            elif kind == "on_chat_model_stream" and "advisor" in event.get("tags", []):
+                delta = fixer.feed(event["data"]["chunk"].content)
+                if delta:
+                    yield {"type": "token", "delta": delta}
+            elif kind == "on_chain_end" and not event.get("parent_ids"):
+                final_state = event["data"].get("output") or {}
+        tail = fixer.flush()
+        if tail:
+            yield {"type": "token", "delta": tail}
+        yield {"type": "done", "success": True, "user_id": user_id,
+               "response": final_state.get("final_response", "No response"), "timings": final_state.get("timings")}
+    except Exception as e:
+        print(f"❌ Streaming failed: {e}")
+        yield {"type": "done", "success": False, "user_id": user_id, "response": f"Error: {str(e)}"}
 
 # ------------------ Audio Processing (Fixed async) ------------------
-async def process_audio_file_async(audio_path: str):
-    """Run full pipeline for an uploaded audio file asynchronously."""
+async def process_audio_file_async(audio_path: Optional[str] = None, audio_upload: Optional[tuple] = None,
+                                   user_id: str = "default_user"):
+    """Run full pipeline for an audio file path or an open (filename, file) upload."""
     try:
         if workflow is None:
             initialize_workflow()
-        initial_state = AgentState(
-            user_id="default_user",
-            audio_file_path=audio_path,
-            transcribed_text=None,
-            selected_node=None,
-            db_result=None,
-            financial_data={},
-            final_response=None,
-            should_exit=False,
-            conversation_history=[]
-        )
+        initial_state = await prepare_agent_state(user_id, audio_path=audio_path, audio_upload=audio_upload)
         final_state = await workflow.ainvoke(initial_state)
         return final_state
     except Exception as e:
@@ -506,9 +915,4 @@ async def process_audio_file_async(audio_path: str):
 
 def process_audio_file(audio_path: str):
     """Sync wrapper for FastAPI endpoints"""
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        return loop.run_until_complete(process_audio_file_async(audio_path))
-    finally:
-        loop.close()
\ No newline at end of file
+    return run_on_new_loop(lambda: process_audio_file_async(audio_path))
\ No newline at end of file
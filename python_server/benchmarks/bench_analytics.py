@@ -0,0 +1,155 @@
+# bench_analytics.py - Spending-trend compute for financial_insights: columnar conversion and NumPy facts
+#
+# Synthesizes one user with N expenses over the analytics window (weekday
+# rhythm, a few categories, two planted unusual expenses and one spike day)
+# and times:
+#   to_columns     projected documents -> ExpenseColumns
+#   compute_facts  every trend fact (target: under 50 ms at 100k expenses)
+# It checks the week/month totals against a plain Python sum, the per-category
+# medians against np.median, and that the planted anomalies are found, and
+# exits non-zero otherwise.
+#
+# --mongo also seeds the expenses collection and times analytics.user_facts
+# cold, cached, and right after an insert. mongomock copies and filters every
+# document in Python (about a minute per 100k-row find), so use a real mongod
+# via --mongo-uri for sizes that large.
+#
+#   python benchmarks/bench_analytics.py --sizes 10000 100000
+#   python benchmarks/bench_analytics.py --sizes 10000 --mongo
+#   python benchmarks/bench_analytics.py --sizes 100000 --mongo --mongo-uri mongodb://localhost:27017/
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import numpy as np
+
+import analytics
+from analytics import compute_facts, format_facts, to_columns
+
+CATEGORIES = {"food": 250.0, "transport": 120.0, "bills": 1500.0, "shopping": 900.0, "entertainment": 400.0,
+              "health": 600.0}
+DAYS = analytics.ANALYTICS_LOOKBACK_DAYS
+TODAY = date(2026, 3, 31)
+START = datetime.combine(TODAY - timedelta(days=DAYS - 1), datetime.min.time())
+
+
+def synthesize(size: int, seed: int = 7):
+    """Projected expense documents, plus the planted unusual amounts and spike day index."""
+    rng = random.Random(seed)
+    names = list(CATEGORIES)
+    docs = []
+    for _ in range(size):
+        day = rng.randrange(DAYS)
+        category = rng.choice(names)
+        # Weekends cost more, and the last week a bit more than usual
+        scale = (1.3 if (START + timedelta(days=day)).weekday() >= 5 else 1.0) * (1.15 if day >= DAYS - 7 else 1.0)
+        docs.append({"date": START + timedelta(days=day, minutes=rng.randrange(1440)), "category_norm": category,
+                     "amount": round(CATEGORIES[category] * scale * rng.uniform(0.6, 1.4), 2)})
+    unusual = [(DAYS - 3, "shopping", 60_000.0), (DAYS - 12, "food", 9_000.0)]
+    for day, category, amount in unusual:
+        docs.append({"date": START + timedelta(days=day, hours=13), "category_norm": category, "amount": amount})
+    # Spike day: one day with five times its usual number of expenses
+    spike_day = DAYS - 20
+    per_day = max(size // DAYS, 1)
+    for _ in range(per_day * 4):
+        category = rng.choice(names)
+        docs.append({"date": START + timedelta(days=spike_day, hours=18), "category_norm": category,
+                     "amount": CATEGORIES[category]})
+    # Out of the window; to_columns must drop them
+    docs.append({"date": START - timedelta(days=1), "category_norm": "food", "amount": 1e9})
+    docs.append({"date": START + timedelta(days=DAYS), "category_norm": "food", "amount": 1e9})
+    rng.shuffle(docs)
+    return docs, unusual, spike_day
+
+
+def check(docs, columns, facts, unusual, spike_day) -> int:
+    failures = []
+    counts = np.bincount(columns.category, minlength=len(columns.names))
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    medians = analytics._group_median(columns.amount, columns.category, starts, counts)
+    for code, name in enumerate(columns.names):
+        expected = np.median(columns.amount[columns.category == code]) if counts[code] else 0.0
+        if abs(medians[code] - expected) > 1e-6:
+            failures.append(f"median of {name}: expected {expected}, got {medians[code]}")
+    in_window = [d for d in docs if START <= d["date"] < START + timedelta(days=DAYS)]
+    week = sum(d["amount"] for d in in_window if (d["date"] - START).days >= DAYS - 7)
+    month = sum(d["amount"] for d in in_window if (d["date"] - START).days >= DAYS - 30)
+    if abs(week - facts["last_7_days"]) > 0.01 or abs(month - facts["last_30_days"]) > 0.01:
+        failures.append(f"totals: expected {week:.2f} / {month:.2f}, got {facts['last_7_days']} / {facts['last_30_days']}")
+    found = {(e["category"].lower(), e["amount"]) for e in facts["unusual_expenses"]}
+    for _, category, amount in unusual:
+        if (category, amount) not in found:
+            failures.append(f"unusual expense {category} ₹{amount:,.0f} not reported")
+    spike = (START + timedelta(days=spike_day)).strftime("%d %b")
+    if spike not in {s["date"] for s in facts.get("spike_days", [])}:
+        failures.append(f"spike day {spike} not reported")
+    for failure in failures:
+        print(f"❌ {failure}")
+    return len(failures)
+
+
+def timed(fn, repeat):
+    times, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - started) * 1000)
+    return result, statistics.median(times), max(times)
+
+
+async def bench_mongo(docs):
+    import backend
+
+    backend.initialize_database()
+    user_id = f"bench_analytics_{len(docs)}"
+    await backend.expenses_collection.insert_many([{**d, "user_id": user_id} for d in docs], ordered=False)
+    analytics.invalidate(user_id)
+    results = {}
+    for label in ("cold", "cached"):
+        started = time.perf_counter()
+        await analytics.user_facts(backend.expenses_collection, user_id, today=TODAY)
+        results[label] = (time.perf_counter() - started) * 1000
+    await backend.expenses_collection.insert_one({"user_id": user_id, "date": START + timedelta(days=DAYS - 1),
+                                                  "category_norm": "food", "amount": 300.0})
+    analytics.invalidate(user_id)
+    started = time.perf_counter()
+    await analytics.user_facts(backend.expenses_collection, user_id, today=TODAY)
+    results["after insert"] = (time.perf_counter() - started) * 1000
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Spending analytics benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--mongo", action="store_true", help="also time analytics.user_facts end to end")
+    parser.add_argument("--mongo-uri", default="mongomock://localhost")
+    parser.add_argument("--show-facts", action="store_true", help="print the prompt lines for the last size")
+    args = parser.parse_args()
+    os.environ["MONGO_URI"] = args.mongo_uri
+
+    failures, facts = 0, None
+    for size in args.sizes:
+        docs, unusual, spike_day = synthesize(size)
+        columns, convert_ms, _ = timed(lambda: to_columns(docs, START, DAYS), args.repeat)
+        facts, compute_ms, compute_max_ms = timed(lambda: compute_facts(columns, START, DAYS), args.repeat)
+        failures += check(docs, columns, facts, unusual, spike_day)
+        print(f"expenses={len(docs):>7}  to_columns {convert_ms:7.2f}ms  compute_facts {compute_ms:6.2f}ms "
+              f"(max {compute_max_ms:.2f}ms) {'✅' if compute_ms < 50 else '❌'} <50ms")
+        if args.mongo:
+            results = asyncio.run(bench_mongo(docs))
+            print("    user_facts " + "  ".join(f"{label} {ms:.1f}ms" for label, ms in results.items()))
+    if args.show_facts and facts:
+        print(format_facts(facts))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
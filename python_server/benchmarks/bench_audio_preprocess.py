@@ -0,0 +1,83 @@
+# bench_audio_preprocess.py - Throughput of the pre-STT audio preprocessing stage
+#
+# Runs decode -> 16 kHz mono -> silence trim -> Opus encode over the clip
+# manifest and reports clips/s, audio seconds processed per wall second and
+# the bytes/duration that no longer have to be uploaded to the STT backend.
+# Clips that wouldn't shrink (see AUDIO_MAX_OUTPUT_RATIO) pass through and
+# are listed with the reason.
+# --concurrency pushes clips through preprocess_upload() the way the API does
+# (bounded by AUDIO_WORKERS) instead of calling preprocess_bytes() inline.
+#
+#   python benchmarks/bench_audio_preprocess.py --repeat 10
+#   AUDIO_WORKERS=4 python benchmarks/bench_audio_preprocess.py --concurrency 8
+import argparse
+import asyncio
+import io
+import json
+import os
+import sys
+import time
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, SERVER_DIR)
+
+DEFAULT_MANIFEST = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "stt_clips.json")
+
+
+async def run(args):
+    import audio_preprocess
+
+    with open(args.manifest, encoding="utf-8") as f:
+        clips = json.load(f)
+    payloads = []
+    for clip in clips:
+        with open(os.path.join(SERVER_DIR, clip["clip"]), "rb") as f:
+            payloads.append((clip["clip"], f.read()))
+
+    # Warm-up so codec initialisation is not counted
+    audio_preprocess.preprocess_bytes(payloads[0][1])
+
+    jobs = payloads * args.repeat
+    results = []
+    wall = time.perf_counter()
+    if args.concurrency <= 1:
+        for _, data in jobs:
+            results.append(audio_preprocess.preprocess_bytes(data)[1])
+    else:
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def one(name, data):
+            async with semaphore:
+                _, stats = await audio_preprocess.preprocess_upload(name, io.BytesIO(data))
+                results.append(stats)
+        await asyncio.gather(*(one(name, data) for name, data in jobs))
+    wall = time.perf_counter() - wall
+
+    bytes_in = sum(r["bytes_in"] for r in results)
+    bytes_out = sum(r["bytes_out"] for r in results)
+    seconds_in = sum(r["duration_in_s"] or 0 for r in results)
+    seconds_out = sum(r["duration_out_s"] or 0 for r in results)
+
+    print(f"clips={len(results)} concurrency={args.concurrency} workers={audio_preprocess.AUDIO_WORKERS} "
+          f"vad_threshold_db={audio_preprocess.VAD_THRESHOLD_DB} opus_bitrate={audio_preprocess.OPUS_BITRATE}")
+    print(f"throughput={len(results) / wall:.1f} clips/s  {seconds_in / wall:.1f} audio-s/s")
+    print(f"bytes in={bytes_in} out={bytes_out} ({bytes_out / bytes_in:.1%} of original)")
+    print(f"audio in={seconds_in:.1f}s out={seconds_out:.1f}s (trimmed {seconds_in - seconds_out:.1f}s)")
+    for name, data in payloads:
+        _, stats = audio_preprocess.preprocess_bytes(data)
+        print(f"  {name:<22} {stats['bytes_in']:>8} -> {stats['bytes_out']:>7} bytes  "
+              f"{stats['duration_in_s']}s -> {stats['duration_out_s']}s  {stats['elapsed_ms']}ms"
+              + (f"  (not re-encoded: {stats['skipped']})" if stats["skipped"] else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Audio preprocessing throughput benchmark")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=1)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
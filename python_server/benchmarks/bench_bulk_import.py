@@ -0,0 +1,111 @@
+# bench_bulk_import.py - Throughput of /api/expenses/bulk's import path
+#
+# Generates a synthetic bank-export CSV (or JSON lines), streams it in 64 KiB
+# chunks through bulk_import.import_rows() exactly as the endpoint does, and
+# reports rows/s. The baseline is the pre-existing write path - one
+# insert_one plus one rollup upsert per expense - timed on a smaller sample.
+# About 1% of rows are deliberately malformed to exercise per-row errors.
+#
+# mongomock has no real indexes, so every rollup upsert scans the rollups
+# collection; the "rollups" time is only meaningful against a real mongod
+# (--mongo-uri). The upsert count is what carries over: one per
+# (day, category) for the bulk path versus one per row before.
+#
+#   python benchmarks/bench_bulk_import.py --rows 100000
+#   python benchmarks/bench_bulk_import.py --mongo-uri mongodb://localhost:27017/ --batch-size 5000
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+MERCHANTS = [("Swiggy order", ""), ("Uber ride", ""), ("BigBasket", ""), ("Electricity bill", "Bills"),
+             ("Amazon", "Shopping"), ("Apollo Pharmacy", "Health"), ("House rent", "Rent"), ("IRCTC", "Travel")]
+
+
+def make_rows(n, seed=11):
+    rng = random.Random(seed)
+    start = datetime(2026, 1, 1)
+    for i in range(n):
+        merchant, category = rng.choice(MERCHANTS)
+        date = (start + timedelta(days=rng.randrange(270))).strftime("%d/%m/%Y")
+        amount = f"{rng.randrange(20, 50000):,}.{rng.randrange(100):02d}"
+        if i % 100 == 99:
+            amount = "n/a"  # malformed on purpose
+        yield date, merchant, amount, category
+
+
+def encode(rows, fmt):
+    if fmt == "csv":
+        lines = ["Txn Date,Narration,Debit,Category"]
+        lines += [f'{d},{m},"{a}",{c}' for d, m, a, c in rows]
+    else:
+        lines = [json.dumps({"date": d, "description": m, "amount": a, "category": c}) for d, m, a, c in rows]
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+async def chunks(body, size=64 * 1024):
+    for i in range(0, len(body), size):
+        yield body[i:i + size]
+
+
+async def run(args):
+    import backend
+    import bulk_import
+    import rollups
+
+    backend.initialize_database()
+    body = encode(make_rows(args.rows), args.format)
+
+    t0 = time.perf_counter()
+    result = await bulk_import.import_rows(bulk_import.iter_lines(chunks(body)), args.format, "bench_bulk",
+                                           backend.expenses_collection, backend.rollups_collection,
+                                           batch_size=args.batch_size)
+    bulk_s = time.perf_counter() - t0
+
+    baseline_docs = []
+    for d, m, a, c in make_rows(args.baseline_rows, seed=12):
+        try:
+            baseline_docs.append(bulk_import.build_expense("bench_single", {"date": d, "description": m,
+                                                                             "amount": a, "category": c}, datetime.now()))
+        except bulk_import.RowError:
+            pass
+    t0 = time.perf_counter()
+    for doc in baseline_docs:
+        await backend.record_expense(doc)
+    single_s = time.perf_counter() - t0
+
+    mismatches = await rollups.check_consistency(backend.expenses_collection, backend.rollups_collection, "bench_bulk")
+    print(f"driver={backend.db_driver} format={args.format} rows={args.rows} batch_size={args.batch_size or bulk_import.BULK_BATCH_SIZE} "
+          f"inflight={bulk_import.BULK_MAX_INFLIGHT} body={len(body) / 2**20:.1f}MiB")
+    print(f"bulk:     {bulk_s:.2f}s  {args.rows / bulk_s:,.0f} rows/s  inserted={result['inserted']} "
+          f"failed={result['failed']} rollup_mismatches={len(mismatches)}")
+    insert_s = bulk_s - result["rollups_ms"] / 1000
+    print(f"          parse+insert {insert_s:.2f}s ({args.rows / insert_s:,.0f} rows/s), "
+          f"rollups {result['rollups_ms'] / 1000:.2f}s for {result['rollup_upserts']} upserts "
+          f"(per-row path: {result['inserted']})")
+    print(f"per-row:  {single_s:.2f}s for {len(baseline_docs)} rows  {len(baseline_docs) / single_s:,.0f} rows/s "
+          f"(~{args.rows / (len(baseline_docs) / single_s):.0f}s for {args.rows} rows)")
+    if mismatches:
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk expense import benchmark")
+    parser.add_argument("--mongo-uri", default="mongomock://localhost")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--format", choices=["csv", "jsonl"], default="csv")
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--baseline-rows", type=int, default=2000)
+    args = parser.parse_args()
+    os.environ["MONGO_URI"] = args.mongo_uri
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
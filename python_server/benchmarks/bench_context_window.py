@@ -0,0 +1,83 @@
+# bench_context_window.py - Prompt size with full history vs the token-budgeted window
+#
+# Plays a long scripted conversation through the session store and, before
+# each turn, measures how many history tokens a prompt would carry if the
+# whole history were pasted in ("naive") versus what context.load_context()
+# returns (last-K turns verbatim + rolling summary, capped at the budget),
+# plus how long building the window takes. Summaries use the extractive
+# fallback, so no LLM is needed.
+#
+#   python benchmarks/bench_context_window.py --turns 60
+#   CONTEXT_TOKEN_BUDGET=300 CONTEXT_RECENT_TURNS=4 python benchmarks/bench_context_window.py
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+SCRIPT = [
+    ("I spent 450 on groceries today", "✅ Added ₹450 under Groceries. Keep tracking! 🛒"),
+    ("how much did I spend on food this week?", "🍔 You spent ₹2,340 on Food across 6 transactions in the last 7 days."),
+    ("and last month?", "📅 Last month your Food spending came to ₹9,870 over 21 transactions."),
+    ("what are my spending habits?", "📊 Food and Transport make up 60% of your spending; weekends are your priciest days."),
+    ("help me save 50000 for a laptop by december",
+     "💻 Setting aside ₹7,000 a month gets you there. Trimming dining out by ₹1,500 would help a lot!"),
+    ("thanks!", "😊 Anytime! Ask me about your expenses or goals whenever you like."),
+]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def run(args):
+    import context
+    import sessions
+
+    store = sessions.InMemorySessionStore(max_turns=args.max_turns)
+    sessions.set_session_store(store)
+    context.set_summarizer(None)
+
+    naive, windowed, build_ms = [], [], []
+    for i in range(args.turns):
+        message, reply = SCRIPT[i % len(SCRIPT)]
+        full = await store.history("bench")
+        naive.append(context.count_tokens(context.format_context([t.to_dict() for t in full], None)))
+
+        t0 = time.perf_counter()
+        history, summary = await context.load_context("bench")
+        block = context.format_context(history, summary)
+        build_ms.append((time.perf_counter() - t0) * 1000)
+        windowed.append(context.count_tokens(block))
+
+        await store.append("bench", "user", message)
+        await store.append("bench", "assistant", reply)
+        await context.refresh_summary("bench")
+
+    print(f"tokenizer={context.tokenizer_name()} budget={context.CONTEXT_TOKEN_BUDGET} "
+          f"recent_turns={context.CONTEXT_RECENT_TURNS} store_max_turns={args.max_turns} turns={args.turns}")
+    print(f"{'':>10} {'mean':>8} {'p95':>8} {'max':>8}")
+    for name, values in (("naive", naive), ("windowed", windowed)):
+        print(f"{name:>10} {sum(values) / len(values):>8.1f} {percentile(values, 95):>8} {max(values):>8}  history tokens")
+    print(f"window build p50={percentile(build_ms, 50):.3f}ms p95={percentile(build_ms, 95):.3f}ms")
+    print(f"final summary: {summary[:160]}{'…' if len(summary) > 160 else ''}")
+    # The budget covers turns and summary; allow a little for the block's header lines
+    if max(windowed) > context.CONTEXT_TOKEN_BUDGET + 40:
+        print("❌ Context window exceeded the token budget")
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Conversation context window benchmark")
+    parser.add_argument("--turns", type=int, default=60)
+    parser.add_argument("--max-turns", type=int, default=1000,
+                        help="Session ring-buffer size; large so 'naive' sees the whole history")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
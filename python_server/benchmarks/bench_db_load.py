@@ -0,0 +1,131 @@
+# bench_db_load.py - Concurrent chat load against the MongoDB data layer
+#
+# Runs the data-access part of an expense/insights/goal turn for many
+# concurrent users against a mongomock stand-in (or a local mongod via
+# --mongo-uri) and reports p50/p99 request latency and event-loop lag.
+# Requests arrive at a fixed rate and latency is measured from the scheduled
+# arrival time, so time spent queued behind a blocked loop is counted.
+#
+#   python benchmarks/bench_db_load.py --rate 100 --db-latency-ms 20
+#   python benchmarks/bench_db_load.py --mode blocking   # old behaviour
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class SlowCollection:
+    """Adds a fixed round-trip delay to every driver call (simulated network)."""
+
+    def __init__(self, collection, delay_s):
+        self._collection = collection
+        self._delay_s = delay_s
+        self.name = collection.name
+
+    def __getattr__(self, item):
+        attr = getattr(self._collection, item)
+        if not callable(attr):
+            return attr
+
+        def wrapper(*args, **kwargs):
+            time.sleep(self._delay_s)
+            return attr(*args, **kwargs)
+        return wrapper
+
+
+async def simulated_chat(backend, user_id, i):
+    if i % 3 == 0:
+        await backend.expenses_collection.insert_one({
+            "user_id": user_id, "amount": 100.0, "category": "Food",
+            "description": "bench", "date": datetime.now(), "created_at": datetime.now(),
+        })
+    elif i % 3 == 1:
+        await backend.get_user_expenses_summary(user_id, None, 7)
+    else:
+        await backend.get_user_financial_data(user_id)
+
+
+async def loop_lag_probe(stop, samples, interval=0.005):
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(time.perf_counter() - t0 - interval)
+
+
+async def run(args):
+    import datastore
+    import backend
+
+    backend.initialize_database()
+    if args.db_latency_ms and not backend.expenses_collection.native:
+        delay = args.db_latency_ms / 1000
+        backend.expenses_collection.collection = SlowCollection(backend.expenses_collection.collection, delay)
+        backend.goals_collection.collection = SlowCollection(backend.goals_collection.collection, delay)
+
+    if args.mode == "blocking":
+        async def inline(fn, *a, **kw):
+            return fn(*a, **kw)
+        datastore.run_blocking = inline
+
+    users = [f"bench_user_{u}" for u in range(args.users)]
+    now = datetime.now()
+    seed = [{
+        "user_id": users[n % len(users)], "amount": float(n % 500), "category": ["Food", "Transport", "Bills"][n % 3],
+        "description": "seed", "date": now - timedelta(days=n % 30), "created_at": now,
+    } for n in range(args.seed)]
+    if seed:
+        await backend.expenses_collection.insert_many(seed)
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies, lag = [], []
+
+    async def one(i, arrival):
+        await asyncio.sleep(max(0.0, arrival - time.perf_counter()))
+        async with semaphore:
+            await simulated_chat(backend, users[i % len(users)], i)
+        latencies.append(time.perf_counter() - arrival)
+
+    stop = asyncio.Event()
+    probe = asyncio.create_task(loop_lag_probe(stop, lag))
+    wall = time.perf_counter()
+    await asyncio.gather(*(one(i, wall + i / args.rate) for i in range(args.requests)))
+    wall = time.perf_counter() - wall
+    stop.set()
+    await probe
+
+    print(f"driver={backend.db_driver} mode={args.mode} rate={args.rate}/s concurrency={args.concurrency} "
+          f"db_latency_ms={args.db_latency_ms} executor_workers={datastore.MONGO_EXECUTOR_WORKERS}")
+    print(f"requests={args.requests} throughput={args.requests / wall:.1f} req/s")
+    print(f"latency p50={percentile(latencies, 50) * 1000:.1f}ms p99={percentile(latencies, 99) * 1000:.1f}ms")
+    print(f"event-loop lag p50={percentile(lag, 50) * 1000:.2f}ms p99={percentile(lag, 99) * 1000:.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MongoDB data layer load benchmark")
+    parser.add_argument("--mongo-uri", default="mongomock://localhost")
+    parser.add_argument("--mode", choices=["async", "blocking"], default="async")
+    parser.add_argument("--requests", type=int, default=600)
+    parser.add_argument("--rate", type=float, default=100.0, help="Request arrivals per second")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=300)
+    parser.add_argument("--db-latency-ms", type=float, default=10.0)
+    args = parser.parse_args()
+    os.environ["MONGO_URI"] = args.mongo_uri
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# bench_expense_parser.py - Regression corpus + parses/sec for the local expense parser
+#
+# Every corpus entry lists the ExpenseIntent fields the parser must return,
+# or null when it must defer to the structured LLM. Exits non-zero on any
+# regression so it can gate changes to expense_parser.py.
+#
+#   python benchmarks/bench_expense_parser.py --repeat 500
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from expense_parser import parse_expense
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "expense_utterances.jsonl")
+FIELDS = ("action", "amount", "category", "date")
+
+
+def check(corpus):
+    failures = []
+    for item in corpus:
+        parsed = parse_expense(item["text"])
+        got = None if parsed is None else {field: getattr(parsed, field) for field in FIELDS}
+        if got != item["expected"]:
+            failures.append((item["text"], item["expected"], got))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local expense parser regression + microbenchmark")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--repeat", type=int, default=500)
+    args = parser.parse_args()
+
+    with open(args.corpus, encoding="utf-8") as f:
+        corpus = [json.loads(line) for line in f if line.strip()]
+
+    failures = check(corpus)
+    parsed_locally = sum(1 for item in corpus if item["expected"] is not None)
+
+    texts = [item["text"] for item in corpus]
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for text in texts:
+            parse_expense(text)
+    elapsed = time.perf_counter() - start
+    total = args.repeat * len(texts)
+
+    print(f"corpus={len(corpus)} local={parsed_locally} llm_fallback={len(corpus) - parsed_locally} "
+          f"regressions={len(failures)}")
+    print(f"throughput={total / elapsed:,.0f} parses/sec ({elapsed / total * 1e6:.1f}us/parse)")
+    for text, expected, got in failures:
+        print(f"  FAIL {text!r}\n    expected={expected}\n    got={got}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+# bench_fanout.py - Insight/goal turn latency: serial I/O vs gather + prefetch + write queue
+#
+# Runs financial_insights / goal_advisor turns (plus some small talk, where
+# the prefetch is wasted) through the compiled graph with the router forced
+# onto the LLM path. LLM clients are fakes that sleep --llm-latency-ms and
+# every Mongo call (mongomock) is delayed by --db-latency-ms, so the numbers
+# show how much I/O is hidden behind the router call.
+#
+# "serial" reproduces the old flow: the two financial-data queries one
+# after the other, no prefetch, goal insert awaited before returning.
+#
+#   python benchmarks/bench_fanout.py --turns 60 --db-latency-ms 20 --llm-latency-ms 150
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+MESSAGES = [
+    ("financial_insights", "what do my spending trends look like"),
+    ("goal_advisor", "help me set a goal to save for a new bike"),
+    ("financial_insights", "where does most of my money go"),
+    ("goal_advisor", "i want a savings target for a trip to goa"),
+    ("conversation_manager", "hello there"),
+]
+
+
+class FakeChat:
+    def __init__(self, latency_s):
+        self.latency_s = latency_s
+
+    async def ainvoke(self, prompt, *args, **kwargs):
+        await asyncio.sleep(self.latency_s)
+        text = str(prompt)
+        if "Choose one specialist" in text:
+            request = text.split('request: "', 1)[1].split('"', 1)[0]
+            return SimpleNamespace(content=next(route for route, message in MESSAGES if message == request))
+        return SimpleNamespace(content="💡 Keep food under ₹5000 and put the rest towards your goal!")
+
+
+async def serial_financial_data(backend, user_id):
+    """The pre-gather implementation: spending query, then the goal count."""
+    month_ago = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=30)
+    facets = (await backend.expenses_collection.aggregate([
+        {"$match": {"user_id": user_id, "date": {"$gte": month_ago}}},
+        {"$facet": {"total": [{"$group": {"_id": None, "monthly_spending": {"$sum": "$amount"}}}],
+                    "top_categories": [{"$group": {"_id": "$category", "total": {"$sum": "$amount"}}},
+                                       {"$sort": {"total": -1}}, {"$limit": 3}]}},
+    ]))[0]
+    return {"monthly_spending": facets["total"][0]["monthly_spending"] if facets["total"] else 0,
+            "top_categories": facets["top_categories"],
+            "goals_count": await backend.goals_collection.count_documents({"user_id": user_id})}
+
+
+async def run_mode(backend, mode, args, fast_financial_data):
+    import write_queue
+
+    serial = mode == "serial"
+    backend.PREFETCH_ENABLED = not serial
+    write_queue.WRITE_QUEUE_ENABLED = not serial
+    backend.get_user_financial_data = (lambda user_id: serial_financial_data(backend, user_id)) if serial \
+        else fast_financial_data
+    backend.latency_stats.__init__()
+    write_queue.write_queue.counts.clear()
+
+    latencies = {}
+    sample = None
+    for i in range(args.turns):
+        route, message = MESSAGES[i % len(MESSAGES)]
+        start = time.perf_counter()
+        result = await backend.process_message("bench_user", message)
+        latencies.setdefault(route, []).append(time.perf_counter() - start)
+        if route == "goal_advisor" and sample is None:
+            sample = result["timings"]
+    await write_queue.write_queue.drain()
+
+    summary = {}
+    for route, values in latencies.items():
+        values.sort()
+        summary[route] = {"mean_ms": round(sum(values) / len(values) * 1000, 1),
+                          "p95_ms": round(values[int(0.95 * (len(values) - 1))] * 1000, 1)}
+    return {"mode": mode, "routes": summary, "sample_goal_timings": sample,
+            **{k: v for k, v in backend.latency_stats.snapshot().items() if k != "nodes"}}
+
+
+async def main_async(args):
+    os.environ["MONGO_URI"] = "mongomock://bench"
+    os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+    import datastore
+    import rollups
+    import backend
+
+    rollups.ROLLUPS_ENABLED = False
+    backend.FAST_ROUTE_ENABLED = False
+    backend.initialize_database()
+    now = datetime.now()
+    await backend.expenses_collection.insert_many([
+        {"user_id": "bench_user", "amount": 50.0 + i, "category": ["Food", "Travel", "Bills"][i % 3],
+         "category_norm": ["food", "travel", "bills"][i % 3], "description": "seed",
+         "date": now - timedelta(hours=i * 3)} for i in range(args.expenses)])
+
+    original = datastore.run_blocking
+
+    async def slow_run_blocking(fn, *a, **kw):
+        await asyncio.sleep(args.db_latency_ms / 1000)
+        return await original(fn, *a, **kw)
+
+    datastore.run_blocking = slow_run_blocking
+
+    latency = args.llm_latency_ms / 1000
+    backend.llm_router = backend.llm_advisor = backend.llm_intent = FakeChat(latency)
+    backend.openai_client = backend.structured_llm = backend.routed_llm = object()
+    backend.initialize_workflow()
+
+    fast_financial_data = backend.get_user_financial_data
+    results = [await run_mode(backend, mode, args, fast_financial_data) for mode in ("serial", "fanout")]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for result in results:
+        print(f"\n== {result['mode']} ==")
+        for route, stats in result["routes"].items():
+            print(f"  {route:<22} mean {stats['mean_ms']:>7.1f} ms   p95 {stats['p95_ms']:>7.1f} ms")
+        print(f"  prefetch: {result['prefetch']}")
+        queue = result["write_queue"]
+        print(f"  write queue: queued={queue['queued']} inline={queue['inline']} max_depth={queue['max_depth']}")
+        print("  goal turn breakdown (start_ms +ms):")
+        for timing in sorted(result["sample_goal_timings"], key=lambda t: t["start_ms"]):
+            print(f"    {timing['name']:<26} @{timing['start_ms']:>7.1f}  +{timing['ms']:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--expenses", type=int, default=300)
+    parser.add_argument("--db-latency-ms", type=float, default=20.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=150.0)
+    parser.add_argument("--json", action="store_true")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
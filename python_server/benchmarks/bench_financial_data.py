@@ -0,0 +1,98 @@
+# bench_financial_data.py - get_user_financial_data: legacy 3-query path vs single $facet
+#
+# Seeds one user with N expenses (30-day window) plus goals, then compares
+# the old implementation (stream every document, second aggregation, list
+# every goal) with the current raw-collection path. "Bytes" is the
+# BSON size of everything the driver hands back, i.e. what crosses the wire.
+#
+#   python benchmarks/bench_financial_data.py --sizes 10000 100000
+#   python benchmarks/bench_financial_data.py --mongo-uri mongodb://localhost:27017/
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import bson
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+def wire_bytes(documents):
+    return sum(len(bson.encode(d)) for d in documents)
+
+
+async def legacy_financial_data(backend, user_id):
+    """The pre-$facet implementation, kept here as the baseline."""
+    month_ago = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=30)
+    expenses = await backend.expenses_collection.find({"user_id": user_id, "date": {"$gte": month_ago}})
+    top = await backend.expenses_collection.aggregate([
+        {"$match": {"user_id": user_id, "date": {"$gte": month_ago}}},
+        {"$group": {"_id": "$category", "total": {"$sum": "$amount"}}},
+        {"$sort": {"total": -1}},
+        {"$limit": 3},
+    ])
+    goals = await backend.goals_collection.find({"user_id": user_id}, sort=[("created_at", -1)])
+    result = {"monthly_spending": sum(e["amount"] for e in expenses), "top_categories": top, "goals_count": len(goals)}
+    return result, wire_bytes(expenses) + wire_bytes(top) + wire_bytes(goals)
+
+
+async def facet_financial_data(backend, user_id):
+    result = await backend.get_user_financial_data(user_id)
+    # $facet returns one document; count_documents returns one small reply
+    payload = {"total": [{"monthly_spending": result["monthly_spending"]}], "top_categories": result["top_categories"]}
+    return result, wire_bytes([payload]) + wire_bytes([{"n": result["goals_count"]}])
+
+
+async def timed(fn, backend, user_id, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result, size = await fn(backend, user_id)
+        best = min(best, time.perf_counter() - start)
+    return result, size, best
+
+
+async def run(args):
+    import rollups
+    import backend
+
+    rollups.ROLLUPS_ENABLED = False  # measure the raw-collection path
+    backend.initialize_database()
+    now = datetime.now()
+    for size in args.sizes:
+        user_id = f"bench_fin_{size}"
+        docs = [{
+            "user_id": user_id, "amount": float(n % 900 + 10), "category": ["Food", "Transport", "Bills", "Shopping"][n % 4],
+            "description": "seeded expense for the financial data benchmark", "date": now - timedelta(days=n % 30),
+            "created_at": now,
+        } for n in range(size)]
+        for start in range(0, len(docs), 10_000):
+            await backend.expenses_collection.insert_many(docs[start:start + 10_000], ordered=False)
+        await backend.goals_collection.insert_many(
+            [{"user_id": user_id, "goal_text": "save for a trip", "advice_given": "x" * 400, "created_at": now}
+             for _ in range(50)])
+
+        legacy, legacy_bytes, legacy_s = await timed(legacy_financial_data, backend, user_id, args.repeat)
+        facet, facet_bytes, facet_s = await timed(facet_financial_data, backend, user_id, args.repeat)
+        assert abs(legacy["monthly_spending"] - facet["monthly_spending"]) < 1e-6
+        assert legacy["goals_count"] == facet["goals_count"]
+
+        print(f"expenses={size:>7} legacy: {legacy_s * 1000:8.1f}ms {legacy_bytes / 1024:10.1f}KiB | "
+              f"facet: {facet_s * 1000:8.1f}ms {facet_bytes / 1024:6.2f}KiB | "
+              f"bytes x{legacy_bytes / max(facet_bytes, 1):,.0f} fewer, {legacy_s / facet_s:.1f}x faster")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Financial data query benchmark")
+    parser.add_argument("--mongo-uri", default="mongomock://localhost")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    os.environ["MONGO_URI"] = args.mongo_uri
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
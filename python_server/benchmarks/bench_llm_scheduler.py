@@ -0,0 +1,142 @@
+# bench_llm_scheduler.py - A traffic spike against a rate-limited model: direct calls vs llm_scheduler
+#
+# A fake upstream accepts --upstream-rps requests per second (sliding 1 s
+# window) and answers 429 with Retry-After beyond that; it also fails
+# --error-rate of calls with a 503. --requests prompts arrive at once, a
+# --duplicate-rate share of them identical to another in-flight prompt
+# (several users asking the same thing right after a broadcast, say).
+#
+# "direct" calls the model with no limiter, retries or coalescing, the way
+# the nodes did before: every 429/503 becomes a failed reply. "scheduled"
+# goes through CachedLLM + llm_scheduler (response cache off).
+#
+#   python benchmarks/bench_llm_scheduler.py --requests 200 --upstream-rps 40
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import deque
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+MODEL = "fake-model"
+
+
+class UpstreamError(Exception):
+    def __init__(self, status_code, retry_after=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(status_code=status_code,
+                                        headers={"retry-after": str(retry_after)} if retry_after else {})
+
+
+class FakeUpstream:
+    def __init__(self, rps, latency_s, error_rate):
+        self.rps = rps
+        self.latency_s = latency_s
+        self.error_rate = error_rate
+        self.accepted = deque()
+        self.calls = 0
+        self.rejected = 0
+
+    async def ainvoke(self, prompt, *args, **kwargs):
+        self.calls += 1
+        now = time.monotonic()
+        while self.accepted and now - self.accepted[0] >= 1.0:
+            self.accepted.popleft()
+        if len(self.accepted) >= self.rps:
+            self.rejected += 1
+            raise UpstreamError(429, retry_after=round(1.0 - (now - self.accepted[0]), 2))
+        self.accepted.append(now)
+        await asyncio.sleep(self.latency_s)
+        if random.random() < self.error_rate:
+            raise UpstreamError(503)
+        return SimpleNamespace(content=f"reply to {prompt[:20]}", usage_metadata={"input_tokens": 200,
+                                                                                    "output_tokens": 40})
+
+
+def prompts(args):
+    rng = random.Random(7)
+    unique = [f"how much did user {i} spend on food this month? " + "context " * 40 for i in range(args.requests)]
+    return [rng.choice(unique[:i]) if i and rng.random() < args.duplicate_rate else unique[i]
+            for i in range(args.requests)]
+
+
+async def run(mode, args):
+    import llm_cache
+    from llm_scheduler import LLMScheduler
+    import llm_scheduler as scheduler_module
+
+    upstream = FakeUpstream(args.upstream_rps, args.latency_ms / 1000, args.error_rate)
+    scheduler_module.llm_scheduler = llm_cache.llm_scheduler = LLMScheduler()
+    llm = llm_cache.CachedLLM(upstream, "bench", model=MODEL)
+
+    async def one(prompt):
+        start = time.perf_counter()
+        try:
+            if mode == "direct":
+                await upstream.ainvoke(prompt)
+            else:
+                await llm.ainvoke(prompt)
+            ok = True
+        except Exception:
+            ok = False
+        return ok, time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one(p) for p in prompts(args)))
+    wall = time.perf_counter() - start
+    latencies = sorted(latency for ok, latency in results if ok)
+    snapshot = llm_cache.llm_scheduler.snapshot()
+    model_stats = snapshot["models"].get(MODEL, {})
+    return {
+        "mode": mode,
+        "succeeded": len(latencies),
+        "failed": len(results) - len(latencies),
+        "upstream_calls": upstream.calls,
+        "upstream_429s": upstream.rejected,
+        "coalesced": snapshot["coalesced"],
+        "retries": {k: model_stats.get(k, 0) for k in ("rate_limited", "server_error", "gave_up")},
+        "max_queue_depth": model_stats.get("max_waiting", 0),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+        "p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 1) if latencies else None,
+        "wall_s": round(wall, 2),
+    }
+
+
+async def main_async(args):
+    # Limits must be in place before llm_scheduler is imported
+    os.environ["LLM_RATE_LIMITS"] = json.dumps({MODEL: {"rpm": args.upstream_rps * 60 * 0.9,
+                                                        "tpm": 10_000_000, "concurrency": args.concurrency}})
+    os.environ["LLM_RETRY_BASE_S"] = "0.2"
+    import llm_cache
+    llm_cache.LLM_CACHE_ENABLED = False
+    results = [await run(mode, args) for mode in ("direct", "scheduled")]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for result in results:
+        print(f"\n== {result['mode']} ==")
+        for key, value in result.items():
+            if key != "mode":
+                print(f"  {key:<16} {value}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--upstream-rps", type=int, default=40)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--error-rate", type=float, default=0.03)
+    parser.add_argument("--duplicate-rate", type=float, default=0.2)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--json", action="store_true")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
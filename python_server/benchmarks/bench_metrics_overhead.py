@@ -0,0 +1,117 @@
+# bench_metrics_overhead.py - What does instrumentation cost per request?
+#
+# Drives /api/chat in-process (ASGI transport) with zero-latency fake LLMs
+# and mongomock, alternating requests with METRICS_ENABLED on and off, and
+# reports the mean per-request difference (noisy: the thread-pool hops
+# dominate). The replayed line times just the instrumentation calls of one
+# turn, plus a single histogram observation and a full /api/metrics render.
+# The budget is < 1 ms/request.
+#
+#   python benchmarks/bench_metrics_overhead.py --requests 400
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+MESSAGES = [
+    ("financial_insights", "what do my spending trends look like"),
+    ("goal_advisor", "help me set a goal to save for a new bike"),
+    ("conversation_manager", "hello there"),
+]
+
+
+class FakeChat:
+    async def ainvoke(self, prompt, *args, **kwargs):
+        text = str(prompt)
+        if "Choose one specialist" in text:
+            request = text.split('request: "', 1)[1].split('"', 1)[0]
+            return SimpleNamespace(content=next(route for route, message in MESSAGES if message == request),
+                                   usage_metadata={"input_tokens": 350, "output_tokens": 3})
+        return SimpleNamespace(content="💡 Keep food under ₹5000!",
+                               usage_metadata={"input_tokens": 420, "output_tokens": 40})
+
+
+async def main_async(args):
+    os.environ["MONGO_URI"] = "mongomock://bench"
+    os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+    import httpx
+    import backend
+    import llm_cache
+    import main
+    import metrics
+
+    llm_cache.LLM_CACHE_ENABLED = False  # every turn reaches the (fake) model
+    backend.FAST_ROUTE_ENABLED = False
+    backend.initialize_database()
+    backend.llm_router = llm_cache.CachedLLM(FakeChat(), "router", model="gpt-4o-mini")
+    backend.llm_advisor = llm_cache.CachedLLM(FakeChat(), "advisor", model="gpt-3.5-turbo")
+    backend.llm_intent = backend.llm_router
+    backend.openai_client = backend.structured_llm = backend.routed_llm = object()
+    backend.initialize_workflow()
+
+    timings = {True: [], False: []}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def turn(i):
+            _, message = MESSAGES[i % len(MESSAGES)]
+            start = time.perf_counter()
+            response = await client.post("/api/chat", json={"user_id": f"user{i % 50}", "message": message})
+            response.raise_for_status()
+            return time.perf_counter() - start
+
+        for i in range(30):  # warm up imports, caches and the thread pool
+            await turn(i)
+        for i in range(args.requests):
+            # Alternate per request so drift (session growth, GC) hits both modes alike
+            enabled = metrics.METRICS_ENABLED = i % 2 == 0
+            timings[enabled].append(await turn(i))
+        metrics.METRICS_ENABLED = True
+
+        start = time.perf_counter()
+        rendered = (await client.get("/api/metrics")).text
+        render_ms = (time.perf_counter() - start) * 1000
+
+    # One goal turn's worth of instrumentation, without the I/O it wraps
+    def replay_request():
+        for node in ("audio_preprocess", "speech_to_text", "decision_router", "goal_advisor"):
+            with metrics.node_scope(node):
+                if node in ("decision_router", "goal_advisor"):
+                    metrics.record_llm("router", "gpt-4o-mini", 0.2, 400, 20)
+                    metrics.record_db("goals", "count_documents", 0.003)
+                    metrics.record_db("expense_rollups", "aggregate", 0.004)
+        metrics.record_http("/api/chat", 200, 0.5)
+
+    start = time.perf_counter()
+    for _ in range(20_000):
+        replay_request()
+    replay_us = (time.perf_counter() - start) / 20_000 * 1e6
+
+    histogram = metrics.Histogram("bench_seconds", "bench", ("node",))
+    start = time.perf_counter()
+    for i in range(100_000):
+        histogram.observe(0.0123, "decision_router")
+    observe_us = (time.perf_counter() - start) / 100_000 * 1e6
+
+    on, off = statistics.mean(timings[True]) * 1000, statistics.mean(timings[False]) * 1000
+    on_med, off_med = statistics.median(timings[True]) * 1000, statistics.median(timings[False]) * 1000
+    print(f"requests per mode:            {len(timings[True])}")
+    print(f"mean   on / off:              {on:.3f} / {off:.3f} ms  (delta {on - off:+.3f} ms)")
+    print(f"median on / off:              {on_med:.3f} / {off_med:.3f} ms  (delta {on_med - off_med:+.3f} ms)")
+    print(f"histogram observe:            {observe_us:.2f} µs")
+    print(f"instrumentation per request:  {replay_us:.1f} µs (replayed, no I/O)")
+    print(f"/api/metrics render:          {render_ms:.1f} ms, {len(rendered.splitlines())} lines")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=400)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
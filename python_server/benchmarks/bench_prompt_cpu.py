@@ -0,0 +1,188 @@
+# bench_prompt_cpu.py - Python-side CPU per LLM turn: inline f-string prompts vs prompts.py templates
+#
+# For each LLM-backed node this times what happens around the model call:
+# building the prompt, prompt_stats bookkeeping, the llm_cache key
+# (normalize_prompt), the scheduler's token estimate, and fixing the
+# currency in a typical reply. "inline" rebuilds the old f-string prompts
+# and runs the old four-replace / three-re.sub currency fixer. "templates"
+# uses prompts.py and currency.py.
+#
+# It first checks currency.fix_currency_formatting against the ₹ edge cases
+# below (and the stream fixer against random token splits of each of them), and exits
+# non-zero on a mismatch.
+#
+#   python benchmarks/bench_prompt_cpu.py --turns 20000
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import prompts
+from context import count_tokens, prompt_stats, tokenizer_name
+from currency import CurrencyStreamFixer, fix_currency_formatting
+from llm_cache import estimate_tokens, normalize_prompt
+
+CURRENCY_CASES = [
+    ("$500", "₹500"),
+    ("$ 1,500.75 dollars", "₹1,500.75"),
+    ("500$", "₹500"),
+    ("1,500 rupees", "₹1,500"),
+    ("12.50 Rupees", "₹12.50"),
+    ("₹500 rupees", "₹500"),
+    ("₹ 250", "₹250"),
+    ("Rs. 1,20,000 saved", "₹1,20,000 saved"),
+    ("Rs 500", "₹500"),
+    ("rs.99", "₹99"),
+    ("USD 20 or 20 USD", "₹20 or ₹20"),
+    ("INR 300 / 300 inr", "₹300 / ₹300"),
+    ("prices in USD", "prices in INR"),
+    ("Dollars, a dollar, DOLLARS", "Rupees, a rupee, RUPEES"),
+    ("The $ sign", "The ₹ sign"),
+    ("Save 5 dollars.", "Save ₹5."),
+    ("₹ symbol", "₹ symbol"),
+    ("Mrs 500", "Mrs 500"),
+    ("petrodollars", "petrodollars"),
+    ("2025 users", "2025 users"),
+    ("12.5% of ₹4,000", "12.5% of ₹4,000"),
+    ("", ""),
+    ("save 5,000 INR monthly", "save ₹5,000 monthly"),
+    ("price: 500$ each", "price: ₹500 each"),
+]
+STREAM_SEEDS = 50
+REPLY = ("📊 You spent Rs. 12,450 this month, 40% of it on Food ($4,980). Cutting dining out by 2,000 rupees "
+         "a week would save about ₹ 8,000 a month, which is 96,000 dollars... sorry, ₹96,000 a year! 💪")
+HISTORY = "\n".join(["Conversation so far (use it to resolve follow-ups such as 'and last month?'):",
+                     "Earlier: User tracks food and transport spending and is saving for a phone.",
+                     "User: how much did I spend on food last week", "FinVoice: 🍲 ₹2,340 across 6 orders.",
+                     "User: and on transport?", "FinVoice: 🚕 ₹860 across 4 rides."])
+MESSAGE = "what are my spending trends this month"
+FINANCIALS = {"monthly_spending": 12450.0,
+              "top_categories": [{"_id": "Food", "total": 4980.0}, {"_id": "Transport", "total": 2100.0}]}
+CURRENCY_CONTEXT = prompts.CURRENCY_CONTEXT
+ROUTER_SPECIALISTS = prompts.ROUTER_SPECIALISTS
+
+
+def legacy_fix_currency_formatting(text):
+    if not text:
+        return text
+    text = text.replace('$', '₹')
+    text = text.replace('dollars', 'rupees').replace('Dollars', 'Rupees')
+    text = text.replace('USD', 'INR').replace('usd', 'inr')
+    text = re.sub(r'(\d+)\s*rupees', r'₹\1', text, flags=re.IGNORECASE)
+    text = re.sub(r'₹\s*(\d+)', r'₹\1', text)
+    text = re.sub(r'(\d+)\s*\$', r'₹\1', text)
+    return text
+
+
+INLINE = {
+    "decision_router": lambda history, message: f"""
+        {history}
+        Analyze the user's request: "{message}"
+        Choose one specialist to handle the request.
+        {ROUTER_SPECIALISTS}
+        Provide only the name of the chosen specialist node, with no extra text or explanation.
+        """,
+    "financial_insights": lambda history, message: f"""
+        {CURRENCY_CONTEXT}
+        {history}
+        User said: "{message}"
+
+        Here is the user's financial data for the last 30 days:
+        - Total spending: ₹{FINANCIALS['monthly_spending']:.2f}
+        - Top spending categories: {FINANCIALS['top_categories']}
+
+        Provide some insights based on this data. The response should be under 4 sentences, use emojis, and offer trends or advice.
+        """,
+    "conversation_manager": lambda history, message: f"""
+        {CURRENCY_CONTEXT}
+        You are FinVoice, a friendly AI financial assistant.
+        {history}
+        User said: "{message}"
+        Reply naturally, under 3 sentences, with emojis. Your goal is to be helpful and direct the user to financial tasks.
+        """,
+}
+TEMPLATES = {
+    "decision_router": lambda history, message: prompts.ROUTER.format_messages(
+        history=prompts.history_block(history), message=message),
+    "financial_insights": lambda history, message: prompts.INSIGHTS.format_messages(
+        history=prompts.history_block(history), message=message, trends="", **FINANCIALS),
+    "conversation_manager": lambda history, message: prompts.CONVERSATION.format_messages(
+        history=prompts.history_block(history), message=message),
+}
+
+
+def check_currency() -> int:
+    failures = 0
+    for text, expected in CURRENCY_CASES:
+        got = fix_currency_formatting(text)
+        if got != expected:
+            failures += 1
+            print(f"❌ {text!r}: expected {expected!r}, got {got!r}")
+    # Every case, streamed in random 1-6 character chunks, must come out as if fixed in one piece
+    for text in [REPLY] + [text for text, _ in CURRENCY_CASES]:
+        expected = fix_currency_formatting(text)
+        for seed in range(STREAM_SEEDS):
+            rng = random.Random(seed)
+            chunks = []
+            while sum(map(len, chunks)) < len(text):
+                start = sum(map(len, chunks))
+                chunks.append(text[start:start + rng.randint(1, 6)])
+            fixer = CurrencyStreamFixer()
+            out = "".join(fixer.feed(chunk) for chunk in chunks) + fixer.flush()
+            if out != expected:
+                failures += 1
+                print(f"❌ stream split {chunks!r} gave {out!r}, expected {expected!r}")
+                break
+    print(f"currency cases: {len(CURRENCY_CASES) - failures}/{len(CURRENCY_CASES)} ok, stream splits ok"
+          if not failures else f"currency cases: {failures} failed")
+    return failures
+
+
+def time_turns(builders, fix, turns):
+    """Mean µs per node turn for prompt building, bookkeeping and the reply fix."""
+    results = {}
+    for node, build in builders.items():
+        start = time.perf_counter()
+        for _ in range(turns):
+            prompt = build(HISTORY, MESSAGE)
+            prompt_stats.record(node, prompt, HISTORY)
+            normalize_prompt(prompt)
+            estimate_tokens(prompt)
+            fix(REPLY)
+        results[node] = (time.perf_counter() - start) / turns * 1e6
+    return results
+
+
+def time_fix(fix, turns):
+    start = time.perf_counter()
+    for _ in range(turns):
+        fix(REPLY)
+    return (time.perf_counter() - start) / turns * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--turns", type=int, default=20000)
+    args = parser.parse_args()
+
+    failures = check_currency()
+    TEMPLATES["decision_router"](HISTORY, MESSAGE)  # import langchain_core outside the timings
+    count_tokens("warm up")
+
+    inline = time_turns(INLINE, legacy_fix_currency_formatting, args.turns)
+    templates = time_turns(TEMPLATES, fix_currency_formatting, args.turns)
+    print(f"tokenizer: {tokenizer_name()}   µs per turn (prompt, bookkeeping, cache key, token estimate, reply fix)")
+    print(f"  {'node':<22} {'inline':>10} {'templates':>10}")
+    for node in inline:
+        print(f"  {node:<22} {inline[node]:>10.1f} {templates[node]:>10.1f}  ({templates[node] / inline[node] - 1:+.0%})")
+    legacy_us, fix_us = time_fix(legacy_fix_currency_formatting, args.turns), time_fix(fix_currency_formatting, args.turns)
+    print(f"  {'currency fix only':<22} {legacy_us:>10.1f} {fix_us:>10.1f}  ({fix_us / legacy_us - 1:+.0%})")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# bench_router.py - Accuracy vs. latency saved for the fast-path intent router
+#
+# Classifies a labelled utterance corpus with intent_rules and reports how
+# many turns skip the LLM router, how accurate those fast decisions are and
+# the estimated wall-clock time saved per 1000 turns.
+#
+#   python benchmarks/bench_router.py --llm-latency-ms 700
+import argparse
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from intent_rules import classify, VALID_ROUTES
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "router_utterances.jsonl")
+
+
+def load_corpus(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fast-path intent router benchmark")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--llm-latency-ms", type=float, default=700.0,
+                        help="Typical gpt-4o-mini router round trip to price a skipped call")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    per_route = defaultdict(lambda: {"total": 0, "fast": 0, "correct": 0})
+    wrong = []
+
+    for item in corpus:
+        route, confidence = classify(item["text"])
+        stats = per_route[item["route"]]
+        stats["total"] += 1
+        if route:
+            stats["fast"] += 1
+            if route == item["route"]:
+                stats["correct"] += 1
+            else:
+                wrong.append((item["text"], item["route"], route, confidence))
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for item in corpus:
+            classify(item["text"])
+    per_call_us = (time.perf_counter() - start) / (args.repeat * len(corpus)) * 1e6
+
+    fast = sum(s["fast"] for s in per_route.values())
+    correct = sum(s["correct"] for s in per_route.values())
+    coverage = fast / len(corpus)
+
+    print(f"{'route':22} {'total':>5} {'fast':>5} {'correct':>7}")
+    for route in VALID_ROUTES:
+        s = per_route[route]
+        print(f"{route:22} {s['total']:5} {s['fast']:5} {s['correct']:7}")
+    print(f"\nutterances={len(corpus)} fast_path_coverage={coverage:.1%} "
+          f"fast_path_accuracy={(correct / fast if fast else 0):.1%}")
+    print(f"classify cost={per_call_us:.1f}us/utterance")
+    saved_s = coverage * 1000 * (args.llm_latency_ms / 1000 - per_call_us / 1e6)
+    print(f"estimated router time saved per 1000 turns={saved_s:.1f}s")
+    for text, expected, got, confidence in wrong:
+        print(f"  MISROUTED {text!r}: expected={expected} got={got} confidence={confidence}")
+
+
+if __name__ == "__main__":
+    main()
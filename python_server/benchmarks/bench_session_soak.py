@@ -0,0 +1,111 @@
+# bench_session_soak.py - Memory soak test for the conversation session store
+#
+# Replays a long stream of chat turns from a rotating user population on a
+# simulated clock (so hours of traffic run in seconds) and samples traced
+# memory as it goes. The bounded store should plateau once every active
+# user's ring buffer is full and idle users start expiring; the legacy
+# unbounded dict of {"role", "content", "timestamp"} entries is run alongside
+# for comparison. Exits non-zero if the bounded store keeps growing.
+#
+#   python benchmarks/bench_session_soak.py --turns 200000 --active-users 2000
+#   python benchmarks/bench_session_soak.py --max-turns 50 --idle-ttl-s 600
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+MESSAGES = [
+    "I spent 450 on groceries", "how much did I spend on food this week?",
+    "help me save for a laptop", "what are my spending habits?", "thanks!",
+]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def legacy_record(sessions, user_id, message, response):
+    if user_id not in sessions:
+        sessions[user_id] = {"conversation_history": [], "last_interaction": datetime.now()}
+    session = sessions[user_id]
+    session["conversation_history"].append({"role": "user", "content": message, "timestamp": datetime.now()})
+    session["conversation_history"].append({"role": "assistant", "content": response, "timestamp": datetime.now()})
+    session["last_interaction"] = datetime.now()
+
+
+async def soak(args, store_kind):
+    import sessions
+
+    clock = FakeClock()
+    sessions.time.monotonic = clock
+    store = sessions.InMemorySessionStore(args.max_turns, args.idle_ttl_s, args.max_users)
+    legacy = {}
+    rng = random.Random(7)
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    samples = []
+    for i in range(args.turns):
+        # The active population drifts, so old users go idle and new ones arrive
+        user = f"user_{i // args.drift + rng.randrange(args.active_users)}"
+        message = rng.choice(MESSAGES) + f" #{i}"
+        response = "₹" + str(rng.randrange(100, 90000)) + " noted for " + message
+        if store_kind == "bounded":
+            await store.append(user, "user", message)
+            await store.append(user, "assistant", response)
+        else:
+            legacy_record(legacy, user, message, response)
+        clock.now += args.seconds_per_turn
+        if (i + 1) % (args.turns // args.samples) == 0:
+            samples.append((i + 1, tracemalloc.get_traced_memory()[0] - baseline))
+    tracemalloc.stop()
+    return samples, store.snapshot() if store_kind == "bounded" else {"users": len(legacy)}
+
+
+async def run(args):
+    results = {}
+    for kind in ("bounded", "legacy"):
+        samples, snapshot = await soak(args, kind)
+        results[kind] = samples
+        print(f"{kind}: users={snapshot['users']}"
+              + (f" turns={snapshot['turns']} evictions={snapshot['evictions']} "
+                 f"approx_bytes={snapshot['approx_bytes']}" if kind == "bounded" else ""))
+
+    print(f"{'turns':>9} {'bounded MiB':>12} {'legacy MiB':>11}")
+    for (n, bounded), (_, legacy) in zip(results["bounded"], results["legacy"]):
+        print(f"{n:>9} {bounded / 2**20:>12.2f} {legacy / 2**20:>11.2f}")
+
+    # Second half of the run should be flat: allow 10% drift over the plateau
+    half = results["bounded"][len(results["bounded"]) // 2:]
+    growth = half[-1][1] / max(half[0][1], 1)
+    print(f"bounded growth over second half: {growth:.2f}x")
+    if growth > 1.10:
+        print("❌ Session store memory did not plateau")
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Session store memory soak test")
+    parser.add_argument("--turns", type=int, default=100000)
+    parser.add_argument("--active-users", type=int, default=1000)
+    parser.add_argument("--drift", type=int, default=50, help="Turns before the user window shifts by one")
+    parser.add_argument("--seconds-per-turn", type=float, default=0.5, help="Simulated time between turns")
+    parser.add_argument("--max-turns", type=int, default=20)
+    parser.add_argument("--idle-ttl-s", type=float, default=1800)
+    parser.add_argument("--max-users", type=int, default=10000)
+    parser.add_argument("--samples", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# bench_startup.py - Cold start of a FinVoice worker: import time, time to ready, first-request latency
+#
+# 1. `import main` in --runs fresh interpreters, and import plus building
+#    the LLM clients and compiled workflow (what every worker pays before it
+#    can serve).
+# 2. Boots benchmarks/fake_openai.py and `uvicorn main:app --workers N`
+#    (the uvicorn path of serve.py), then polls /api/health. It records when
+#    the port first answers and when a worker first reports ready (200),
+#    then times the first /api/chat turns against the later ones.
+#
+# --server-dir points at another checkout (a `git worktree` of an older
+# commit, say) to compare the same numbers before and after a change.
+#
+#   python benchmarks/bench_startup.py --runs 5 --workers 2
+#   git worktree add /tmp/finvoice-old HEAD~1
+#   python benchmarks/bench_startup.py --server-dir /tmp/finvoice-old/python_server
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+from load_test import free_port, wait_ready
+
+MESSAGES = ["hello", "what are my spending trends", "how much did I spend on food last week",
+            "help me save for a new phone", "hi there", "show my spending this month"]
+IMPORT_SNIPPET = """
+import sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+import backend
+backend.initialize_llms()
+backend.initialize_workflow()
+print(imported - started, time.perf_counter() - started,
+      "langchain_openai" in sys.modules and "langgraph" in sys.modules)
+"""
+
+
+def server_env(fake_url: str):
+    return {**os.environ, "OPENAI_API_KEY": "sk-bench", "OPENAI_BASE_URL": f"{fake_url}/v1",
+            "OPENAI_API_BASE": f"{fake_url}/v1", "MONGO_URI": "mongomock://startup", "STT_BACKEND": "openai",
+            "PYTHONDONTWRITEBYTECODE": "1"}
+
+
+def measure_imports(args):
+    env = server_env("http://127.0.0.1:9")
+    imports, totals, preloaded = [], [], None
+    for _ in range(args.runs):
+        out = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], cwd=args.server_dir, env=env,
+                             capture_output=True, text=True, check=True).stdout.split()
+        imports.append(float(out[-3]) * 1000)
+        totals.append(float(out[-2]) * 1000)
+        preloaded = out[-1]
+    return {"import_main_ms": round(statistics.median(imports), 1),
+            "import_and_init_ms": round(statistics.median(totals), 1),
+            "heavy_modules_loaded_by_import_and_init": preloaded == "True"}
+
+
+async def boot_once(args):
+    import httpx
+
+    fake_port, app_port = free_port(), free_port()
+    fake_url, base_url = f"http://127.0.0.1:{fake_port}", f"http://127.0.0.1:{app_port}"
+    fake = subprocess.Popen([sys.executable, os.path.join(BENCH_DIR, "fake_openai.py"), "--port", str(fake_port),
+                             "--latency-ms", str(args.llm_latency_ms), "--jitter-ms", "0"])
+    processes = [fake]
+    try:
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            await wait_ready(client, f"{fake_url}/v1/stats")
+            launched = time.perf_counter()
+            processes.append(subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(app_port),
+                 "--workers", str(args.workers), "--log-level", "warning"],
+                cwd=args.server_dir, env=server_env(fake_url), stdout=subprocess.DEVNULL))
+            listening = ready = None
+            deadline = launched + 120
+            while ready is None and time.perf_counter() < deadline:
+                try:
+                    response = await client.get(f"{base_url}/api/health")
+                    listening = listening or time.perf_counter()
+                    if response.status_code == 200:
+                        ready = time.perf_counter()
+                        break
+                except httpx.TransportError:
+                    pass
+                await asyncio.sleep(0.02)
+            if ready is None:
+                raise RuntimeError("server never reported ready")
+
+            turns = []
+            for i in range(args.turns):
+                started = time.perf_counter()
+                response = await client.post(f"{base_url}/api/chat", json={"user_id": f"startup{i}",
+                                                                           "message": MESSAGES[i % len(MESSAGES)]})
+                response.raise_for_status()
+                turns.append((time.perf_counter() - started) * 1000)
+            health = (await client.get(f"{base_url}/api/health")).json()
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+    return {"listening_s": round(listening - launched, 2), "ready_s": round(ready - launched, 2),
+            "first_request_ms": round(turns[0], 1), "later_requests_median_ms": round(statistics.median(turns[1:]), 1),
+            "checks": health.get("checks")}
+
+
+async def main_async(args):
+    result = {"server_dir": os.path.abspath(args.server_dir), "workers": args.workers,
+              **measure_imports(args)}
+    boots = [await boot_once(args) for _ in range(args.boots)]
+    for key in ("listening_s", "ready_s", "first_request_ms", "later_requests_median_ms"):
+        result[key] = round(statistics.median(boot[key] for boot in boots), 2)
+    result["startup_checks_ms"] = {name: check.get("ms") for name, check in (boots[-1]["checks"] or {}).items()}
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    for key, value in result.items():
+        print(f"  {key:<40} {value}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters for the import timings")
+    parser.add_argument("--boots", type=int, default=3, help="server boots")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--turns", type=int, default=6, help="/api/chat requests after ready")
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0)
+    parser.add_argument("--server-dir", default=os.path.join(BENCH_DIR, ".."))
+    parser.add_argument("--json", action="store_true")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# bench_stt_backends.py - Real-time factor and word error rate per STT backend
+#
+# Transcribes a fixed clip set (paths relative to python_server/) with each
+# backend and reports RTF = transcription time / audio duration (lower is
+# faster; <1 is faster than real time) and WER against the manifest's
+# reference transcript. Clips without a reference are scored against the
+# first backend's output instead, which shows agreement, not accuracy, and
+# are listed at the end.
+#
+# --write-references fills the missing references in the manifest with the
+# first backend's transcript; proofread them against the audio before
+# committing, or the "WER" is only agreement with that backend again.
+#
+#   python benchmarks/bench_stt_backends.py --backends openai local
+#   python benchmarks/bench_stt_backends.py --backends openai --write-references
+#   LOCAL_STT_MODEL=small.en python benchmarks/bench_stt_backends.py --backends local
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, SERVER_DIR)
+
+DEFAULT_MANIFEST = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "stt_clips.json")
+
+
+def audio_duration_s(path):
+    """Decoded duration; browser webm recordings often carry no duration header."""
+    import av
+    with av.open(path) as container:
+        stream = container.streams.audio[0]
+        samples = sum(frame.samples for frame in container.decode(stream))
+        return samples / stream.rate
+
+
+def words(text):
+    return re.sub(r"[^\w\s']", " ", (text or "").lower()).split()
+
+
+def word_error_rate(reference, hypothesis):
+    ref, hyp = words(reference), words(hypothesis)
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    previous = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        current = [i] + [0] * len(hyp)
+        for j, h in enumerate(hyp, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (r != h))
+        previous = current
+    return previous[-1] / len(ref)
+
+
+async def run(args):
+    import stt
+
+    with open(args.manifest, encoding="utf-8") as f:
+        clips = json.load(f)
+    for clip in clips:
+        clip["path"] = os.path.join(SERVER_DIR, clip["clip"])
+        clip["duration"] = audio_duration_s(clip["path"])
+
+    first_outputs = {}
+    for name in args.backends:
+        backend = stt.create_stt_backend(name)
+        start = time.perf_counter()
+        await backend.warm_up()
+        warm_up_s = time.perf_counter() - start
+        total_audio = total_time = 0.0
+        print(f"\n== {name} (warm-up {warm_up_s:.2f}s)")
+        for clip in clips:
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                text = await backend.transcribe(clip["path"])
+            elapsed = (time.perf_counter() - start) / args.repeat
+            total_audio += clip["duration"]
+            total_time += elapsed
+            reference = clip.get("reference") or first_outputs.get(clip["clip"])
+            first_outputs.setdefault(clip["clip"], text)
+            wer = f"{word_error_rate(reference, text):.1%}" if reference else "n/a"
+            label = "WER" if clip.get("reference") else "WER vs first backend"
+            print(f"{clip['clip']:24} {clip['duration']:6.1f}s audio  {elapsed:6.2f}s  RTF={elapsed / clip['duration']:.3f}  "
+                  f"{label}={wer}  text={text[:60]!r}")
+        print(f"overall RTF={total_time / total_audio:.3f}")
+
+    missing = [clip for clip in clips if not clip.get("reference")]
+    if missing and args.write_references:
+        with open(args.manifest, encoding="utf-8") as f:
+            manifest = json.load(f)
+        for entry in manifest:
+            if not entry.get("reference") and entry["clip"] in first_outputs:
+                entry["reference"] = first_outputs[entry["clip"]]
+        with open(args.manifest, "w", encoding="utf-8") as f:
+            f.write("[\n" + ",\n".join(f"  {json.dumps(entry, ensure_ascii=False)}" for entry in manifest) + "\n]\n")
+        print(f"\nwrote {args.backends[0]} transcripts as references for {len(missing)} clip(s); proofread them")
+    elif missing:
+        print(f"\n⚠ no reference transcript, WER not measured: {', '.join(clip['clip'] for clip in missing)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="STT backend RTF/WER benchmark")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST)
+    parser.add_argument("--backends", nargs="+", default=["openai", "local"])
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--write-references", action="store_true",
+                        help="store the first backend's transcript for clips without a reference")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
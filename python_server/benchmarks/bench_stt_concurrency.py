@@ -0,0 +1,76 @@
+# bench_stt_concurrency.py - Do concurrent /api/chat/audio requests serialize each other?
+#
+# Posts N audio uploads to the FastAPI app concurrently (in-process ASGI
+# transport) with the STT backend replaced by a fake that takes
+# --stt-latency-ms. "blocking" mode reproduces the old synchronous client
+# call, which holds the event loop for the whole transcription; "async" is
+# the current node.
+#
+#   python benchmarks/bench_stt_concurrency.py --requests 16
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+DEFAULT_CLIP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "temp_recording.wav")
+
+
+async def run(args):
+    import httpx
+    import stt
+    import main
+
+    class FakeSTT(stt.STTBackend):
+        name = "fake"
+
+        async def transcribe(self, audio):
+            audio[1].read()
+            if args.mode == "blocking":
+                time.sleep(args.stt_latency_ms / 1000)
+            else:
+                await asyncio.sleep(args.stt_latency_ms / 1000)
+            return "bye"
+
+    stt.set_stt_backend(FakeSTT())
+    with open(args.clip, "rb") as f:
+        clip = f.read()
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+        async def one(i):
+            start = time.perf_counter()
+            response = await client.post("/api/chat/audio", files={"file": (f"clip_{i}.wav", clip, "audio/wav")})
+            response.raise_for_status()
+            return time.perf_counter() - start
+
+        wall = time.perf_counter()
+        latencies = sorted(await asyncio.gather(*(one(i) for i in range(args.requests))))
+        wall = time.perf_counter() - wall
+
+    serial = args.requests * args.stt_latency_ms / 1000
+    print(f"mode={args.mode} requests={args.requests} stt_latency={args.stt_latency_ms:.0f}ms "
+          f"max_concurrency={stt.STT_MAX_CONCURRENCY}")
+    print(f"wall={wall:.2f}s (fully serialized would be {serial:.2f}s) "
+          f"p50={latencies[len(latencies) // 2] * 1000:.0f}ms max={latencies[-1] * 1000:.0f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent audio request benchmark")
+    parser.add_argument("--mode", choices=["async", "blocking"], default="async")
+    parser.add_argument("--requests", type=int, default=16)
+    parser.add_argument("--stt-latency-ms", type=float, default=500.0)
+    parser.add_argument("--clip", default=DEFAULT_CLIP)
+    parser.add_argument("--mongo-uri", default="mongomock://localhost")
+    args = parser.parse_args()
+    os.environ["MONGO_URI"] = args.mongo_uri
+    os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+    # Measure STT scheduling alone; bench_audio_preprocess.py covers preprocessing
+    os.environ.setdefault("AUDIO_PREPROCESS_ENABLED", "false")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
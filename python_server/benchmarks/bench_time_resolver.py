@@ -0,0 +1,83 @@
+# bench_time_resolver.py - time_resolver fast path vs dateparser
+#
+# Resolves a mix of spoken date phrases with (a) dateparser.parse as
+# resolve_date used to, (b) time_resolver with its memo cleared before every
+# pass ("cold") and (c) with the memo warm, and times importing dateparser
+# in a fresh interpreter (the cost the fast path now avoids at startup).
+# Also lists fast-path dates that differ from dateparser's; expected ones are
+# day-first numeric dates and month names resolving to the 1st.
+#
+#   python benchmarks/bench_time_resolver.py --repeat 200
+import argparse
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+PHRASES = [
+    "today", "yesterday", "day before yesterday", "last night", "this morning", "2 days ago", "a week ago",
+    "three days ago", "last 7 days", "past two weeks", "last month", "last week", "this week", "this month",
+    "monday", "last friday", "on sunday", "05/10", "12-09-2026", "2026-09-14", "5th october", "oct 5",
+    "in september", "march 2026", "the 3rd", "next to nothing",
+]
+
+
+def time_per_call(fn, phrases, repeat, before_pass=None):
+    total = 0.0
+    for _ in range(repeat):
+        if before_pass:
+            before_pass()
+        t0 = time.perf_counter()
+        for phrase in phrases:
+            fn(phrase)
+        total += time.perf_counter() - t0
+    return total / (repeat * len(phrases)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Date phrase resolution microbenchmark")
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args()
+
+    import_s = float(subprocess.check_output([sys.executable, "-c",
+                                              "import time; t = time.perf_counter(); import dateparser; "
+                                              "print(time.perf_counter() - t)"]).decode())
+
+    import dateparser
+    import time_resolver
+
+    ref = datetime.now()
+    settings = {"PREFER_DATES_FROM": "past", "RELATIVE_BASE": ref}
+    old_us = time_per_call(lambda p: dateparser.parse(p, settings=settings), PHRASES, max(args.repeat // 10, 1))
+    cold_us = time_per_call(lambda p: time_resolver.resolve_date(p, ref), PHRASES, args.repeat,
+                            before_pass=time_resolver._resolve.cache_clear)
+    fast_only = [p for p in PHRASES if any(r.match(time_resolver._normalize(p)) for r, _ in time_resolver._FULL)]
+    fast_cold_us = time_per_call(lambda p: time_resolver.resolve_date(p, ref), fast_only, args.repeat,
+                                 before_pass=time_resolver._resolve.cache_clear)
+    warm_us = time_per_call(lambda p: time_resolver.resolve_date(p, ref), PHRASES, args.repeat)
+    find_us = time_per_call(lambda p: time_resolver.find_span(f"how much did I spend on food {p}?", ref),
+                            PHRASES, args.repeat, before_pass=time_resolver._find.cache_clear)
+
+    disagreements = []
+    for phrase in fast_only:
+        ours, theirs = time_resolver.resolve_date(phrase, ref), dateparser.parse(phrase, settings=settings)
+        if theirs is not None and ours.date() != theirs.date():
+            disagreements.append((phrase, ours.date(), theirs.date()))
+
+    print(f"phrases={len(PHRASES)} fast-path coverage={len(fast_only)}/{len(PHRASES)} repeat={args.repeat}")
+    print(f"import dateparser:          {import_s * 1000:8.1f} ms (now deferred to the first fallback)")
+    print(f"dateparser.parse:           {old_us:8.1f} µs/phrase")
+    print(f"resolver, cold memo:        {cold_us:8.1f} µs/phrase (incl. dateparser fallbacks)")
+    print(f"resolver, cold, fast path:  {fast_cold_us:8.1f} µs/phrase")
+    print(f"resolver, warm memo:        {warm_us:8.2f} µs/phrase")
+    print(f"find_span in a sentence:    {find_us:8.1f} µs/query")
+    print(f"stats: {time_resolver.resolver_stats.snapshot()}")
+    for phrase, ours, theirs in disagreements:
+        print(f"  differs from dateparser: {phrase!r}: {ours} vs {theirs}")
+
+
+if __name__ == "__main__":
+    main()
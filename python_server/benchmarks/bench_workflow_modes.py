@@ -0,0 +1,149 @@
+# bench_workflow_modes.py - End-to-end latency and token spend: classic vs single_shot graph
+#
+# Drives the compiled LangGraph workflow in both WORKFLOW_MODE topologies
+# over the labelled router corpus. By default the OpenAI clients are
+# replaced with fakes that sleep --llm-latency-ms per call and estimate
+# tokens from prompt length; --live uses the real models and reads token
+# usage from the LangChain usage callback.
+#
+#   python benchmarks/bench_workflow_modes.py --no-fast-route --no-local-parser
+#   python benchmarks/bench_workflow_modes.py --live
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "router_utterances.jsonl")
+
+
+class FakeUsage:
+    def __init__(self):
+        self.calls = defaultdict(int)
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def record(self, name, prompt, completion_tokens):
+        self.calls[name] += 1
+        self.prompt_tokens += max(1, len(str(prompt)) // 4)
+        self.completion_tokens += completion_tokens
+
+
+class FakeChat:
+    """Stands in for ChatOpenAI: fixed latency, canned answers, estimated tokens."""
+
+    def __init__(self, name, usage, latency_s):
+        self.name = name
+        self.usage = usage
+        self.latency_s = latency_s
+
+    async def ainvoke(self, prompt, *args, **kwargs):
+        from intent_rules import score_routes
+        await asyncio.sleep(self.latency_s)
+        if self.name == "router":
+            match = re.search(r'request: "(.*?)"', str(prompt), re.S)
+            scores = score_routes(match.group(1) if match else str(prompt))
+            content = max(scores, key=scores.get) if max(scores.values()) > 0 else "conversation_manager"
+            self.usage.record(self.name, prompt, 4)
+        else:
+            content = "✅ Done! Here is a short reply from FinVoice 💸"
+            self.usage.record(self.name, prompt, 25)
+        return SimpleNamespace(content=content)
+
+    def with_structured_output(self, schema):
+        return FakeStructured(self, schema)
+
+
+class FakeStructured:
+    def __init__(self, chat, schema):
+        self.chat = chat
+        self.schema = schema
+
+    async def ainvoke(self, prompt, *args, **kwargs):
+        routed = await self.chat.ainvoke(prompt)
+        fields = dict(action="add_expense", amount=100.0, category="Food", description=str(prompt)[:40], date=None)
+        if "selected_node" in self.schema.model_fields:
+            if routed.content != "expense_manager":
+                fields = {}
+            return self.schema(selected_node=routed.content, **fields)
+        return self.schema(**fields)
+
+
+async def run_mode(backend, mode, texts, live, latency_s):
+    backend.workflow = backend.build_workflow(mode)
+    latencies = []
+    usage = None
+    if live:
+        from langchain_core.callbacks import get_usage_metadata_callback
+        with get_usage_metadata_callback() as cb:
+            for text in texts:
+                start = time.perf_counter()
+                await backend.process_message("bench_user", text)
+                latencies.append(time.perf_counter() - start)
+        usage = {
+            "prompt_tokens": sum(u.get("input_tokens", 0) for u in cb.usage_metadata.values()),
+            "completion_tokens": sum(u.get("output_tokens", 0) for u in cb.usage_metadata.values()),
+        }
+    else:
+        fake_usage = FakeUsage()
+        backend.llm_router = FakeChat("router", fake_usage, latency_s)
+        backend.llm_intent = FakeChat("intent", fake_usage, latency_s)
+        backend.llm_advisor = FakeChat("advisor", fake_usage, latency_s)
+        backend.structured_llm = backend.llm_intent.with_structured_output(backend.ExpenseIntent)
+        backend.routed_llm = backend.llm_router.with_structured_output(backend.RoutedIntent)
+        for text in texts:
+            start = time.perf_counter()
+            await backend.process_message("bench_user", text)
+            latencies.append(time.perf_counter() - start)
+        usage = {"prompt_tokens": fake_usage.prompt_tokens, "completion_tokens": fake_usage.completion_tokens,
+                 "llm_calls": sum(fake_usage.calls.values())}
+    latencies.sort()
+    return {
+        "mode": mode,
+        "turns": len(texts),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 1),
+        "p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 1),
+        **usage,
+    }
+
+
+async def main_async(args):
+    import backend
+
+    if args.no_fast_route:
+        backend.FAST_ROUTE_ENABLED = False
+    if args.no_local_parser:
+        backend.parse_expense = lambda text: None
+    if not args.live:
+        backend.initialize_llms = lambda: None
+
+    with open(args.corpus, encoding="utf-8") as f:
+        texts = [json.loads(line)["text"] for line in f if line.strip()]
+
+    latency_s = args.llm_latency_ms / 1000
+    results = [await run_mode(backend, mode, texts, args.live, latency_s) for mode in ("classic", "single_shot")]
+    for result in results:
+        print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare classic vs single_shot workflow topologies")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0)
+    parser.add_argument("--no-fast-route", action="store_true", help="Disable the rule-based router fast path")
+    parser.add_argument("--no-local-parser", action="store_true", help="Disable the local expense parser")
+    parser.add_argument("--live", action="store_true", help="Use the real OpenAI models (needs OPENAI_API_KEY)")
+    parser.add_argument("--mongo-uri", default="mongomock://localhost")
+    args = parser.parse_args()
+    os.environ["MONGO_URI"] = args.mongo_uri
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# check_index_plans.py - Fail if a summary query would scan a whole collection
+#
+# Creates INDEXES in a scratch database on a real mongod, explains the
+# summary and goals queries (indexes.explain_summary_queries) and exits
+# non-zero if any winning plan contains a COLLSCAN. The scratch database is
+# dropped afterwards. mongomock has no query planner, so when no mongod
+# answers at --mongo-uri the check is skipped (exit 0) unless --require is set.
+#
+#   python benchmarks/check_index_plans.py
+#   python benchmarks/check_index_plans.py --mongo-uri mongodb://ci-mongo:27017/ --require
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+async def run(args) -> int:
+    import datastore
+    from datastore import AsyncCollection, close_client, create_client, ping_client
+    from indexes import ensure_indexes, explain_summary_queries
+
+    datastore.MONGO_URI = args.mongo_uri
+    datastore.MONGO_SERVER_SELECTION_TIMEOUT_MS = args.timeout_ms
+    client, driver, native = create_client()
+    try:
+        if driver == "mongomock":
+            print("⚠ mongomock has no query planner; index plans not checked")
+            return 1 if args.require else 0
+        try:
+            await ping_client(client, native)
+        except Exception as e:
+            print(f"⚠ No mongod at {args.mongo_uri} ({e.__class__.__name__}); index plans not checked")
+            return 1 if args.require else 0
+        db = client[args.db]
+        collections = {name: AsyncCollection(db[name], native) for name in ("expenses", "goals")}
+        await ensure_indexes(collections)
+        plans = await explain_summary_queries(collections["expenses"], collections["goals"])
+        scans = [name for name, stages in plans.items() if "COLLSCAN" in stages]
+        for name, stages in plans.items():
+            print(f"{'❌' if name in scans else '✅'} {name}: {' <- '.join(stages)}")
+        if native:
+            await client.drop_database(args.db)
+        else:
+            await datastore.run_blocking(client.drop_database, args.db)
+        return 1 if scans else 0
+    finally:
+        await close_client(client)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Explain-plan check for the summary queries")
+    parser.add_argument("--mongo-uri", default=os.getenv("MONGO_URI", "mongodb://localhost:27017/"))
+    parser.add_argument("--db", default="finvoice_index_check")
+    parser.add_argument("--timeout-ms", type=int, default=2000)
+    parser.add_argument("--require", action="store_true", help="fail instead of skipping when mongod is down")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+# fake_openai.py - Local OpenAI-compatible stand-in for load tests
+#
+# Serves just enough of the API for FinVoice: /v1/chat/completions (plain,
+# streamed, and json_schema structured output for ExpenseIntent /
+# RoutedIntent) and /v1/audio/transcriptions. Replies are canned but
+# plausible: router prompts are answered with the intent_rules scores, so
+# requests fan out to the same specialists they would in production.
+# Latency is --latency-ms (+ up to --jitter-ms) per completion and
+# --stt-latency-ms per transcription.
+#
+# Point the app at it with OPENAI_BASE_URL=http://127.0.0.1:8901/v1
+#
+#   python benchmarks/fake_openai.py --port 8901 --latency-ms 400
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import re
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+ADVISOR_REPLIES = [
+    "📊 Food is your biggest category this month. Try a weekly cap of ₹2,000 and cook at home twice more! 🍲",
+    "💡 You're on track! Moving ₹3,000 a month into a recurring deposit would build a solid cushion. 🏦",
+    "😊 Happy to help! Ask me to add an expense or show your spending for any period.",
+    "🎯 Set aside ₹1,500 every week and you'll reach that goal in about four months. You've got this! 💪",
+]
+TRANSCRIPTS = [
+    "I spent 450 rupees on groceries today",
+    "how much did I spend on food last week",
+    "what are my spending trends",
+    "help me save for a new phone",
+    "hello",
+]
+_AMOUNT_RE = re.compile(r"(?:₹|rs\.?\s*)?(\d[\d,]*(?:\.\d+)?)")
+_REQUEST_RE = re.compile(r'(?:request|said|asked): "(.*?)"', re.S)
+
+
+def _user_text(prompt: str) -> str:
+    match = _REQUEST_RE.search(prompt)
+    return match.group(1) if match else prompt
+
+
+def _route(text: str) -> str:
+    from intent_rules import score_routes
+    scores = score_routes(text)
+    return max(scores, key=scores.get) if max(scores.values()) > 0 else "conversation_manager"
+
+
+def _expense_fields(text: str) -> dict:
+    lowered = text.lower()
+    amount = _AMOUNT_RE.search(lowered)
+    adding = amount is not None and not lowered.startswith(("how", "what", "show"))
+    category = next((c for c in ("Food", "Transport", "Shopping", "Bills", "Entertainment")
+                     if c.lower() in lowered), "Food" if "grocer" in lowered else None)
+    return {"action": "add_expense" if adding else "query_expense",
+            "amount": float(amount.group(1).replace(",", "")) if adding else None,
+            "category": category, "description": text[:60], "date": None}
+
+
+def _structured(schema_name: str, prompt: str) -> str:
+    text = _user_text(prompt)
+    if schema_name == "RoutedIntent":
+        route = _route(text)
+        fields = _expense_fields(text) if route == "expense_manager" else {}
+        return json.dumps({"selected_node": route, "action": None, "amount": None, "category": None,
+                           "description": None, "date": None, **fields})
+    return json.dumps(_expense_fields(text))
+
+
+def _reply(body: dict, counter) -> str:
+    prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+    response_format = body.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        return _structured(response_format["json_schema"].get("name", ""), prompt)
+    if "Choose one specialist" in prompt:
+        return _route(_user_text(prompt))
+    if "running summary" in prompt:
+        return "User tracks food and transport spending and is saving for a phone."
+    return ADVISOR_REPLIES[next(counter) % len(ADVISOR_REPLIES)]
+
+
+def create_app(latency_ms: float = 300.0, jitter_ms: float = 50.0, stt_latency_ms: float = 800.0,
+               chunk_ms: float = 10.0) -> FastAPI:
+    app = FastAPI(title="fake-openai")
+    counter = itertools.count()
+    stats = {"chat": 0, "stream": 0, "transcriptions": 0}
+
+    async def delay(base_ms: float):
+        await asyncio.sleep((base_ms + random.uniform(0, jitter_ms)) / 1000)
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        await delay(latency_ms)
+        content = _reply(body, counter)
+        model = body.get("model", "gpt-4o-mini")
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in body.get("messages", [])) // 4
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(content) // 4,
+                 "total_tokens": prompt_tokens + len(content) // 4}
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        if not body.get("stream"):
+            stats["chat"] += 1
+            return JSONResponse({
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content, "refusal": None},
+                             "finish_reason": "stop", "logprobs": None}],
+                "usage": usage,
+            })
+
+        stats["stream"] += 1
+
+        async def events():
+            def chunk(delta, finish=None):
+                return "data: " + json.dumps({
+                    "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish, "logprobs": None}],
+                }) + "\n\n"
+
+            yield chunk({"role": "assistant", "content": ""})
+            for word in re.findall(r"\S+\s*", content):
+                await asyncio.sleep(chunk_ms / 1000)
+                yield chunk({"content": word})
+            yield chunk({}, "stop")
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield "data: " + json.dumps({"id": completion_id, "object": "chat.completion.chunk",
+                                             "created": created, "model": model, "choices": [],
+                                             "usage": usage}) + "\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/v1/audio/transcriptions")
+    async def transcriptions(request: Request):
+        await request.body()
+        await delay(stt_latency_ms)
+        stats["transcriptions"] += 1
+        return JSONResponse({"text": TRANSCRIPTS[next(counter) % len(TRANSCRIPTS)]})
+
+    @app.get("/v1/stats")
+    async def fake_stats():
+        return stats
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--jitter-ms", type=float, default=50.0)
+    parser.add_argument("--stt-latency-ms", type=float, default=800.0)
+    parser.add_argument("--chunk-ms", type=float, default=10.0, help="delay between streamed words")
+    args = parser.parse_args()
+    import uvicorn
+    uvicorn.run(create_app(args.latency_ms, args.jitter_ms, args.stt_latency_ms, args.chunk_ms),
+                host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
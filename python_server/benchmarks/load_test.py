@@ -0,0 +1,291 @@
+# load_test.py - Throughput and latency of /api/chat, /api/chat/stream and /api/chat/audio
+#
+# Boots benchmarks/fake_openai.py and the FastAPI app (uvicorn main:app)
+# as subprocesses. The app points OPENAI_BASE_URL at the fake and uses
+# mongomock (or --mongo-uri for a local mongod). A mixed chat / stream /
+# voice workload is then driven at --concurrency from this process.
+#
+# Reports requests/s plus p50/p95/p99 per endpoint and per graph node. Node
+# timings come from the "timings" field of each response. Results are
+# written as JSON (--out), tagged with the current commit; --baseline
+# prints deltas against an earlier result file.
+#
+#   python benchmarks/load_test.py --requests 300 --concurrency 32 --out load.json
+#   python benchmarks/load_test.py --requests 300 --concurrency 32 --baseline load.json
+#   python benchmarks/load_test.py --target http://127.0.0.1:8000   # an already running server
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_DIR = os.path.join(BENCH_DIR, "..")
+DEFAULT_CORPUS = os.path.join(BENCH_DIR, "data", "router_utterances.jsonl")
+DEFAULT_MANIFEST = os.path.join(BENCH_DIR, "data", "stt_clips.json")
+AUDIO_NODES = {"audio_preprocess", "speech_to_text"}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(int(q * len(sorted_values)), len(sorted_values) - 1)]
+
+
+def summarize(values_ms):
+    values = sorted(values_ms)
+    return {"count": len(values),
+            "mean_ms": round(sum(values) / len(values), 1) if values else None,
+            **{f"p{int(q * 100)}_ms": round(percentile(values, q), 1) if values else None
+               for q in (0.5, 0.95, 0.99)}}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SERVER_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or "unknown"
+    except Exception:
+        return "unknown"
+
+
+async def wait_ready(client, url: str, timeout_s: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get(url)).status_code < 500:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.25)
+    raise RuntimeError(f"{url} did not come up within {timeout_s}s")
+
+
+def start_servers(args):
+    """Return (base_url, [processes]) for the fake OpenAI server and the app."""
+    fake_port, app_port = free_port(), free_port()
+    fake = subprocess.Popen([sys.executable, os.path.join(BENCH_DIR, "fake_openai.py"), "--port", str(fake_port),
+                             "--latency-ms", str(args.llm_latency_ms), "--jitter-ms", str(args.llm_jitter_ms),
+                             "--stt-latency-ms", str(args.stt_latency_ms)], cwd=SERVER_DIR)
+    env = {**os.environ,
+           "OPENAI_API_KEY": "sk-load-test",
+           "OPENAI_BASE_URL": f"http://127.0.0.1:{fake_port}/v1",
+           "OPENAI_API_BASE": f"http://127.0.0.1:{fake_port}/v1",
+           "MONGO_URI": args.mongo_uri,
+           "STT_BACKEND": "openai"}
+    if args.no_audio_preprocess:
+        env["AUDIO_PREPROCESS_ENABLED"] = "false"
+    app = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+                            "--port", str(app_port), "--workers", str(args.workers), "--log-level", "warning"],
+                           cwd=SERVER_DIR, env=env)
+    return f"http://127.0.0.1:{app_port}", f"http://127.0.0.1:{fake_port}", [fake, app]
+
+
+def build_workload(args):
+    with open(args.corpus) as f:
+        texts = [json.loads(line)["text"] for line in f if line.strip()]
+    with open(args.manifest) as f:
+        clips = [os.path.join(SERVER_DIR, c["clip"]) for c in json.load(f)]
+    clip_bytes = {path: open(path, "rb").read() for path in clips}
+    rng = random.Random(args.seed)
+    workload = []
+    for i in range(args.requests):
+        roll = rng.random()
+        user = f"load_user_{rng.randrange(args.users)}"
+        if roll < args.voice_ratio:
+            path = rng.choice(clips)
+            workload.append(("/api/chat/audio", user, (os.path.basename(path), clip_bytes[path])))
+        elif roll < args.voice_ratio + args.stream_ratio:
+            workload.append(("/api/chat/stream", user, rng.choice(texts)))
+        else:
+            workload.append(("/api/chat", user, rng.choice(texts)))
+    return workload
+
+
+async def send(client, endpoint, user, payload):
+    """Return (ok, latency_ms, timings, first_token_ms)."""
+    start = time.perf_counter()
+    first_token_ms = None
+    timings = None
+    if endpoint == "/api/chat/audio":
+        filename, data = payload
+        response = await client.post(endpoint, files={"file": (filename, data, "audio/wav")})
+        ok = response.status_code == 200
+        if ok:
+            timings = response.json().get("timings")
+    elif endpoint == "/api/chat/stream":
+        ok = False
+        async with client.stream("POST", endpoint, json={"user_id": user, "message": payload}) as response:
+            event = None
+            async for line in response.aiter_lines():
+                if line.startswith("event: "):
+                    event = line[7:]
+                elif line.startswith("data: "):
+                    if event == "token" and first_token_ms is None:
+                        first_token_ms = (time.perf_counter() - start) * 1000
+                    if event == "done":
+                        done = json.loads(line[6:])
+                        ok, timings = done.get("success", False), done.get("timings")
+    else:
+        response = await client.post(endpoint, json={"user_id": user, "message": payload})
+        ok = response.status_code == 200 and response.json().get("success", False)
+        if ok:
+            timings = response.json().get("timings")
+    return ok, (time.perf_counter() - start) * 1000, timings, first_token_ms
+
+
+async def drive(client, workload, concurrency):
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    nodes = defaultdict(list)
+    first_tokens = []
+    queue = asyncio.Queue()
+    for item in workload:
+        queue.put_nowait(item)
+
+    async def worker():
+        while not queue.empty():
+            endpoint, user, payload = queue.get_nowait()
+            try:
+                ok, latency_ms, timings, first_token_ms = await send(client, endpoint, user, payload)
+            except Exception as e:
+                print(f"⚠ {endpoint} failed: {e}")
+                ok, latency_ms, timings, first_token_ms = False, None, None, None
+            if not ok:
+                errors[endpoint] += 1
+            if latency_ms is not None and ok:
+                latencies[endpoint].append(latency_ms)
+            for timing in timings or []:
+                # Text turns pass straight through the audio nodes; only count real work
+                if endpoint == "/api/chat/audio" or timing["name"] not in AUDIO_NODES:
+                    nodes[timing["name"]].append(timing["ms"])
+            if first_token_ms is not None:
+                first_tokens.append(first_token_ms)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - start, latencies, errors, nodes, first_tokens
+
+
+async def main_async(args):
+    import httpx
+
+    processes = []
+    try:
+        if args.target:
+            base_url, fake_url = args.target.rstrip("/"), None
+        else:
+            base_url, fake_url, processes = start_servers(args)
+        timeout = httpx.Timeout(120.0)
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+            if fake_url:
+                await wait_ready(client, f"{fake_url}/v1/stats")
+            await wait_ready(client, "/api/health")
+            workload = build_workload(args)
+            if args.warmup:
+                await drive(client, workload[:args.warmup], min(args.concurrency, args.warmup))
+            wall_s, latencies, errors, nodes, first_tokens = await drive(client, workload, args.concurrency)
+            server_stats = (await client.get("/api/stats")).json() if args.server_stats else None
+            fake_stats = (await client.get(f"{fake_url}/v1/stats")).json() if fake_url else None
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    completed = sum(len(v) for v in latencies.values())
+    result = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "baseline")},
+        "wall_s": round(wall_s, 2),
+        "throughput_rps": round(completed / wall_s, 2) if wall_s else 0.0,
+        "errors": dict(errors),
+        "endpoints": {endpoint: summarize(values) for endpoint, values in sorted(latencies.items())},
+        "nodes": {node: summarize(values) for node, values in sorted(nodes.items())},
+        "stream_first_token": summarize(first_tokens) if first_tokens else None,
+        "fake_openai_calls": fake_stats,
+    }
+    if server_stats is not None:
+        result["server_stats"] = server_stats
+    return result
+
+
+def print_report(result, baseline=None):
+    def delta(path, value):
+        if baseline is None or value is None:
+            return ""
+        base = baseline
+        for key in path:
+            base = (base or {}).get(key)
+        if not base:
+            return ""
+        return f" ({(value - base) / base * 100:+.1f}%)"
+
+    print(f"\ncommit {result['commit']}  {result['config']['requests']} requests @ "
+          f"concurrency {result['config']['concurrency']}")
+    print(f"throughput: {result['throughput_rps']} req/s{delta(('throughput_rps',), result['throughput_rps'])}"
+          f"   errors: {result['errors'] or 0}")
+    for section in ("endpoints", "nodes"):
+        print(f"\n{section}:")
+        for name, stats in result[section].items():
+            cells = "  ".join(f"{q} {stats[q]:>8}{delta((section, name, q), stats[q])}"
+                              for q in ("p50_ms", "p95_ms", "p99_ms"))
+            print(f"  {name:<24} n={stats['count']:<5} {cells}")
+    if result["stream_first_token"]:
+        print(f"\nstream first token: p50 {result['stream_first_token']['p50_ms']} ms, "
+              f"p95 {result['stream_first_token']['p95_ms']} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--voice-ratio", type=float, default=0.2)
+    parser.add_argument("--stream-ratio", type=float, default=0.2)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0)
+    parser.add_argument("--llm-jitter-ms", type=float, default=50.0)
+    parser.add_argument("--stt-latency-ms", type=float, default=800.0)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--mongo-uri", default="mongomock://load")
+    parser.add_argument("--no-audio-preprocess", action="store_true")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST)
+    parser.add_argument("--target", help="drive an already running server instead of booting one")
+    parser.add_argument("--server-stats", action="store_true", help="include /api/stats in the JSON")
+    parser.add_argument("--out", help="write the result JSON here")
+    parser.add_argument("--baseline", help="earlier result JSON to compare against")
+    args = parser.parse_args()
+
+    result = asyncio.run(main_async(args))
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"\nwrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+# bulk_import.py - Streaming CSV / JSON-lines expense import for FinVoice AI Assistant
+#
+# Rows are parsed locally (no LLM), validated one by one and written in
+# unordered insert_many batches. Rollup deltas are summed in memory for the
+# whole import and applied once at the end, so an export spanning a few
+# hundred days costs a few hundred upserts however many rows it has. A bad
+# row only fails itself: the response lists it by line number.
+import os
+import csv
+import json
+import time
+import codecs
+import asyncio
+from collections import deque
+from datetime import datetime
+from functools import lru_cache
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from pymongo.errors import BulkWriteError
+
+import rollups
+import time_resolver
+from datastore import normalize_category
+from expense_parser import canonical_category, parse_amount
+
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "1000"))
+# Batches written concurrently while the next ones are being parsed
+BULK_MAX_INFLIGHT = int(os.getenv("BULK_MAX_INFLIGHT", "2"))
+BULK_MAX_ROWS = int(os.getenv("BULK_MAX_ROWS", "1000000"))
+BULK_MAX_REPORTED_ERRORS = int(os.getenv("BULK_MAX_REPORTED_ERRORS", "1000"))
+
+# Column names seen in bank / UPI app exports, per expense field
+FIELD_ALIASES = {
+    "date": ["date", "txn date", "transaction date", "value date", "posted date", "timestamp"],
+    "amount": ["amount", "debit", "withdrawal", "withdrawal amt", "withdrawal amount", "amount (inr)", "amt"],
+    "category": ["category", "type", "tag"],
+    "description": ["description", "narration", "details", "remarks", "particulars", "merchant", "note"],
+}
+_HEADER_TO_FIELD = {alias: field for field, aliases in FIELD_ALIASES.items() for alias in aliases}
+
+# Tried in order before time_resolver's precompiled patterns; day-first as in Indian exports.
+# Anything else is a row error: dateparser is never used for file rows (it takes
+# ~300 ms per unknown string and reads garbage such as "N/A" as a date).
+_DATE_FORMATS = ["%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d/%m/%y", "%d-%m-%y", "%d %b %Y", "%d-%b-%Y",
+                 "%d-%b-%y", "%d %B %Y", "%Y/%m/%d", "%d.%m.%Y"]
+
+
+class RowError(ValueError):
+    """A single row could not be turned into an expense."""
+
+
+def _field_name(header: str) -> Optional[str]:
+    return _HEADER_TO_FIELD.get(" ".join(header.strip().lower().replace(".", "").split()))
+
+
+@lru_cache(maxsize=8192)
+def _parse_explicit_date(value: str) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        pass
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def parse_date(value: str) -> Optional[datetime]:
+    """Exports repeat the same few hundred dates, so explicit formats are memoized per string."""
+    value = value.strip()
+    return _parse_explicit_date(value) or time_resolver.resolve_date(value, fallback=False)
+
+
+def build_expense(user_id: str, fields: Dict, now: datetime) -> Dict:
+    """Validate one row's fields and return the expense document to insert."""
+    raw_amount = fields.get("amount")
+    if raw_amount in (None, ""):
+        raise RowError("missing amount")
+    amount = float(raw_amount) if isinstance(raw_amount, (int, float)) else parse_amount(str(raw_amount))
+    if amount is None or amount <= 0:
+        raise RowError(f"invalid amount {raw_amount!r}")
+
+    raw_date = fields.get("date")
+    if not raw_date:
+        raise RowError("missing date")
+    date = parse_date(str(raw_date))
+    if date is None:
+        raise RowError(f"invalid date {raw_date!r}")
+
+    description = str(fields.get("description") or "").strip()
+    raw_category = str(fields.get("category") or "").strip()
+    category = (canonical_category(raw_category) or raw_category or canonical_category(description)
+                or "Miscellaneous")
+    return {
+        "user_id": user_id,
+        "amount": amount,
+        "category": category,
+        "category_norm": normalize_category(category),
+        "description": description or category,
+        "date": date,
+        "created_at": now,
+    }
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Decode a byte stream (e.g. Request.stream()) into lines without buffering the body."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+class ImportResult:
+    def __init__(self):
+        self.rows = 0
+        self.inserted = 0
+        self.failed = 0
+        self.errors: List[Dict] = []
+        self.rollups_stale = False
+        self.rollup_rows = rollups.group_expenses([])
+        self.rollups_ms = 0.0
+        self.started = time.perf_counter()
+
+    def add_error(self, line: int, message: str):
+        self.failed += 1
+        if len(self.errors) < BULK_MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": message})
+
+    def to_dict(self) -> Dict:
+        elapsed = time.perf_counter() - self.started
+        return {"success": self.failed == 0, "rows": self.rows, "inserted": self.inserted, "failed": self.failed,
+                "errors": sorted(self.errors, key=lambda e: e["line"]),
+                "errors_truncated": self.failed > len(self.errors), "rollups_stale": self.rollups_stale,
+                "rollup_upserts": len(self.rollup_rows), "rollups_ms": self.rollups_ms,
+                "elapsed_ms": round(elapsed * 1000, 1), "rows_per_s": round(self.rows / elapsed, 1) if elapsed else 0.0}
+
+
+async def _write_batch(batch: List[Tuple[int, Dict]], expenses_collection, result: ImportResult) -> None:
+    documents = [doc for _, doc in batch]
+    failed = set()
+    try:
+        await expenses_collection.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        for error in e.details.get("writeErrors", []):
+            failed.add(error["index"])
+            result.add_error(batch[error["index"]][0], error.get("errmsg", "write failed"))
+    except Exception as e:
+        for line, _ in batch:
+            result.add_error(line, f"write failed: {e}")
+        return
+    written = [doc for i, doc in enumerate(documents) if i not in failed]
+    result.inserted += len(written)
+    rollups.group_expenses(written, result.rollup_rows)
+
+
+def _rows(lines: List[Tuple[int, str]], fmt: str, columns: Dict[str, int]):
+    """Yield (line_number, fields or RowError) for a batch of raw lines."""
+    if fmt == "jsonl":
+        for line_no, line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_no, RowError(f"invalid JSON: {e.msg}")
+                continue
+            if not isinstance(record, dict):
+                yield line_no, RowError("expected a JSON object")
+                continue
+            yield line_no, {_field_name(k) or k: v for k, v in record.items()}
+        return
+    # One csv.reader per batch; quoted fields must not span lines
+    for (line_no, _), row in zip(lines, csv.reader(line for _, line in lines)):
+        yield line_no, {field: row[i].strip() if i < len(row) else "" for field, i in columns.items()}
+
+
+async def import_rows(lines: AsyncIterator[str], fmt: str, user_id: str, expenses_collection, rollups_collection,
+                      batch_size: Optional[int] = None) -> Dict:
+    """Import a CSV (with header row) or JSON-lines stream of expenses for one user.
+
+    Raises ValueError if the stream as a whole is unusable (unknown format,
+    CSV header without an amount/date column); row problems are reported in
+    the returned summary instead.
+    """
+    if fmt not in ("csv", "jsonl"):
+        raise ValueError(f"Unsupported format {fmt!r}; use 'csv' or 'jsonl'")
+    batch_size = batch_size or BULK_BATCH_SIZE
+    result = ImportResult()
+    now = datetime.now()
+    columns: Optional[Dict[str, int]] = None
+    raw: List[Tuple[int, str]] = []
+    inflight: deque = deque()
+
+    async def flush():
+        batch = []
+        for line_no, fields in _rows(raw, fmt, columns or {}):
+            try:
+                if isinstance(fields, RowError):
+                    raise fields
+                batch.append((line_no, build_expense(user_id, fields, now)))
+            except RowError as e:
+                result.add_error(line_no, str(e))
+        raw.clear()
+        if batch:
+            inflight.append(asyncio.create_task(_write_batch(batch, expenses_collection, result)))
+        while len(inflight) > BULK_MAX_INFLIGHT:
+            await inflight.popleft()
+
+    try:
+        line_no = 0
+        async for line in lines:
+            line_no += 1
+            if not line.strip():
+                continue
+            if fmt == "csv" and columns is None:
+                header = next(csv.reader([line]))
+                columns = {}
+                for i, name in enumerate(header):
+                    field = _field_name(name)
+                    if field and field not in columns:
+                        columns[field] = i
+                missing = {"amount", "date"} - set(columns)
+                if missing:
+                    raise ValueError(f"CSV header is missing column(s): {', '.join(sorted(missing))}")
+                continue
+            if result.rows >= BULK_MAX_ROWS:
+                result.add_error(line_no, f"row limit of {BULK_MAX_ROWS} reached; remaining rows skipped")
+                break
+            result.rows += 1
+            raw.append((line_no, line))
+            if len(raw) >= batch_size:
+                await flush()
+        await flush()
+    finally:
+        if inflight:
+            await asyncio.gather(*inflight)
+        if rollups.ROLLUPS_ENABLED and result.rollup_rows:
+            started = time.perf_counter()
+            try:
+                await rollups.apply_rows(rollups_collection, result.rollup_rows)
+                result.rollups_ms = round((time.perf_counter() - started) * 1000, 1)
+            except Exception as e:
+                # Expenses are in; `python rollups.py rebuild --user ...` repairs the totals
+                print(f"⚠ Rollup update failed after bulk import: {e}")
+                result.rollups_stale = True
+    return result.to_dict()
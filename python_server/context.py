@@ -0,0 +1,247 @@
+# context.py - Token-budgeted conversation context for FinVoice prompts
+import os
+import re
+import asyncio
+from collections import defaultdict
+from functools import lru_cache
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import sessions
+from sessions import Turn
+
+CONTEXT_ENABLED = os.getenv("CONTEXT_ENABLED", "true").lower() in ("1", "true", "yes")
+# Tokens of history (summary + recent turns) added to each prompt, at most
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "600"))
+CONTEXT_RECENT_TURNS = int(os.getenv("CONTEXT_RECENT_TURNS", "6"))
+CONTEXT_SUMMARY_MAX_TOKENS = int(os.getenv("CONTEXT_SUMMARY_MAX_TOKENS", "150"))
+# Older turns are folded into the summary once this many have piled up
+CONTEXT_SUMMARY_BATCH = int(os.getenv("CONTEXT_SUMMARY_BATCH", "4"))
+CONTEXT_TOKENIZER = os.getenv("CONTEXT_TOKENIZER", "o200k_base")
+# Messages this short are treated as follow-ups and routed with the conversation
+CONTEXT_FOLLOW_UP_WORDS = int(os.getenv("CONTEXT_FOLLOW_UP_WORDS", "4"))
+
+# ------------------ Token Counting ------------------
+_encoding = None
+_encoding_failed = False
+_APPROX_PIECES = re.compile(r"\w+|[^\w\s]")
+
+
+def _get_encoding():
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding(CONTEXT_TOKENIZER)
+        except Exception as e:
+            # tiktoken downloads its BPE ranks on first use; offline we estimate
+            print(f"⚠ tiktoken unavailable ({e.__class__.__name__}), estimating token counts")
+            _encoding_failed = True
+    return _encoding
+
+
+def tokenizer_name() -> str:
+    return CONTEXT_TOKENIZER if _get_encoding() is not None else "approx"
+
+
+def _approx_pieces(text: str) -> List[str]:
+    """Word/punctuation pieces, long words split every 4 chars (~BPE granularity)."""
+    pieces = []
+    for piece in _APPROX_PIECES.findall(text):
+        pieces.extend(piece[i:i + 4] for i in range(0, len(piece), 4))
+    return pieces
+
+
+def count_tokens(text: Optional[str]) -> int:
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return len(_approx_pieces(text))
+
+
+@lru_cache(maxsize=128)
+def _count_constant_tokens(text: str, exact: bool) -> int:
+    return count_tokens(text)
+
+
+def count_prompt_tokens(prompt) -> int:
+    """Tokens in a str prompt or a message list; system messages (the constant
+    prompts.py prefixes) are counted once per process."""
+    if isinstance(prompt, str):
+        return count_tokens(prompt)
+    exact = _get_encoding() is not None
+    return sum(_count_constant_tokens(m.content, exact) if getattr(m, "type", None) == "system"
+               else count_tokens(str(getattr(m, "content", m))) for m in prompt)
+
+
+def truncate_tokens(text: str, max_tokens: int, keep: str = "head") -> str:
+    """Cut text to max_tokens, keeping the start ("head") or the end ("tail")."""
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    encoding = _get_encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text)
+        kept = tokens[:max_tokens] if keep == "head" else tokens[-max_tokens:]
+        return encoding.decode(kept).strip()
+    words = text.split() if keep == "head" else text.split()[::-1]
+    kept, total = [], 0
+    for word in words:
+        total += len(_approx_pieces(word))
+        if total > max_tokens:
+            break
+        kept.append(word)
+    return " ".join(kept if keep == "head" else kept[::-1])
+
+
+# ------------------ Metrics ------------------
+class PromptStats:
+    """Prompt sizes per node, and how much of that is conversation context."""
+
+    def __init__(self):
+        self.calls = defaultdict(int)
+        self.tokens = defaultdict(int)
+        self.history_tokens = defaultdict(int)
+        self.max_tokens = defaultdict(int)
+
+    def record(self, node: str, prompt, history: str = "") -> int:
+        tokens = count_prompt_tokens(prompt)
+        self.calls[node] += 1
+        self.tokens[node] += tokens
+        self.history_tokens[node] += count_tokens(history)
+        self.max_tokens[node] = max(self.max_tokens[node], tokens)
+        return tokens
+
+    def snapshot(self) -> Dict:
+        nodes = {}
+        for node in sorted(self.calls):
+            calls = self.calls[node]
+            nodes[node] = {"calls": calls, "avg_tokens": round(self.tokens[node] / calls, 1),
+                           "avg_history_tokens": round(self.history_tokens[node] / calls, 1),
+                           "max_tokens": self.max_tokens[node]}
+        return nodes
+
+    def reset(self):
+        for counter in (self.calls, self.tokens, self.history_tokens, self.max_tokens):
+            counter.clear()
+
+
+prompt_stats = PromptStats()
+
+
+def context_snapshot() -> Dict:
+    return {"enabled": CONTEXT_ENABLED, "tokenizer": tokenizer_name(), "token_budget": CONTEXT_TOKEN_BUDGET,
+            "recent_turns": CONTEXT_RECENT_TURNS, "summary_max_tokens": CONTEXT_SUMMARY_MAX_TOKENS,
+            "nodes": prompt_stats.snapshot()}
+
+
+# ------------------ Rolling Summary ------------------
+Summarizer = Callable[[str, List[Turn]], Awaitable[str]]
+
+
+async def extractive_summary(previous: str, turns: List[Turn]) -> str:
+    """LLM-free fallback: the user's side of older turns, oldest content dropped first."""
+    asked = " ".join(f"User asked: {turn.content.strip()}" for turn in turns if turn.role == "user")
+    return truncate_tokens(f"{previous} {asked}".strip(), CONTEXT_SUMMARY_MAX_TOKENS, keep="tail")
+
+
+_summarizer: Summarizer = extractive_summary
+_refreshing = set()
+_background = set()
+
+
+def set_summarizer(summarizer: Optional[Summarizer]) -> None:
+    global _summarizer
+    _summarizer = summarizer or extractive_summary
+
+
+async def refresh_summary(user_id: str) -> None:
+    """Fold turns that have left the verbatim window into the stored summary."""
+    if user_id in _refreshing:
+        return
+    _refreshing.add(user_id)
+    try:
+        store = sessions.get_session_store()
+        turns = await store.history(user_id)
+        summary, until = await store.get_summary(user_id)
+        older = [turn for turn in turns[:max(len(turns) - CONTEXT_RECENT_TURNS, 0)] if turn.timestamp > until]
+        if len(older) < CONTEXT_SUMMARY_BATCH:
+            return
+        try:
+            updated = await _summarizer(summary, older)
+        except Exception as e:
+            print(f"⚠ Summary refresh failed, using extractive summary: {e}")
+            updated = await extractive_summary(summary, older)
+        await store.set_summary(user_id, truncate_tokens(updated, CONTEXT_SUMMARY_MAX_TOKENS), older[-1].timestamp)
+    except Exception as e:
+        print(f"⚠ Could not refresh conversation summary: {e}")
+    finally:
+        _refreshing.discard(user_id)
+
+
+async def record_turn(user_id: str, message: str, response: Optional[str]) -> None:
+    """Store the turn, then refresh the summary in the background (off the response path)."""
+    await sessions.record_turn(user_id, message, response)
+    if CONTEXT_ENABLED:
+        task = asyncio.create_task(refresh_summary(user_id))
+        _background.add(task)
+        task.add_done_callback(_background.discard)
+
+
+# ------------------ Context Window ------------------
+async def load_context(user_id: str) -> Tuple[List[Dict], str]:
+    """Return (recent turns, summary) that together fit in CONTEXT_TOKEN_BUDGET.
+
+    The newest turns are kept verbatim; older ones are dropped first, and a
+    single oversized latest turn is truncated rather than dropped.
+    """
+    store = sessions.get_session_store()
+    turns = await store.history(user_id)
+    summary, _ = await store.get_summary(user_id)
+    summary = truncate_tokens(summary, min(CONTEXT_SUMMARY_MAX_TOKENS, CONTEXT_TOKEN_BUDGET))
+
+    budget = CONTEXT_TOKEN_BUDGET - count_tokens(summary)
+    kept = []
+    for turn in reversed(turns[-CONTEXT_RECENT_TURNS:] if CONTEXT_RECENT_TURNS else []):
+        tokens = count_tokens(turn.content)
+        if tokens > budget:
+            if not kept and budget > 0:
+                kept.append({"role": turn.role, "content": truncate_tokens(turn.content, budget)})
+            break
+        kept.append({"role": turn.role, "content": turn.content})
+        budget -= tokens
+    kept.reverse()
+    return kept, summary
+
+
+# "and last month?", "what about transport", "same for rent", "move it to bills"
+_FOLLOW_UP_RE = re.compile(
+    r"^\s*(?:and|also|but|then|same|what about|how about|ok(?:ay)?[\s,]+(?:and|what))\b"
+    r"|\b(?:it|that|those|these|them|this one|that one)\b",
+    re.IGNORECASE,
+)
+
+
+def is_follow_up(message: Optional[str]) -> bool:
+    """Whether a message likely needs earlier turns to be understood.
+
+    The routers only add history for these, so a standalone message keeps the
+    same prompt (and LLM cache key) whatever was said before it.
+    """
+    if not message:
+        return False
+    return len(message.split()) <= CONTEXT_FOLLOW_UP_WORDS or bool(_FOLLOW_UP_RE.search(message))
+
+
+def format_context(history: List[Dict], summary: Optional[str]) -> str:
+    """Prompt block for the conversation so far; empty when there is none."""
+    if not history and not summary:
+        return ""
+    lines = ["Conversation so far (use it to resolve follow-ups such as 'and last month?'):"]
+    if summary:
+        lines.append(f"Earlier: {summary}")
+    for turn in history:
+        lines.append(f"{'User' if turn['role'] == 'user' else 'FinVoice'}: {turn['content']}")
+    return "\n".join(lines)
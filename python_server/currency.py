@@ -0,0 +1,68 @@
+# currency.py - Rewrite dollar amounts and symbols in model replies as Indian Rupees
+#
+# One compiled pattern, one re.sub pass: each match is an amount with a
+# currency prefix and/or suffix ("$1,500", "Rs. 250", "12.50 dollars",
+# "₹500 rupees"), a bare "$", a dollar word or USD. Amounts keep their
+# digits, Indian/Western grouping and decimals and come out as "₹<amount>".
+import re
+from typing import Optional
+
+_AMOUNT = r"\d[\d,]*(?:\.\d+)?"
+# "Rs"/"USD"/"INR" only count as a prefix when an amount follows
+_PREFIX = r"(?:[$₹]|\b(?:USD|INR|[Rr]s\.?)(?=\s*\d))"
+_SUFFIX = r"(?:\$|\b(?i:rupees?|dollars?|usd|inr)\b)"
+
+_CURRENCY_RE = re.compile(
+    # Every match starts with one of these characters; checking that first
+    # rejects most positions without trying each alternative
+    r"(?=[$₹\dURIrDdu])(?:"
+    rf"(?P<prefixed>{_PREFIX})\s*(?P<amount>{_AMOUNT})(?:\s*{_SUFFIX})?"
+    rf"|(?<![\w.,])(?P<suffixed>{_AMOUNT})\s*{_SUFFIX}"
+    r"|(?P<dollar_sign>\$)"
+    r"|\b(?P<dollar_word>[Dd]ollar|DOLLAR)(?P<plural>[sS]?)\b"
+    r"|\b(?P<usd>USD|usd)\b)"
+)
+_WORDS = {"dollar": "rupee", "Dollar": "Rupee", "DOLLAR": "RUPEE", "USD": "INR", "usd": "inr"}
+
+# Trailing text a stream must hold back because the next token could still
+# change it: "Rs. " before "250", or a number with the whitespace and suffix
+# after it ("500 " before "dollars", "5,000 INR " before "monthly")
+_STREAM_HOLDBACK = re.compile(
+    r"(?:(?:[₹$]|\b(?:USD|INR|[Rr]s\.?))\s*)?"
+    rf"(?:\d[\d,.]*\s*(?:{_SUFFIX}\s*)?)?"
+    r"\S*$")
+
+
+def _replace(match: re.Match) -> str:
+    amount = match.group("amount") or match.group("suffixed")
+    if amount is not None:
+        return f"₹{amount}"
+    if match.group("dollar_sign"):
+        return "₹"
+    word = match.group("dollar_word")
+    if word is not None:
+        return _WORDS[word] + match.group("plural")
+    return _WORDS[match.group("usd")]
+
+
+def fix_currency_formatting(text: Optional[str]) -> Optional[str]:
+    if not text:
+        return text
+    return _CURRENCY_RE.sub(_replace, text)
+
+
+class CurrencyStreamFixer:
+    """Applies fix_currency_formatting to a token stream without splitting a match."""
+
+    def __init__(self):
+        self.buffer = ""
+
+    def feed(self, delta: str) -> str:
+        self.buffer += delta or ""
+        cut = _STREAM_HOLDBACK.search(self.buffer).start()
+        ready, self.buffer = self.buffer[:cut], self.buffer[cut:]
+        return fix_currency_formatting(ready)
+
+    def flush(self) -> str:
+        ready, self.buffer = self.buffer, ""
+        return fix_currency_formatting(ready)
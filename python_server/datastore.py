@@ -0,0 +1,219 @@
+# datastore.py - Non-blocking MongoDB access layer for FinVoice AI Assistant
+import os
+import time
+import asyncio
+import inspect
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict, Any
+from dotenv import load_dotenv
+
+import metrics
+
+load_dotenv()
+
+# ------------------ Configuration ------------------
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "finvoice")
+# "auto" picks the first available of: pymongo async API, motor, thread pool
+MONGO_DRIVER = os.getenv("MONGO_DRIVER", "auto").lower()
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "3000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "3000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "5000"))
+# Size of the bounded pool used when only a synchronous driver is available
+MONGO_EXECUTOR_WORKERS = int(os.getenv("MONGO_EXECUTOR_WORKERS", "8"))
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _client_options() -> Dict[str, Any]:
+    return {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+        "socketTimeoutMS": MONGO_SOCKET_TIMEOUT_MS,
+    }
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=MONGO_EXECUTOR_WORKERS, thread_name_prefix="finvoice-db")
+    return _executor
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """Run a blocking driver call on the bounded DB thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), lambda: fn(*args, **kwargs))
+
+
+# ------------------ Async Collection Facade ------------------
+def _traced(method):
+    """Record latency / errors of a collection operation in metrics.py."""
+    op = method.__name__
+
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        started = time.perf_counter()
+        error = False
+        try:
+            with metrics.span(f"db.{op}", collection=self.name):
+                return await method(self, *args, **kwargs)
+        except Exception:
+            error = True
+            raise
+        finally:
+            metrics.record_db(self.name, op, time.perf_counter() - started, error)
+    return wrapper
+
+
+class AsyncCollection:
+    """Awaitable wrapper over either a native async collection or a sync one.
+
+    Native collections (pymongo async / motor) are awaited directly; sync
+    collections (pymongo / mongomock) are offloaded to the DB thread pool so
+    the event loop never waits on a Mongo round trip.
+    """
+
+    def __init__(self, collection, native: bool):
+        self.collection = collection
+        self.native = native
+        self.name = collection.name
+
+    async def _call(self, method: str, *args, **kwargs):
+        fn = getattr(self.collection, method)
+        if self.native:
+            return await fn(*args, **kwargs)
+        return await run_blocking(fn, *args, **kwargs)
+
+    @_traced
+    async def insert_one(self, document: Dict):
+        return await self._call("insert_one", document)
+
+    @_traced
+    async def insert_many(self, documents: List[Dict], ordered: bool = True):
+        return await self._call("insert_many", documents, ordered=ordered)
+
+    @_traced
+    async def bulk_write(self, requests: List, ordered: bool = True):
+        return await self._call("bulk_write", requests, ordered=ordered)
+
+    @_traced
+    async def update_one(self, filter: Dict, update: Dict, upsert: bool = False):
+        return await self._call("update_one", filter, update, upsert=upsert)
+
+    @_traced
+    async def update_many(self, filter: Dict, update: Dict):
+        return await self._call("update_many", filter, update)
+
+    @_traced
+    async def create_index(self, keys: List, **kwargs):
+        return await self._call("create_index", keys, **kwargs)
+
+    @_traced
+    async def delete_many(self, filter: Dict):
+        return await self._call("delete_many", filter)
+
+    @_traced
+    async def count_documents(self, filter: Dict) -> int:
+        return await self._call("count_documents", filter)
+
+    @_traced
+    async def aggregate(self, pipeline: List[Dict]) -> List[Dict]:
+        if not self.native:
+            return await run_blocking(lambda: list(self.collection.aggregate(pipeline)))
+        # pymongo's async API returns a coroutine, motor returns a cursor directly
+        cursor = self.collection.aggregate(pipeline)
+        if inspect.isawaitable(cursor):
+            cursor = await cursor
+        return await cursor.to_list(length=None)
+
+    @_traced
+    async def find(self, filter: Dict, projection: Optional[Dict] = None,
+                   sort: Optional[List] = None, limit: int = 0) -> List[Dict]:
+        def build_cursor():
+            cursor = self.collection.find(filter, projection)
+            if sort:
+                cursor = cursor.sort(sort)
+            if limit:
+                cursor = cursor.limit(limit)
+            return cursor
+
+        if not self.native:
+            return await run_blocking(lambda: list(build_cursor()))
+        return await build_cursor().to_list(length=None)
+
+    @_traced
+    async def explain_find(self, filter: Dict, sort: Optional[List] = None) -> Dict:
+        def build_cursor():
+            cursor = self.collection.find(filter)
+            return cursor.sort(sort) if sort else cursor
+
+        if not self.native:
+            return await run_blocking(lambda: build_cursor().explain())
+        return await build_cursor().explain()
+
+
+def normalize_category(category: Optional[str]) -> str:
+    """Stored as category_norm so category filters are exact, index-friendly matches."""
+    return (category or "Miscellaneous").strip().lower()
+
+
+# ------------------ Client Factory ------------------
+def _resolve_driver() -> str:
+    if MONGO_URI.startswith("mongomock://"):
+        return "mongomock"
+    if MONGO_DRIVER != "auto":
+        return MONGO_DRIVER
+    try:
+        from pymongo import AsyncMongoClient  # noqa: F401  (pymongo >= 4.9)
+        return "pymongo_async"
+    except ImportError:
+        pass
+    try:
+        import motor.motor_asyncio  # noqa: F401
+        return "motor"
+    except ImportError:
+        return "threadpool"
+
+
+def create_client():
+    """Return (client, driver_name, native) for the configured driver."""
+    driver = _resolve_driver()
+    if driver == "pymongo_async":
+        from pymongo import AsyncMongoClient
+        return AsyncMongoClient(MONGO_URI, **_client_options()), driver, True
+    if driver == "motor":
+        from motor.motor_asyncio import AsyncIOMotorClient
+        return AsyncIOMotorClient(MONGO_URI, **_client_options()), driver, True
+    if driver == "mongomock":
+        import mongomock
+        return mongomock.MongoClient(), driver, False
+    from pymongo import MongoClient
+    return MongoClient(MONGO_URI, **_client_options()), "threadpool", False
+
+
+async def ping_client(client, native: bool) -> None:
+    """Round-trip to the server, opening the first pooled connection."""
+    if native:
+        await client.admin.command("ping")
+    else:
+        await run_blocking(client.admin.command, "ping")
+
+
+async def close_client(client) -> None:
+    """Close a client; AsyncMongoClient.close() is a coroutine, motor's and pymongo's are not."""
+    result = client.close()
+    if asyncio.iscoroutine(result):
+        await result
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
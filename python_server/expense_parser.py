@@ -0,0 +1,176 @@
+# expense_parser.py - Local "spent X on Y" extractor that avoids the structured LLM call
+import re
+from collections import defaultdict
+from typing import Optional, Tuple
+
+from schemas import ExpenseIntent
+
+# Canonical category -> spoken synonyms (Indian-English first)
+CATEGORY_SYNONYMS = {
+    "Food": ["food", "lunch", "dinner", "breakfast", "snacks", "snack", "chai", "tea", "coffee", "meal", "meals",
+             "restaurant", "zomato", "swiggy", "biryani", "pizza", "dosa", "eating out", "canteen", "tiffin"],
+    "Groceries": ["groceries", "grocery", "vegetables", "veggies", "sabzi", "kirana", "milk", "fruits", "bigbasket",
+                  "blinkit", "zepto", "ration"],
+    "Transport": ["transport", "auto", "rickshaw", "cab", "taxi", "uber", "ola", "rapido", "bus", "metro", "train",
+                  "petrol", "diesel", "fuel", "parking", "toll"],
+    "Travel": ["travel", "flight", "flights", "trip", "hotel", "vacation", "holiday", "irctc"],
+    # Bare "gas" is left out: it is petrol as often as it is the cooking-gas bill
+    "Bills": ["bill", "bills", "electricity", "light bill", "water bill", "gas bill", "gas cylinder", "lpg",
+              "cylinder", "recharge", "mobile", "internet", "wifi", "broadband", "dth"],
+    "Rent": ["rent", "house rent", "pg", "hostel", "maintenance"],
+    "Shopping": ["shopping", "clothes", "shoes", "amazon", "flipkart", "myntra", "electronics", "gadgets"],
+    "Entertainment": ["entertainment", "movie", "movies", "netflix", "hotstar", "spotify", "concert", "games",
+                      "party", "outing"],
+    "Health": ["health", "medicine", "medicines", "doctor", "hospital", "pharmacy", "chemist", "gym", "medical"],
+    "Education": ["education", "books", "book", "course", "fees", "tuition", "school", "college", "exam"],
+}
+
+_SYNONYM_TO_CATEGORY = {
+    synonym: category for category, synonyms in CATEGORY_SYNONYMS.items() for synonym in synonyms
+}
+# Longest synonyms first so "light bill" wins over "bill"
+_CATEGORY_RE = re.compile(
+    r"\b(" + "|".join(re.escape(s) for s in sorted(_SYNONYM_TO_CATEGORY, key=len, reverse=True)) + r")\b"
+)
+
+_MULTIPLIERS = {"k": 1_000, "thousand": 1_000, "lakh": 100_000, "lakhs": 100_000, "lac": 100_000,
+                "lacs": 100_000, "crore": 10_000_000, "crores": 10_000_000}
+
+_AMOUNT_RE = re.compile(
+    r"(?:₹|\brs\.?|\binr)?\s*"
+    r"(?P<number>\d{1,3}(?:,\d{2,3})+(?:\.\d+)?|\d+(?:\.\d+)?)"
+    r"\s*(?P<suffix>k|thousand|lakhs?|lacs?|crores?)?\b"
+    r"\s*(?:rupees|rupee|rs\.?|inr|bucks)?",
+    re.IGNORECASE,
+)
+
+_ADD_RE = re.compile(
+    r"\b(?:spent|spend|paid|pay|bought|purchased|gave|add(?:ed)? (?:an? )?expense|log(?:ged)?|expense of)\b"
+)
+_QUERY_RE = re.compile(
+    r"\b(?:how much|show|list|what (?:did|have|are|were)|total|summary|tell me)\b"
+)
+_DATE_RE = re.compile(
+    r"\b(?:day before yesterday|today|yesterday|tonight|this morning|last night"
+    r"|(?:last|past|previous) \d+ (?:days?|weeks?|months?)"
+    r"|(?:last|this|past|previous) (?:week|month|year)"
+    r"|(?:\d+ (?:days?|weeks?) ago)"
+    r"|(?:on |last )?(?:monday|tuesday|wednesday|thursday|friday|saturday|sunday)"
+    r"|\d{1,2}[/-]\d{1,2}(?:[/-]\d{2,4})?)\b"
+)
+_MONTH_NAMES = ["january", "february", "march", "april", "june", "july", "august", "september", "october",
+                "november", "december"]
+# Time expressions _DATE_RE doesn't resolve ("in september", "on 5th", "since monday"), checked after
+# the recognised phrase is removed: stamping such an expense "now" would be wrong, so the LLM takes it
+_UNRESOLVED_DATE_RE = re.compile(
+    r"\b(?:" + "|".join(m[:3] + f"(?:{m[3:]})?" for m in _MONTH_NAMES) + r")\b"
+    r"|\b(?:in|on|of|during) may\b|\bmay \d"
+    r"|\b\d{1,2}(?:st|nd|rd|th)\b"
+    r"|\b(?:ago|since|until|till|tomorrow|weekend|fortnight|earlier|before|after|between|from)\b"
+)
+# "I did not spend 500 on food" must not be recorded as an expense
+_NEGATION_RE = re.compile(
+    r"\b(?:not|never|no longer|didn'?t|don'?t|doesn'?t|haven'?t|hasn'?t|won'?t|wasn'?t|cancel(?:led)?|undo"
+    r"|remove|delete|refund(?:ed)?)\b|n't\b"
+)
+# "can I afford to spend 3000 on shoes", "I will pay 500 for internet": plans and questions, not records
+_HYPOTHETICAL_RE = re.compile(
+    r"\b(?:can|could|should|shall|would|will|might|must|afford|wanna|gonna"
+    r"|(?:want|wants|need|needs|have|has|plan|planning|going|trying|hoping) to|thinking of|about to)\b|\w'll\b"
+)
+_SPENDING_RE = re.compile(r"\b(?:spend|spent|spending|expenses?|transactions?|paid|pay|cost)\b")
+_UNKNOWN_TARGET_RE = re.compile(r"\b(?:on|for)\s+(?:the\s+|my\s+)?(?!(?:everything|all|anything)\b)\w+")
+# "2000 on shopping" - an amount leading the sentence implies an add
+_BARE_AMOUNT_RE = re.compile(r"^\s*(?:₹|rs\.?\s*)?\d[\d,.]*\s*\w*\s+(?:on|for)\b")
+# Numbers that belong to a date phrase must not be mistaken for amounts
+_DATE_NUMBER_RE = re.compile(r"\b(?:last|past|previous) \d+ |\b\d+ (?:days?|weeks?|months?) ago\b|\b\d{1,2}[/-]\d{1,2}(?:[/-]\d{2,4})?\b")
+
+
+class ParserStats:
+    """How many expense turns were parsed locally vs. sent to the structured LLM."""
+
+    def __init__(self):
+        self.counts = defaultdict(int)
+
+    def record(self, outcome: str):
+        self.counts[outcome] += 1
+
+    def snapshot(self):
+        return dict(self.counts)
+
+
+parser_stats = ParserStats()
+
+
+def _extract_amount(text: str) -> Tuple[Optional[float], int]:
+    """Return (amount, number_of_amounts_found) with date numbers masked out."""
+    masked = _DATE_NUMBER_RE.sub(lambda m: " " * len(m.group(0)), text)
+    amounts = []
+    for match in _AMOUNT_RE.finditer(masked):
+        value = float(match.group("number").replace(",", ""))
+        suffix = (match.group("suffix") or "").lower()
+        amounts.append(value * _MULTIPLIERS.get(suffix, 1))
+    if len(amounts) != 1:
+        return None, len(amounts)
+    return amounts[0], 1
+
+
+def _extract_category(text: str) -> Optional[str]:
+    categories = {_SYNONYM_TO_CATEGORY[m.group(1)] for m in _CATEGORY_RE.finditer(text)}
+    if len(categories) == 1:
+        return categories.pop()
+    return None
+
+
+def parse_amount(text: str) -> Optional[float]:
+    """Amount from a standalone field such as "₹1,250.50", "Rs 2k" or "1.5 lakh"."""
+    match = _AMOUNT_RE.fullmatch((text or "").strip())
+    if not match:
+        return None
+    value = float(match.group("number").replace(",", ""))
+    return value * _MULTIPLIERS.get((match.group("suffix") or "").lower(), 1)
+
+
+def canonical_category(text: Optional[str]) -> Optional[str]:
+    """Canonical category for a category name or free-text description, if exactly one matches."""
+    if not text:
+        return None
+    return _extract_category(" ".join(text.lower().split()))
+
+
+def parse_expense(text: str) -> Optional[ExpenseIntent]:
+    """Parse common add/query expense utterances locally.
+
+    Returns None whenever the utterance is ambiguous (no or several amounts,
+    conflicting categories, no clear action, a negation, a modal or future
+    form, a time expression it can't resolve) so the caller can fall back to
+    the structured LLM.
+    """
+    if not text:
+        return None
+    lowered = " ".join(text.lower().split())
+    if _NEGATION_RE.search(lowered) or _HYPOTHETICAL_RE.search(lowered):
+        return None
+    date_match = _DATE_RE.search(lowered)
+    date_phrase = date_match.group(0).replace("on ", "", 1) if date_match else None
+    if _UNRESOLVED_DATE_RE.search(_DATE_RE.sub(" ", lowered)):
+        return None
+    category = _extract_category(lowered)
+
+    amount, found = _extract_amount(lowered)
+
+    if _QUERY_RE.search(lowered):
+        if found or not _SPENDING_RE.search(lowered):
+            return None
+        # "on <something we don't know>" - let the LLM work out the category
+        if category is None and _UNKNOWN_TARGET_RE.search(_DATE_RE.sub(" ", lowered)):
+            return None
+        return ExpenseIntent(action="query_expense", amount=None, category=category,
+                             description=text.strip(), date=date_phrase)
+
+    if amount is None or amount <= 0 or category is None:
+        return None
+    if not _ADD_RE.search(lowered) and not _BARE_AMOUNT_RE.search(lowered):
+        return None
+    return ExpenseIntent(action="add_expense", amount=amount, category=category,
+                         description=text.strip(), date=date_phrase)
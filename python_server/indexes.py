@@ -0,0 +1,128 @@
+# indexes.py - Index provisioning and category_norm migration for FinVoice collections
+#
+#   python indexes.py ensure    # create indexes (also runs on API startup)
+#   python indexes.py migrate   # backfill category_norm on existing expenses
+#   python indexes.py explain   # fail unless summary queries use an index
+#
+# The API runs the category_norm migration during startup warm-up (once per
+# database, recorded as a marker in the migrations collection), because
+# category filters match category_norm only.
+#
+# Explain plans need a real mongod (mongomock has no planner).
+# benchmarks/check_index_plans.py runs the same check against a scratch
+# database: it skips when no mongod answers, and --require makes it fail
+# instead, for CI jobs that start a mongod service.
+import argparse
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from pymongo import ASCENDING, DESCENDING
+
+from datastore import normalize_category
+
+CATEGORY_NORM_MARKER = "category_norm"
+INDEXES = {
+    "expenses": [
+        # Also covers the analytics query (date, category_norm and amount for one user)
+        ([("user_id", ASCENDING), ("date", ASCENDING), ("category_norm", ASCENDING), ("amount", ASCENDING)],
+         {"name": "user_date_category_amount"}),
+        ([("user_id", ASCENDING), ("category_norm", ASCENDING), ("date", ASCENDING)], {"name": "user_category_date"}),
+    ],
+    "goals": [
+        ([("user_id", ASCENDING), ("created_at", DESCENDING)], {"name": "user_created_at"}),
+    ],
+    "expense_rollups": [
+        ([("user_id", ASCENDING), ("day", ASCENDING), ("category_norm", ASCENDING)],
+         {"name": "user_day_category", "unique": True}),
+    ],
+}
+
+
+async def ensure_indexes(collections: Dict) -> List[str]:
+    """Create every index in INDEXES; create_index is a no-op when it already exists."""
+    created = []
+    for name, specs in INDEXES.items():
+        collection = collections.get(name)
+        if collection is None:
+            continue
+        for keys, options in specs:
+            created.append(f"{name}.{await collection.create_index(keys, **options)}")
+    return created
+
+
+async def migrate_category_norm(expenses_collection, batch_size: int = 5000) -> int:
+    """Set category_norm on expenses written before the field existed."""
+    updated = 0
+    while True:
+        batch = await expenses_collection.find({"category_norm": {"$exists": False}},
+                                               {"_id": 1, "category": 1}, limit=batch_size)
+        if not batch:
+            return updated
+        ids_by_norm = defaultdict(list)
+        for doc in batch:
+            ids_by_norm[normalize_category(doc.get("category"))].append(doc["_id"])
+        for norm, ids in ids_by_norm.items():
+            result = await expenses_collection.update_many({"_id": {"$in": ids}}, {"$set": {"category_norm": norm}})
+            updated += result.modified_count
+
+
+async def ensure_category_norm(expenses_collection, migrations_collection) -> int:
+    """migrate_category_norm once per database; later starts skip the unindexed $exists scan."""
+    if await migrations_collection.count_documents({"_id": CATEGORY_NORM_MARKER}):
+        return 0
+    updated = await migrate_category_norm(expenses_collection)
+    await migrations_collection.update_one({"_id": CATEGORY_NORM_MARKER}, {"$set": {"completed_at": datetime.now()}},
+                                           upsert=True)
+    return updated
+
+
+def plan_stages(plan: Dict) -> List[str]:
+    """Flatten the stage names of an explain() winning plan."""
+    stages = []
+    while plan:
+        stages.append(plan.get("stage"))
+        plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+    return stages
+
+
+async def explain_summary_queries(expenses_collection, goals_collection) -> Dict[str, List[str]]:
+    since = datetime.now() - timedelta(days=7)
+    queries = {
+        "summary": (expenses_collection, {"user_id": "explain_user", "date": {"$gte": since}}, None),
+        "summary_by_category": (expenses_collection,
+                                {"user_id": "explain_user", "category_norm": "food", "date": {"$gte": since}}, None),
+        "goals": (goals_collection, {"user_id": "explain_user"}, [("created_at", DESCENDING)]),
+    }
+    plans = {}
+    for name, (collection, query, sort) in queries.items():
+        explain = await collection.explain_find(query, sort)
+        plans[name] = plan_stages(explain["queryPlanner"]["winningPlan"])
+    return plans
+
+
+async def _main(args):
+    import backend
+
+    backend.initialize_database()
+    if args.command == "ensure":
+        print(f"✅ Indexes: {', '.join(await backend.ensure_database_indexes())}")
+    elif args.command == "migrate":
+        updated = await migrate_category_norm(backend.expenses_collection)
+        await backend.migrations_collection.update_one(
+            {"_id": CATEGORY_NORM_MARKER}, {"$set": {"completed_at": datetime.now()}}, upsert=True)
+        print(f"✅ Set category_norm on {updated} expenses")
+    else:
+        plans = await explain_summary_queries(backend.expenses_collection, backend.goals_collection)
+        scans = [name for name, stages in plans.items() if "COLLSCAN" in stages]
+        for name, stages in plans.items():
+            print(f"{'❌' if name in scans else '✅'} {name}: {' <- '.join(stages)}")
+        return 1 if scans else 0
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage FinVoice MongoDB indexes")
+    parser.add_argument("command", choices=["ensure", "migrate", "explain"])
+    raise SystemExit(asyncio.run(_main(parser.parse_args())))
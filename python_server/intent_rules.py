@@ -0,0 +1,112 @@
+# intent_rules.py - Deterministic fast-path intent router for FinVoice AI Assistant
+import os
+import re
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+# Minimum score (0-1) and lead over the runner-up before we skip the LLM router
+FAST_ROUTE_THRESHOLD = float(os.getenv("FAST_ROUTE_THRESHOLD", "0.8"))
+FAST_ROUTE_MARGIN = float(os.getenv("FAST_ROUTE_MARGIN", "0.4"))
+FAST_ROUTE_ENABLED = os.getenv("FAST_ROUTE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+VALID_ROUTES = ["expense_manager", "financial_insights", "goal_advisor", "conversation_manager", "exit_handler"]
+
+_AMOUNT = r"(?:₹|rs\.?|inr)?\s*\d[\d,]*(?:\.\d+)?\s*(?:k|lakh|lakhs|rupees|rs|bucks)?"
+
+# (pattern, weight) per specialist; weights of matching patterns add up to the score
+_RULES: Dict[str, List[Tuple[str, float]]] = {
+    "expense_manager": [
+        # Only a past-tense statement is certain; "spend 300 on food" needs the "on/for" rule as well
+        (rf"\b(?:spent|paid|bought|purchased)\b.*?{_AMOUNT}", 1.0),
+        (rf"\b(?:spend|pay|buy)\b.*?{_AMOUNT}", 0.5),
+        # Plans and advice questions ("can I afford to spend 3000", "help me pay off my loan") are not records
+        (r"\b(?:can|could|should|shall|would|will|might|must|afford|wanna|gonna|help me|how (?:do|can|should) i"
+         r"|(?:want|need|have|plan|planning|going|trying) to|spend less|pay off)\b|\w'll\b", -1.0),
+        (rf"{_AMOUNT}\s*(?:on|for)\s+\w+", 0.6),
+        (r"\bhow much (?:did|have) i (?:spend|spent|pay|paid)\b", 1.0),
+        (r"\b(?:show|list|what are|what were) (?:my )?(?:expenses|spending|transactions)\b", 0.9),
+        (r"\b(?:expense|expenses|bill|cost|spending|money on)\b", 0.5),
+        (r"\bhow much\b", 0.3),
+    ],
+    "financial_insights": [
+        (r"\b(?:spending habits?|savings rate|trends?|pattern|analy[sz]e|analysis|insights?)\b", 0.9),
+        (r"\b(?:most|least|biggest|highest|lowest)\b", 0.4),
+    ],
+    "goal_advisor": [
+        (r"\b(?:save money|saving for|savings goal|financial goal|budget|goals?|invest|investment|sip|mutual funds?"
+         r"|afford|spend less|cut (?:down|back)|pay off)\b", 0.9),
+        (r"\b(?:save|target|retire|retirement)\b", 0.5),
+    ],
+    "conversation_manager": [
+        (r"^\s*(?:hi+|hello+|hey+|hiya|namaste|yo|good (?:morning|afternoon|evening))\b[\s!.,]*(?:there|finvoice)?[\s!.,]*$", 1.0),
+        (r"^\s*(?:thanks|thank you|thank u|thx|ok(?:ay)?|cool|great|nice)\b(?!.*\bbye\b)[\s\w!.,]{0,20}$", 1.0),
+        (r"\b(?:how are you|who are you|what can you do)\b", 0.9),
+        (r"^\s*(?:hi|hello|hey)\b", 0.4),
+    ],
+    "exit_handler": [
+        (r"^\s*(?:bye+|goodbye|good bye|bye bye|see (?:you|ya)(?: later)?|good night)\b[\s\w!.,]{0,20}$", 1.0),
+        # "stop spending on food" is not an exit: these only count as the whole utterance
+        (r"^\s*(?:ok(?:ay)?[\s,]+)?(?:quit|exit|stop|end chat|that'?s all)(?:\s+(?:now|please|for (?:now|today)))?[\s!.,]*$", 1.0),
+        (r"\b(?:goodbye|bye|see you later)[\s!.]*$", 1.0),
+    ],
+}
+
+_COMPILED: Dict[str, List[Tuple[re.Pattern, float]]] = {
+    route: [(re.compile(pattern, re.IGNORECASE), weight) for pattern, weight in rules]
+    for route, rules in _RULES.items()
+}
+
+
+def score_routes(text: str) -> Dict[str, float]:
+    """Score every specialist for the given utterance (0 or less = no evidence, 1 = certain)."""
+    scores = {}
+    for route, rules in _COMPILED.items():
+        total = 0.0
+        for pattern, weight in rules:
+            if pattern.search(text):
+                total += weight
+        scores[route] = min(total, 1.0)
+    return scores
+
+
+def classify(text: str) -> Tuple[Optional[str], float]:
+    """Return (route, confidence) or (None, confidence) when the LLM should decide."""
+    if not text or not text.strip():
+        return "conversation_manager", 1.0
+    scores = score_routes(text)
+    ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+    (best, best_score), (_, runner_up) = ranked[0], ranked[1]
+    confidence = round(best_score - runner_up, 3)
+    if best_score >= FAST_ROUTE_THRESHOLD and confidence >= FAST_ROUTE_MARGIN:
+        return best, confidence
+    return None, confidence
+
+
+# ------------------ Hit/Miss Counters ------------------
+class RouterStats:
+    """Per-route counters: hits are fast-path decisions, misses went to the LLM."""
+
+    def __init__(self):
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+
+    def record_hit(self, route: str):
+        self.hits[route] += 1
+
+    def record_miss(self, route: str):
+        self.misses[route] += 1
+
+    def snapshot(self) -> Dict:
+        total_hits = sum(self.hits.values())
+        total = total_hits + sum(self.misses.values())
+        return {
+            "routes": {route: {"hits": self.hits[route], "misses": self.misses[route]} for route in VALID_ROUTES},
+            "fast_path_rate": round(total_hits / total, 3) if total else 0.0,
+        }
+
+    def reset(self):
+        self.hits.clear()
+        self.misses.clear()
+
+
+router_stats = RouterStats()
@@ -0,0 +1,249 @@
+# llm_cache.py - LRU+TTL response cache in front of the FinVoice LLM clients
+import os
+import re
+import json
+import math
+import time
+import hashlib
+from collections import OrderedDict, defaultdict
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+import metrics
+from llm_scheduler import llm_scheduler
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2048"))
+LLM_CACHE_TTL_S = float(os.getenv("LLM_CACHE_TTL_S", "3600"))
+# Optional shared tier so every uvicorn worker sees the same entries
+LLM_CACHE_REDIS_URL = os.getenv("LLM_CACHE_REDIS_URL")
+
+_NON_WORD = re.compile(r"[^\w₹%.]+|\.(?!\d)")
+
+
+def _normalize_text(text: str) -> str:
+    return " ".join(_NON_WORD.sub(" ", text.lower()).split())
+
+
+# System messages are the constant prompts.py prefixes: normalize each once
+_normalize_constant = lru_cache(maxsize=128)(_normalize_text)
+
+
+def normalize_prompt(prompt: Any) -> str:
+    """Lowercase, drop punctuation/emoji and collapse whitespace so trivial rephrasings share a key."""
+    if isinstance(prompt, (list, tuple)):
+        return " ".join(filter(None, (
+            _normalize_constant(m.content) if getattr(m, "type", None) == "system"
+            else _normalize_text(str(getattr(m, "content", m))) for m in prompt)))
+    return _normalize_text(str(prompt))
+
+
+def bucket_amount(amount: float) -> int:
+    """Round to two significant figures: 12,345 and 12,480 land in the same bucket."""
+    if not amount:
+        return 0
+    magnitude = 10 ** max(int(math.log10(abs(amount))) - 1, 0)
+    return int(round(amount / magnitude) * magnitude)
+
+
+def bucket_financials(financial_data: Dict) -> str:
+    categories = ",".join(str(c.get("_id")) for c in financial_data.get("top_categories", []))
+    return f"{bucket_amount(financial_data.get('monthly_spending', 0))}|{categories}"
+
+
+# ------------------ Backends ------------------
+class LRUTTLCache:
+    """Bounded in-process cache: least recently used entries go first, stale ones on read."""
+
+    def __init__(self, max_entries: int = LLM_CACHE_MAX_ENTRIES, ttl_s: float = LLM_CACHE_TTL_S):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.evictions = 0
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+
+    async def get(self, key: str):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.evictions += 1
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value) -> None:
+        self._data[key] = (time.monotonic() + self.ttl_s, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisCache:
+    """Shared tier backed by any redis.asyncio-compatible client."""
+
+    def __init__(self, client, ttl_s: float = LLM_CACHE_TTL_S, prefix: str = "finvoice:llm:"):
+        self.client = client
+        self.ttl_s = ttl_s
+        self.prefix = prefix
+
+    async def get(self, key: str):
+        raw = await self.client.get(self.prefix + key)
+        return json.loads(raw) if raw else None
+
+    async def set(self, key: str, value) -> None:
+        await self.client.set(self.prefix + key, json.dumps(value), ex=int(self.ttl_s))
+
+
+class TieredCache:
+    """Local LRU in front of an optional shared backend; backend errors count as misses."""
+
+    def __init__(self, local: LRUTTLCache, shared: Optional[RedisCache] = None):
+        self.local = local
+        self.shared = shared
+
+    async def get(self, key: str):
+        value = await self.local.get(key)
+        if value is not None or self.shared is None:
+            return value
+        try:
+            value = await self.shared.get(key)
+        except Exception as e:
+            print(f"⚠ Shared LLM cache read failed: {e}")
+            return None
+        if value is not None:
+            await self.local.set(key, value)
+        return value
+
+    async def set(self, key: str, value) -> None:
+        await self.local.set(key, value)
+        if self.shared is not None:
+            try:
+                await self.shared.set(key, value)
+            except Exception as e:
+                print(f"⚠ Shared LLM cache write failed: {e}")
+
+
+# ------------------ Metrics ------------------
+class CacheStats:
+    def __init__(self):
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+
+    def snapshot(self) -> Dict:
+        namespaces = sorted(set(self.hits) | set(self.misses))
+        result = {}
+        for ns in namespaces:
+            total = self.hits[ns] + self.misses[ns]
+            result[ns] = {"hits": self.hits[ns], "misses": self.misses[ns],
+                          "hit_rate": round(self.hits[ns] / total, 3) if total else 0.0}
+        return result
+
+
+cache_stats = CacheStats()
+_cache: Optional[TieredCache] = None
+
+
+def get_cache() -> TieredCache:
+    global _cache
+    if _cache is None:
+        shared = None
+        if LLM_CACHE_REDIS_URL:
+            import redis.asyncio as redis_asyncio
+            shared = RedisCache(redis_asyncio.from_url(LLM_CACHE_REDIS_URL))
+        _cache = TieredCache(LRUTTLCache(), shared)
+    return _cache
+
+
+def set_cache(cache: Optional[TieredCache]) -> None:
+    global _cache
+    _cache = cache
+
+
+def cache_snapshot() -> Dict:
+    cache = get_cache()
+    return {"enabled": LLM_CACHE_ENABLED, "entries": len(cache.local), "evictions": cache.local.evictions,
+            "shared_backend": cache.shared is not None, "namespaces": cache_stats.snapshot()}
+
+
+# ------------------ LLM Wrapper ------------------
+def estimate_tokens(prompt: Any) -> int:
+    from context import count_prompt_tokens
+    return count_prompt_tokens(prompt)
+
+
+class CachedLLM:
+    """Caches ainvoke results of a chat model or structured-output runnable.
+
+    Pass cache_key= to key data-dependent prompts on something coarser than
+    the exact prompt text. Cache misses go through llm_scheduler (rate
+    limits, retries) and identical concurrent misses share one call. Every
+    other attribute is delegated to the wrapped client, so
+    with_structured_output() etc. keep working.
+    """
+
+    def __init__(self, llm, namespace: str, schema=None, model: Optional[str] = None):
+        self.llm = llm
+        self.namespace = namespace
+        self.schema = schema
+        self.model = model or getattr(llm, "model_name", None) or "unknown"
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
+
+    def _encode(self, result) -> Dict:
+        if self.schema is not None:
+            return {"model": result.model_dump()}
+        return {"content": result.content}
+
+    def _decode(self, value: Dict):
+        if self.schema is not None:
+            return self.schema(**value["model"])
+        from langchain_core.messages import AIMessage
+        return AIMessage(content=value["content"])
+
+    async def _call(self, prompt, *args, **kwargs):
+        """The real model call, timed and token-counted for /api/metrics."""
+        started = time.perf_counter()
+        try:
+            with metrics.span(f"llm.{self.namespace}", model=self.model):
+                result = await self.llm.ainvoke(prompt, *args, **kwargs)
+        except Exception:
+            metrics.record_llm(self.namespace, self.model, time.perf_counter() - started, 0, 0, error=True)
+            raise
+        elapsed = time.perf_counter() - started
+        if metrics.METRICS_ENABLED:
+            usage = getattr(result, "usage_metadata", None)
+            if usage:
+                prompt_tokens, completion_tokens = usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+            else:
+                # Structured outputs come back without usage; estimate from the text
+                from context import count_tokens
+                prompt_tokens = estimate_tokens(prompt)
+                completion_tokens = count_tokens(json.dumps(self._encode(result), ensure_ascii=False))
+            metrics.record_llm(self.namespace, self.model, elapsed, prompt_tokens, completion_tokens)
+        return result
+
+    async def ainvoke(self, prompt, *args, cache_key: Optional[str] = None, **kwargs):
+        digest = hashlib.sha1((cache_key or normalize_prompt(prompt)).encode("utf-8")).hexdigest()
+        key = f"{self.namespace}:{digest}"
+        if LLM_CACHE_ENABLED:
+            cached = await get_cache().get(key)
+            if cached is not None:
+                cache_stats.hits[self.namespace] += 1
+                return self._decode(cached)
+            cache_stats.misses[self.namespace] += 1
+
+        async def fetch():
+            result = await llm_scheduler.call(self.model, lambda: self._call(prompt, *args, **kwargs),
+                                              tokens=estimate_tokens(prompt))
+            if LLM_CACHE_ENABLED:
+                await get_cache().set(key, self._encode(result))
+            return result
+
+        return await llm_scheduler.coalesce(key, fetch)
@@ -0,0 +1,205 @@
+# llm_scheduler.py - Rate-limited, retrying, coalescing scheduler for FinVoice LLM calls
+#
+# Every model call made through CachedLLM passes through here:
+#   1. single-flight: identical in-flight requests share one upstream call
+#   2. per-model token buckets (requests/min and tokens/min) plus a pause
+#      whenever OpenAI answers 429, honouring Retry-After
+#   3. a per-model concurrency cap
+#   4. exponential backoff with full jitter on 429 / 5xx / timeouts
+# The OpenAI clients are created with max_retries=0 so retries happen once,
+# here, where they can see the shared rate-limit state.
+import os
+import json
+import time
+import random
+import asyncio
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+import metrics
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_DEFAULT_RPM = float(os.getenv("LLM_DEFAULT_RPM", "500"))
+LLM_DEFAULT_TPM = float(os.getenv("LLM_DEFAULT_TPM", "200000"))
+# Per-model overrides, e.g. {"gpt-4o-mini": {"rpm": 5000, "tpm": 2000000, "concurrency": 64}}
+LLM_RATE_LIMITS = json.loads(os.getenv("LLM_RATE_LIMITS", "{}"))
+# Worker processes sharing the account limits above (serve.py sets it); each gets an equal share
+LLM_RATE_WORKERS = max(int(os.getenv("LLM_RATE_WORKERS", "1")), 1)
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE_S = float(os.getenv("LLM_RETRY_BASE_S", "0.5"))
+LLM_RETRY_MAX_S = float(os.getenv("LLM_RETRY_MAX_S", "8"))
+LLM_COALESCE_ENABLED = os.getenv("LLM_COALESCE_ENABLED", "true").lower() in ("1", "true", "yes")
+# Bucket size in seconds of traffic: providers enforce per-minute limits over short windows
+LLM_RATE_BURST_S = float(os.getenv("LLM_RATE_BURST_S", "0.25"))
+# Charged against the tokens/min bucket on top of the prompt, before the real usage is known
+LLM_EXPECTED_COMPLETION_TOKENS = int(os.getenv("LLM_EXPECTED_COMPLETION_TOKENS", "150"))
+
+_RETRYABLE_ERRORS = {"RateLimitError", "APITimeoutError", "APIConnectionError", "InternalServerError"}
+
+
+class LLMUnavailableError(RuntimeError):
+    """The model kept rate-limiting or failing after every retry."""
+
+
+def classify_error(error: BaseException) -> Tuple[Optional[str], Optional[float]]:
+    """(retry reason or None if not retryable, Retry-After seconds if the server sent one)."""
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    if status == 429 or type(error).__name__ == "RateLimitError":
+        reason = "rate_limited"
+    elif (isinstance(status, int) and status >= 500) or type(error).__name__ in _RETRYABLE_ERRORS \
+            or isinstance(error, asyncio.TimeoutError):
+        reason = "server_error"
+    else:
+        return None, None
+    retry_after = None
+    headers = getattr(response, "headers", None) or {}
+    try:
+        retry_after = float(headers.get("retry-after")) if headers.get("retry-after") else None
+    except (TypeError, ValueError):
+        pass
+    return reason, retry_after
+
+
+class TokenBucket:
+    """`rate_per_min` units per minute, bursting up to LLM_RATE_BURST_S worth; waiters are served FIFO."""
+
+    def __init__(self, rate_per_min: float, burst_s: float = LLM_RATE_BURST_S):
+        self.rate = rate_per_min / 60.0
+        self.capacity = max(self.rate * burst_s, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float) -> None:
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill(time.monotonic())
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+class ModelLimiter:
+    def __init__(self, model: str):
+        limits = LLM_RATE_LIMITS.get(model, {})
+        self.model = model
+        self.concurrency = int(limits.get("concurrency", LLM_MAX_CONCURRENCY))
+        self.requests = TokenBucket(float(limits.get("rpm", LLM_DEFAULT_RPM)) / LLM_RATE_WORKERS)
+        self.tokens = TokenBucket(float(limits.get("tpm", LLM_DEFAULT_TPM)) / LLM_RATE_WORKERS)
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.paused_until = 0.0
+        self.waiting = 0
+        self.inflight = 0
+        self.max_waiting = 0
+        self.counts = defaultdict(int)
+
+    def pause(self, seconds: float) -> None:
+        """Hold every new call for this model, e.g. after a 429."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    async def _admit(self, tokens: int) -> None:
+        while (delay := self.paused_until - time.monotonic()) > 0:
+            await asyncio.sleep(delay)
+        await self.requests.acquire(1)
+        await self.tokens.acquire(tokens + LLM_EXPECTED_COMPLETION_TOKENS)
+        await self.semaphore.acquire()
+
+    async def run(self, call: Callable[[], Awaitable], tokens: int):
+        queued = time.perf_counter()
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            await self._admit(tokens)
+        finally:
+            self.waiting -= 1
+        metrics.record_llm_wait(self.model, time.perf_counter() - queued)
+        self.inflight += 1
+        try:
+            return await call()
+        finally:
+            self.inflight -= 1
+            self.semaphore.release()
+
+    def snapshot(self) -> Dict:
+        return {"waiting": self.waiting, "max_waiting": self.max_waiting, "inflight": self.inflight,
+                "concurrency": self.concurrency, "rpm": round(self.requests.rate * 60, 1),
+                "tpm": round(self.tokens.rate * 60, 1), "paused_s": round(max(self.paused_until - time.monotonic(), 0), 2),
+                **self.counts}
+
+
+class LLMScheduler:
+    def __init__(self):
+        self.limiters: Dict[str, ModelLimiter] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.coalesced = 0
+        self._loop = None
+
+    def _bind_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # asyncio primitives belong to one loop (process_message_sync makes new ones)
+            self.limiters.clear()
+            self._inflight.clear()
+            self._loop = loop
+
+    def limiter(self, model: str) -> ModelLimiter:
+        self._bind_loop()
+        limiter = self.limiters.get(model)
+        if limiter is None:
+            limiter = self.limiters[model] = ModelLimiter(model)
+        return limiter
+
+    async def call(self, model: str, call: Callable[[], Awaitable], tokens: int = 0):
+        """Run `call` under the model's limits, retrying 429/5xx with jittered backoff."""
+        limiter = self.limiter(model)
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            try:
+                return await limiter.run(call, tokens)
+            except Exception as e:
+                reason, retry_after = classify_error(e)
+                if reason is None:
+                    raise
+                limiter.counts[reason] += 1
+                if attempt == LLM_MAX_RETRIES:
+                    limiter.counts["gave_up"] += 1
+                    raise LLMUnavailableError(f"{model}: {reason} after {attempt + 1} attempts ({e})") from e
+                delay = random.uniform(0, min(LLM_RETRY_MAX_S, LLM_RETRY_BASE_S * 2 ** attempt))
+                if retry_after is not None:
+                    delay = max(delay, retry_after)
+                if reason == "rate_limited":
+                    limiter.pause(delay)
+                metrics.record_llm_retry(model, reason)
+                print(f"⚠ {model} {reason.replace('_', ' ')}, retry {attempt + 1}/{LLM_MAX_RETRIES} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    async def coalesce(self, key: str, call: Callable[[], Awaitable]):
+        """Single-flight: concurrent callers with the same key share one `call`.
+
+        The shared call runs as its own task, so one caller disconnecting
+        doesn't cancel it for the others.
+        """
+        if not LLM_COALESCE_ENABLED:
+            return await call()
+        self._bind_loop()
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            metrics.record_llm_coalesced(key.split(":", 1)[0])
+            return await asyncio.shield(future)
+        future = self._inflight[key] = asyncio.ensure_future(call())
+        future.add_done_callback(lambda done: self._inflight.get(key) is done and self._inflight.pop(key))
+        return await asyncio.shield(future)
+
+    def snapshot(self) -> Dict:
+        return {"coalesced": self.coalesced, "inflight_keys": len(self._inflight), "rate_workers": LLM_RATE_WORKERS,
+                "models": {model: limiter.snapshot() for model, limiter in self.limiters.items()}}
+
+
+llm_scheduler = LLMScheduler()
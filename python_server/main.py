@@ -1,23 +1,119 @@
 # main.py - FastAPI server for FinVoice AI Assistant
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import FastAPI, HTTPException, UploadFile, File, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
 from pydantic import BaseModel
 from typing import Optional
+from contextlib import asynccontextmanager
 import uvicorn
 from backend import process_audio_file_async, process_message_async # ✅ use async version
 from datetime import datetime
 import os
-import aiofiles
+import json
+import time
+import asyncio
+import inspect
 
 # Import backend functions
 from backend import (
-    process_audio_file,
-    process_message_sync,
-    initialize_workflow_async  
+    initialize_llms,
+    initialize_database,
+    initialize_workflow_async,
+    ping_database,
+    stream_message,
+    ensure_database_indexes,
+    migrate_database,
+    backfill_rollups,
+    import_expenses,
+    latency_stats
 )
+from write_queue import write_queue
+from bulk_import import iter_lines
+from intent_rules import router_stats
+from expense_parser import parser_stats
+from time_resolver import resolver_stats
+from llm_cache import cache_snapshot
+from llm_scheduler import llm_scheduler
+from sessions import session_snapshot
+from context import record_turn, context_snapshot, count_tokens
+from analytics import analytics_stats
+import audio_preprocess
+import metrics
+import stt
+
+# ------------------ Startup / Readiness ------------------
+# The port opens once the essentials (LLM clients, DB client, compiled graph)
+# are built. The slower warm-ups run in the background and /api/health
+# answers 503 until they finish, so a load balancer only routes to warm workers.
+readiness = {"ready": False, "phase": "starting", "checks": {}, "ready_after_s": None}
+
+async def run_check(name: str, step, required: bool = False):
+    """Run one startup step, recording its outcome and duration under readiness["checks"]"""
+    started = time.perf_counter()
+    try:
+        result = step()
+        if inspect.isawaitable(result):
+            result = await result
+        readiness["checks"][name] = {"ok": True, "ms": round((time.perf_counter() - started) * 1000, 1)}
+        return result
+    except Exception as e:
+        readiness["checks"][name] = {"ok": False, "ms": round((time.perf_counter() - started) * 1000, 1),
+                                     "error": str(e)}
+        if required:
+            print(f"❌ Startup step {name} failed: {e}")
+            raise
+        print(f"⚠ Startup step {name} failed: {e}")
+
+async def prepare_database():
+    """Indexes first (the rollups' unique key), then the one-off data migrations"""
+    indexes = await run_check("database_indexes", ensure_database_indexes)
+    migrated = await run_check("category_norm_migration", migrate_database)
+    if migrated:
+        print(f"✅ Set category_norm on {migrated} existing expenses")
+    rebuilt = await run_check("rollups_backfill", backfill_rollups)
+    if rebuilt:
+        print(f"✅ Backfilled {rebuilt} rollup rows from existing expenses")
+    return indexes
+
+async def warm_up(started: float):
+    # Index creation and the backfill are idempotent; an unreachable DB degrades
+    # the worker but doesn't keep it out of rotation
+    indexes, *_ = await asyncio.gather(
+        prepare_database(),
+        run_check("database_ping", ping_database),
+        # Local STT models load once per worker, before the first voice request
+        run_check("stt", stt.get_stt_backend().warm_up),
+        # tiktoken reads (or downloads) its BPE ranks on first use
+        run_check("tokenizer", lambda: asyncio.to_thread(count_tokens, "warm up")),
+    )
+    if indexes is not None:
+        print(f"✅ MongoDB indexes ready ({len(indexes)})")
+    failed = [name for name, check in readiness["checks"].items() if not check["ok"]]
+    readiness.update(ready=True, phase="degraded" if failed else "ready",
+                     ready_after_s=round(time.perf_counter() - started, 2))
+    suffix = f" (failed: {', '.join(failed)})" if failed else ""
+    print(f"✅ Worker {os.getpid()} ready in {readiness['ready_after_s']}s{suffix}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Build clients, DB pool and the compiled workflow once per worker; drain writes on exit"""
+    print("🚀 FinVoice API Server starting up...")
+    started = time.perf_counter()
+    await run_check("llm_clients", initialize_llms, required=True)
+    await run_check("database", initialize_database, required=True)
+    await run_check("workflow", initialize_workflow_async, required=True)
+    print("✅ Workflow initialized successfully")
+    warm_task = asyncio.create_task(warm_up(started))
+    try:
+        yield
+    finally:
+        readiness.update(ready=False, phase="stopping")
+        warm_task.cancel()
+        # Let queued background writes finish before the worker exits
+        await write_queue.drain()
 
 # Initialize FastAPI app
-app = FastAPI(title="FinVoice API", version="1.0")
+app = FastAPI(title="FinVoice API", version="1.0", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -28,6 +124,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Everything the individual /api/*/stats endpoints report, also exported by /api/metrics
+metrics.register_collector("router", router_stats.snapshot)
+metrics.register_collector("parser", parser_stats.snapshot)
+metrics.register_collector("resolver", resolver_stats.snapshot)
+metrics.register_collector("llm_cache", cache_snapshot)
+metrics.register_collector("llm_scheduler", llm_scheduler.snapshot)
+metrics.register_collector("sessions", session_snapshot)
+metrics.register_collector("context", context_snapshot)
+metrics.register_collector("audio_preprocess", lambda: audio_preprocess.totals)
+metrics.register_collector("latency", latency_stats.snapshot)
+metrics.register_collector("analytics", analytics_stats.snapshot)
+
 # Request/Response models
 class ChatRequest(BaseModel):
     user_id: str
@@ -38,25 +146,14 @@ class ChatResponse(BaseModel):
     response: str
     error: Optional[str] = None
     user_id: Optional[str] = None
+    timings: Optional[list] = None
 
 class VoiceResponse(BaseModel):
     success: bool
     message: str
     user_text: Optional[str] = None
-
-# Session management
-user_sessions = {}
-
-@app.on_event("startup")
-async def startup_event():
-    """Initialize workflow on server startup"""
-    print("🚀 FinVoice API Server starting up...")
-    try:
-        await initialize_workflow_async()
-        print("✅ Workflow initialized successfully")
-    except Exception as e:
-        print(f"❌ Failed to initialize workflow: {e}")
-        raise
+    audio_stats: Optional[dict] = None
+    timings: Optional[list] = None
 
 @app.post("/api/chat", response_model=ChatResponse)
 async def chat_endpoint(request: ChatRequest):
@@ -69,61 +166,181 @@ async def chat_endpoint(request: ChatRequest):
         result = await process_message_async(request.user_id, request.message)
 
         # Manage sessions
-        if request.user_id not in user_sessions:
-            user_sessions[request.user_id] = {"conversation_history": [], "last_interaction": datetime.now()}
+        await record_turn(request.user_id, request.message, result.get("response"))
 
-        session = user_sessions[request.user_id]
-        session["conversation_history"].append({"role": "user", "content": request.message, "timestamp": datetime.now()})
-        if result.get("response"):
-            session["conversation_history"].append({"role": "assistant", "content": result["response"], "timestamp": datetime.now()})
-        session["last_interaction"] = datetime.now()
-
-        return ChatResponse(success=result["success"], response=result["response"], user_id=request.user_id)
+        return ChatResponse(success=result["success"], response=result["response"], user_id=request.user_id,
+                            timings=result.get("timings"))
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Chat processing failed: {str(e)}")
 
+@app.post("/api/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest):
+    """Server-Sent Events chat: node transitions, reply tokens, then a final "done" event"""
+    if not request.message or not request.message.strip():
+        raise HTTPException(status_code=400, detail="Please provide a message")
+
+    started = time.perf_counter()
+
+    async def event_source():
+        async for event in stream_message(request.user_id, request.message):
+            event["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            if event["type"] == "done":
+                await record_turn(request.user_id, request.message, event.get("response"))
+            yield f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Whisper's upload limit; larger clips are rejected before any processing
+MAX_AUDIO_BYTES = int(os.getenv("MAX_AUDIO_BYTES", str(25 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = 64 * 1024
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """Per-endpoint latency histogram for /api/metrics (streams: time to first byte)"""
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Route templates, not raw paths, so scanners can't create unbounded label sets
+        route = request.scope.get("route")
+        metrics.record_http(getattr(route, "path", "unmatched"), status, time.perf_counter() - started)
+
+@app.middleware("http")
+async def limit_audio_upload_size(request: Request, call_next):
+    """Refuse oversized audio bodies from Content-Length before multipart parsing starts"""
+    if request.url.path == "/api/chat/audio":
+        length = request.headers.get("content-length")
+        if length and length.isdigit() and int(length) > MAX_AUDIO_BYTES + UPLOAD_CHUNK_BYTES:
+            return JSONResponse(status_code=413, content={"detail": "Audio file too large"})
+    return await call_next(request)
+
+async def measure_upload(file: UploadFile) -> int:
+    """Size of the spooled upload, counted in chunks so it is never held in memory"""
+    if file.size is not None:
+        return file.size
+    size = 0
+    while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+        size += len(chunk)
+        if size > MAX_AUDIO_BYTES:
+            break
+    await file.seek(0)
+    return size
+
 @app.post("/api/chat/audio", response_model=VoiceResponse)
 async def chat_audio_endpoint(file: UploadFile = File(...)):
     """Endpoint for audio input with enhanced response"""
-    audio_path = None
     try:
         # Validate file type
         if not file.filename.lower().endswith(('.wav', '.mp3', '.m4a', '.webm')):
             raise HTTPException(status_code=400, detail="Unsupported file format. Please use WAV, MP3, M4A, or WEBM.")
-        
-        os.makedirs("temp_audio", exist_ok=True)
-        audio_path = f"temp_audio/api_{datetime.now().strftime('%Y%m%d%H%M%S')}_{file.filename}"
-        
-        async with aiofiles.open(audio_path, "wb") as f:
-            content = await file.read()
-            if not content:
-                raise HTTPException(status_code=400, detail="Empty audio file")
-            await f.write(content)
 
-        # ✅ use async version
-        final_state = await process_audio_file_async(audio_path)
+        size = await measure_upload(file)
+        if size == 0:
+            raise HTTPException(status_code=400, detail="Empty audio file")
+        if size > MAX_AUDIO_BYTES:
+            raise HTTPException(status_code=413, detail="Audio file too large")
 
-        if os.path.exists(audio_path):
-            os.remove(audio_path)
+        # Starlette already spooled the upload (memory up to 1 MiB, then disk);
+        # hand that file object straight to STT instead of copying it again
+        await file.seek(0)
+        final_state = await process_audio_file_async(audio_upload=(file.filename, file.file))
             
         return VoiceResponse(
             success=True,
             message=final_state.get("final_response", "No response generated"),
-            user_text=final_state.get("transcribed_text", "Audio input")
+            user_text=final_state.get("transcribed_text", "Audio input"),
+            audio_stats=final_state.get("audio_stats"),
+            timings=final_state.get("timings")
         )
         
     except HTTPException:
         raise
     except Exception as e:
-        if audio_path and os.path.exists(audio_path):
-            os.remove(audio_path)
         print(f"❌ Audio processing error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Audio processing failed: {str(e)}")
+    finally:
+        await file.close()
+
+@app.post("/api/expenses/bulk")
+async def bulk_expenses_endpoint(request: Request, user_id: str, format: Optional[str] = None):
+    """Stream a CSV (with header row) or JSON-lines export; returns counts and per-line errors"""
+    content_type = request.headers.get("content-type", "")
+    fmt = (format or ("jsonl" if "json" in content_type else "csv")).lower()
+    try:
+        return await import_expenses(user_id, iter_lines(request.stream()), fmt)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"❌ Bulk import error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Bulk import failed: {str(e)}")
+
+@app.get("/api/router/stats")
+async def router_stats_endpoint():
+    """Fast-path router hit/miss counters per specialist"""
+    return router_stats.snapshot()
+
+@app.get("/api/cache/stats")
+async def cache_stats_endpoint():
+    """LLM response cache size, evictions and hit rate per client"""
+    return cache_snapshot()
+
+@app.get("/api/llm/stats")
+async def llm_scheduler_stats_endpoint():
+    """Per-model queue depth, in-flight calls, retries and coalesced requests"""
+    return llm_scheduler.snapshot()
+
+@app.get("/api/sessions/stats")
+async def session_stats_endpoint():
+    """Conversation history store size, evictions and approximate memory use"""
+    return session_snapshot()
+
+@app.get("/api/context/stats")
+async def context_stats_endpoint():
+    """Prompt token counts per node, split into total and conversation-history tokens"""
+    return context_snapshot()
+
+@app.get("/api/latency/stats")
+async def latency_stats_endpoint():
+    """Average/max latency per graph node, prefetch use and background write queue depth"""
+    return latency_stats.snapshot()
+
+@app.get("/api/analytics/stats")
+async def analytics_stats_endpoint():
+    """Spending-trend cache hits/invalidations, rows read and compute time per user"""
+    return analytics_stats.snapshot()
+
+@app.get("/api/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Prometheus text format: node/LLM/DB/STT/HTTP histograms plus every stats snapshot, for this worker only"""
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/stats")
+async def all_stats_endpoint():
+    """All of the stats snapshots above in one JSON document"""
+    return metrics.collect_stats()
 
 @app.get("/api/health")
 async def health_check():
-    return {"status": "healthy", "timestamp": datetime.now(), "service": "FinVoice API", "version": "1.0"}
+    """Readiness: 503 while this worker is warming up or shutting down"""
+    body = {"status": "healthy" if readiness["phase"] == "ready" else readiness["phase"],
+            "ready": readiness["ready"], "timestamp": datetime.now().isoformat(), "service": "FinVoice API",
+            "version": "1.0", "pid": os.getpid(), "ready_after_s": readiness["ready_after_s"],
+            "checks": readiness["checks"]}
+    return JSONResponse(body, status_code=200 if readiness["ready"] else 503)
+
+@app.get("/api/health/live")
+async def liveness_check():
+    """Liveness: the process is up and serving, warm or not"""
+    return {"status": "alive", "pid": os.getpid()}
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    # Development server; production runs `python serve.py --workers N`
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
@@ -0,0 +1,298 @@
+# metrics.py - Latency / token / cost instrumentation for FinVoice AI Assistant
+#
+# In-process histograms and counters for graph nodes, LLM calls, Mongo
+# operations, STT and HTTP requests, rendered in the Prometheus text format
+# at /api/metrics. Recording is a dict lookup and a bisect per observation;
+# nothing is exported in the background. OpenTelemetry spans are emitted as
+# well when OTEL_ENABLED is set and the opentelemetry API is installed
+# (exporters are configured the usual OTel way, e.g. opentelemetry-instrument).
+#
+# Everything here is per process. With several workers (serve.py), each
+# /api/metrics scrape answers from whichever worker took the request; the
+# finvoice_worker_info{pid=...} series says which. Scrape workers
+# individually, or run one worker where whole-server numbers matter.
+import os
+import json
+import time
+import contextvars
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, List, Tuple
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+OTEL_ENABLED = os.getenv("OTEL_ENABLED", "false").lower() in ("1", "true", "yes")
+
+# USD per 1M (prompt, completion) tokens; METRICS_MODEL_PRICES overrides with the same JSON shape
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "whisper-1": (0.0, 0.0),
+}
+MODEL_PRICES.update({model: tuple(prices) for model, prices in
+                     json.loads(os.getenv("METRICS_MODEL_PRICES", "{}")).items()})
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# ------------------ Instruments ------------------
+class Counter:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.series: Dict[Tuple, float] = {}
+
+    def inc(self, *label_values, amount: float = 1):
+        self.series[label_values] = self.series.get(label_values, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for values, total in sorted(self.series.items()):
+            lines.append(f"{self.name}{_labels(self.labels, values)} {_number(total)}")
+        return lines
+
+
+class Histogram:
+    """Fixed-bucket histogram; per label set it keeps bucket counts, sum and count."""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.series: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *label_values):
+        series = self.series.get(label_values)
+        if series is None:
+            series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, (counts, total, count) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labels, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, values)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labels, values)} {count}")
+        return lines
+
+
+node_duration = Histogram("finvoice_node_duration_seconds", "Graph node latency", ("node",))
+node_errors = Counter("finvoice_node_errors_total",
+                      "Node runs that raised or hit a failed LLM/DB/STT call", ("node",))
+llm_duration = Histogram("finvoice_llm_duration_seconds", "LLM call latency (cache misses only)",
+                         ("node", "client", "model"))
+llm_prompt_tokens = Histogram("finvoice_llm_prompt_tokens", "Prompt tokens per LLM call",
+                              ("node", "client", "model"), TOKEN_BUCKETS)
+llm_completion_tokens = Histogram("finvoice_llm_completion_tokens", "Completion tokens per LLM call",
+                                  ("node", "client", "model"), TOKEN_BUCKETS)
+llm_cost = Counter("finvoice_llm_cost_usd_total", "Estimated LLM spend from MODEL_PRICES", ("client", "model"))
+llm_errors = Counter("finvoice_llm_errors_total", "Failed LLM calls", ("node", "client", "model"))
+db_duration = Histogram("finvoice_db_duration_seconds", "MongoDB operation latency", ("collection", "op"))
+db_errors = Counter("finvoice_db_errors_total", "Failed MongoDB operations", ("collection", "op"))
+stt_duration = Histogram("finvoice_stt_duration_seconds", "Speech-to-text latency", ("backend",))
+stt_errors = Counter("finvoice_stt_errors_total", "Failed or timed-out transcriptions", ("backend",))
+llm_queue_wait = Histogram("finvoice_llm_queue_wait_seconds",
+                           "Time an LLM call waited for rate limits / a concurrency slot", ("model",))
+llm_retries = Counter("finvoice_llm_retries_total", "LLM calls retried after a 429 / 5xx / timeout",
+                      ("model", "reason"))
+llm_coalesced = Counter("finvoice_llm_coalesced_total", "Calls that joined an identical in-flight request",
+                        ("client",))
+http_duration = Histogram("finvoice_http_request_duration_seconds", "HTTP request latency", ("path", "status"))
+
+INSTRUMENTS = [node_duration, node_errors, llm_duration, llm_prompt_tokens, llm_completion_tokens, llm_cost,
+               llm_errors, llm_queue_wait, llm_retries, llm_coalesced, db_duration, db_errors, stt_duration,
+               stt_errors, http_duration]
+
+
+# ------------------ Node Scope ------------------
+class NodeScope:
+    __slots__ = ("name", "errors")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.errors = 0
+
+
+_current_node: contextvars.ContextVar = contextvars.ContextVar("finvoice_node", default=None)
+
+
+def current_node() -> str:
+    scope = _current_node.get()
+    return scope.name if scope is not None else "none"
+
+
+def _flag_error() -> None:
+    scope = _current_node.get()
+    if scope is not None:
+        scope.errors += 1
+
+
+_tracer = None
+
+
+def _get_tracer():
+    global _tracer, OTEL_ENABLED
+    if _tracer is None:
+        try:
+            from opentelemetry import trace
+            _tracer = trace.get_tracer("finvoice")
+        except ImportError:
+            print("⚠ OTEL_ENABLED is set but opentelemetry is not installed; spans disabled")
+            OTEL_ENABLED = False
+    return _tracer
+
+
+def span(name: str, **attributes):
+    """OpenTelemetry span when enabled, otherwise a no-op context manager."""
+    if not OTEL_ENABLED or _get_tracer() is None:
+        return nullcontext()
+    return _tracer.start_as_current_span(name, attributes=attributes)
+
+
+@contextmanager
+def node_scope(name: str):
+    """Time a graph node; LLM/DB/STT failures inside it count as a node error too."""
+    scope = NodeScope(name)
+    token = _current_node.set(scope)
+    started = time.perf_counter()
+    try:
+        with span(f"node.{name}", node=name):
+            yield scope
+    except BaseException:
+        scope.errors += 1
+        raise
+    finally:
+        _current_node.reset(token)
+        if METRICS_ENABLED:
+            node_duration.observe(time.perf_counter() - started, name)
+            if scope.errors:
+                node_errors.inc(name)
+
+
+# ------------------ Recording ------------------
+def record_llm(client: str, model: str, seconds: float, prompt_tokens: int, completion_tokens: int,
+               error: bool = False) -> None:
+    if not METRICS_ENABLED:
+        return
+    node = current_node()
+    if error:
+        llm_errors.inc(node, client, model)
+        _flag_error()
+        return
+    llm_duration.observe(seconds, node, client, model)
+    llm_prompt_tokens.observe(prompt_tokens, node, client, model)
+    llm_completion_tokens.observe(completion_tokens, node, client, model)
+    prompt_price, completion_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    llm_cost.inc(client, model, amount=(prompt_tokens * prompt_price + completion_tokens * completion_price) / 1e6)
+
+
+def record_llm_wait(model: str, seconds: float) -> None:
+    if METRICS_ENABLED:
+        llm_queue_wait.observe(seconds, model)
+
+
+def record_llm_retry(model: str, reason: str) -> None:
+    if METRICS_ENABLED:
+        llm_retries.inc(model, reason)
+
+
+def record_llm_coalesced(client: str) -> None:
+    if METRICS_ENABLED:
+        llm_coalesced.inc(client)
+
+
+def record_db(collection: str, op: str, seconds: float, error: bool = False) -> None:
+    if not METRICS_ENABLED:
+        return
+    db_duration.observe(seconds, collection, op)
+    if error:
+        db_errors.inc(collection, op)
+        _flag_error()
+
+
+def record_stt(backend: str, seconds: float, error: bool = False) -> None:
+    if not METRICS_ENABLED:
+        return
+    stt_duration.observe(seconds, backend)
+    if error:
+        stt_errors.inc(backend)
+        _flag_error()
+
+
+def record_http(path: str, status: int, seconds: float) -> None:
+    if METRICS_ENABLED:
+        http_duration.observe(seconds, path, str(status))
+
+
+# ------------------ Stats Collectors ------------------
+# The existing *_stats snapshots (router, parser, cache, sessions, ...) are
+# registered here and exported as one flattened gauge family at scrape time
+_collectors: Dict[str, Callable[[], Dict]] = {}
+
+
+def register_collector(source: str, snapshot: Callable[[], Dict]) -> None:
+    _collectors[source] = snapshot
+
+
+def collect_stats() -> Dict[str, Dict]:
+    stats = {}
+    for source, snapshot in _collectors.items():
+        try:
+            stats[source] = snapshot()
+        except Exception as e:
+            stats[source] = {"error": str(e)}
+    return stats
+
+
+def _flatten(prefix: str, value, out: List[Tuple[str, float]]) -> None:
+    if isinstance(value, bool):
+        out.append((prefix, int(value)))
+    elif isinstance(value, (int, float)):
+        out.append((prefix, value))
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            _flatten(f"{prefix}.{key}" if prefix else str(key), item, out)
+
+
+def render_prometheus() -> str:
+    lines = []
+    for instrument in INSTRUMENTS:
+        lines.extend(instrument.render())
+    lines += ["# HELP finvoice_worker_info The worker process these series come from",
+              "# TYPE finvoice_worker_info gauge", f'finvoice_worker_info{{pid="{os.getpid()}"}} 1']
+    lines += ["# HELP finvoice_stat Counters and sizes from the per-module stats snapshots",
+              "# TYPE finvoice_stat gauge"]
+    for source, snapshot in collect_stats().items():
+        values: List[Tuple[str, float]] = []
+        _flatten("", snapshot, values)
+        for key, value in values:
+            lines.append(f'finvoice_stat{{source="{_escape(source)}",key="{_escape(key)}"}} {_number(value)}')
+    return "\n".join(lines) + "\n"
+
+
+def reset() -> None:
+    for instrument in INSTRUMENTS:
+        instrument.series.clear()
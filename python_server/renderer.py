@@ -0,0 +1,121 @@
+# renderer.py - Template-based replies for deterministic FinVoice responses
+import os
+from typing import Dict, Optional
+
+RESPONSE_LOCALE = os.getenv("RESPONSE_LOCALE", "en-IN")
+# Comma-separated node names that should keep generating replies with llm_advisor
+LLM_RESPONSE_NODES = {n.strip() for n in os.getenv("LLM_RESPONSE_NODES", "").split(",") if n.strip()}
+
+RESPONSE_TEMPLATES: Dict[str, Dict[str, str]] = {
+    "en-IN": {
+        "expense_added": "✅ Added {amount} for {category}{when}. Nice job keeping track! 💸",
+        "spending_summary": "📊 You spent {total} on {category} across {count} {transactions} {period}.",
+        "spending_summary_all": "📊 You spent {total} across {count} {transactions} {period}.",
+        "no_spending": "You have not spent any money on {category} {period}. Keep it up! 💸",
+        "goodbye": "👋 Thank you for using FinVoice! Come back anytime to track your money. 😊",
+        "busy": "⏳ I'm handling a lot of requests right now. Please try again in a few seconds.",
+        "transaction": "transaction",
+        "transactions": "transactions",
+        "anything": "anything",
+        "on_date": " ({date})",
+        "period_today": "today",
+        "period_days": "in the last {days} days",
+        "period_day": "on {label}",
+        "period_range": "in {label}",
+    },
+    "hi-IN": {
+        "expense_added": "✅ {category} ke liye {amount} add ho gaya{when}. Badhiya, tracking jaari rakhiye! 💸",
+        "spending_summary": "📊 {period} aapne {category} par {count} {transactions} mein {total} kharch kiye.",
+        "spending_summary_all": "📊 {period} aapne {count} {transactions} mein {total} kharch kiye.",
+        "no_spending": "{period} aapne {category} par kuch kharch nahi kiya. Aise hi chalte rahiye! 💸",
+        "goodbye": "👋 FinVoice use karne ke liye dhanyavaad! Phir milenge. 😊",
+        "busy": "⏳ Abhi bahut saare requests aa rahe hain. Kuch second baad phir try kijiye.",
+        "transaction": "transaction",
+        "transactions": "transactions",
+        "anything": "kisi cheez",
+        "on_date": " ({date})",
+        "period_today": "Aaj",
+        "period_days": "Pichhle {days} din mein",
+        "period_day": "{label} ko",
+        "period_range": "{label} mein",
+    },
+}
+
+
+def format_inr(amount: float) -> str:
+    """Format an amount with the ₹ symbol and Indian digit grouping (₹1,23,456.50)."""
+    negative = amount < 0
+    amount = abs(float(amount))
+    rupees = int(amount)
+    paise = round((amount - rupees) * 100)
+    if paise == 100:
+        rupees, paise = rupees + 1, 0
+    digits = str(rupees)
+    if len(digits) > 3:
+        head, tail = digits[:-3], digits[-3:]
+        groups = []
+        while len(head) > 2:
+            groups.insert(0, head[-2:])
+            head = head[:-2]
+        if head:
+            groups.insert(0, head)
+        digits = ",".join(groups) + "," + tail
+    text = f"₹{digits}" + (f".{paise:02d}" if paise else "")
+    return f"-{text}" if negative else text
+
+
+class TemplateRenderer:
+    """Renders replies from locale templates; swap via set_renderer() for other styles."""
+
+    def __init__(self, locale: str = RESPONSE_LOCALE):
+        self.templates = RESPONSE_TEMPLATES.get(locale, RESPONSE_TEMPLATES["en-IN"])
+
+    def render(self, key: str, **context) -> str:
+        return self.templates[key].format(**context)
+
+    def expense_added(self, amount: float, category: str, date: Optional[str] = None) -> str:
+        when = self.templates["on_date"].format(date=date) if date else ""
+        return self.render("expense_added", amount=format_inr(amount), category=category, when=when)
+
+    def period(self, days: int, label: Optional[str] = None) -> str:
+        """"today"/"in the last N days", or a named range such as "in September 2026"."""
+        if label:
+            return self.templates["period_day" if days <= 1 else "period_range"].format(label=label)
+        return self.templates["period_today"] if days <= 1 else self.templates["period_days"].format(days=days)
+
+    def spending_summary(self, total: float, count: int, days: int, category: Optional[str],
+                         label: Optional[str] = None) -> str:
+        transactions = self.templates["transaction" if count == 1 else "transactions"]
+        key = "spending_summary" if category else "spending_summary_all"
+        return self.render(key, total=format_inr(total), count=count, transactions=transactions,
+                           period=self.period(days, label), category=category)
+
+    def no_spending(self, days: int, category: Optional[str], label: Optional[str] = None) -> str:
+        return self.render("no_spending", period=self.period(days, label),
+                           category=category or self.templates["anything"])
+
+    def goodbye(self) -> str:
+        return self.render("goodbye")
+
+    def busy(self) -> str:
+        return self.render("busy")
+
+
+_renderer = None
+
+
+def get_renderer() -> TemplateRenderer:
+    global _renderer
+    if _renderer is None:
+        _renderer = TemplateRenderer()
+    return _renderer
+
+
+def set_renderer(renderer) -> None:
+    global _renderer
+    _renderer = renderer
+
+
+def use_llm_for(node: str) -> bool:
+    """True when the given node is opted in to LLM-generated replies."""
+    return node in LLM_RESPONSE_NODES
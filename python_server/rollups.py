@@ -0,0 +1,265 @@
+# rollups.py - Daily per-user-per-category spending rollups for FinVoice AI Assistant
+#
+# Each expense insert bumps one {user_id, day, category_norm} row with $inc,
+# so a 1/7/30-day summary reads at most 30 rows per category instead of
+# re-aggregating the user's full expense history.
+#
+# Reads only switch to the rollups once they have been backfilled from the
+# raw expenses (a "rollups_backfill" marker in the migrations collection).
+# Until then summaries aggregate the raw collection. The API runs the
+# backfill during startup warm-up, so a fresh deploy never reports ₹0 for
+# users whose expenses predate the rollups. With several workers, the one
+# that takes the "rollups_backfill_lock" document rebuilds; the others keep
+# reading raw expenses and switch over when the marker appears.
+#
+#   python rollups.py rebuild [--user USER_ID]   # backfill from raw expenses
+#   python rollups.py check   [--user USER_ID]   # compare against raw expenses
+import os
+import argparse
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from datastore import normalize_category
+
+ROLLUPS_ENABLED = os.getenv("ROLLUPS_ENABLED", "true").lower() in ("1", "true", "yes")
+# Rebuild passes per user before giving up on a row an insert keeps changing
+ROLLUPS_REBUILD_ATTEMPTS = int(os.getenv("ROLLUPS_REBUILD_ATTEMPTS", "3"))
+BACKFILL_MARKER = "rollups_backfill"
+BACKFILL_LOCK = "rollups_backfill_lock"
+# A backfill lock older than this is taken to belong to a worker that died mid-rebuild
+ROLLUPS_BACKFILL_LOCK_S = float(os.getenv("ROLLUPS_BACKFILL_LOCK_S", "900"))
+# How often a worker that didn't get the lock checks for the marker
+ROLLUPS_BACKFILL_POLL_S = float(os.getenv("ROLLUPS_BACKFILL_POLL_S", "5"))
+
+# Set once the marker is seen or written; until then reads use the raw expenses
+backfilled = False
+_marker_watch: Optional[asyncio.Task] = None
+
+
+def reads_enabled() -> bool:
+    """Whether summaries may read the rollups instead of aggregating raw expenses."""
+    return ROLLUPS_ENABLED and backfilled
+
+
+def day_start(value: datetime) -> datetime:
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def window_start(days: int, now: Optional[datetime] = None) -> datetime:
+    """Midnight that starts the last `days` calendar days, today included.
+
+    Both the rollups and the raw-expense summaries use it, so a "last 7 days"
+    answer doesn't change when reads switch to the rollups.
+    """
+    return day_start(now or datetime.now()) - timedelta(days=max(days, 1) - 1)
+
+
+async def apply_expense(rollups_collection, expense: Dict) -> None:
+    """Fold one expense into its daily rollup row (single atomic upsert)."""
+    await rollups_collection.update_one(
+        {"user_id": expense["user_id"], "day": day_start(expense["date"]),
+         "category_norm": normalize_category(expense.get("category"))},
+        {"$inc": {"total": float(expense["amount"]), "count": 1},
+         "$setOnInsert": {"category": expense.get("category") or "Miscellaneous"}},
+        upsert=True,
+    )
+
+
+def group_expenses(expenses, rows: Optional[Dict[tuple, Dict]] = None) -> Dict[tuple, Dict]:
+    """Rollup rows keyed by (user_id, day, category_norm); pass rows= to keep accumulating."""
+    if rows is None:
+        rows = defaultdict(lambda: {"total": 0.0, "count": 0, "category": None})
+    for expense in expenses:
+        key = (expense["user_id"], day_start(expense["date"]), normalize_category(expense.get("category")))
+        row = rows[key]
+        row["total"] += float(expense["amount"])
+        row["count"] += 1
+        row["category"] = row["category"] or expense.get("category") or "Miscellaneous"
+    return rows
+
+
+async def _bulk_upsert(rollups_collection, updates: List[tuple]) -> None:
+    from pymongo import UpdateOne
+
+    try:
+        await rollups_collection.bulk_write([UpdateOne(f, u, upsert=True) for f, u in updates], ordered=False)
+    except TypeError:
+        # mongomock's bulk API lags pymongo's operation classes; same upserts one by one
+        await asyncio.gather(*(rollups_collection.update_one(f, u, upsert=True) for f, u in updates))
+
+
+async def apply_rows(rollups_collection, rows: Dict[tuple, Dict]) -> int:
+    """$inc grouped rows into the rollups with one unordered bulk write (one upsert per row)."""
+    if not rows:
+        return 0
+    await _bulk_upsert(rollups_collection, [
+        ({"user_id": u, "day": d, "category_norm": c},
+         {"$inc": {"total": row["total"], "count": row["count"]}, "$setOnInsert": {"category": row["category"]}})
+        for (u, d, c), row in rows.items()])
+    return len(rows)
+
+
+async def summarize(rollups_collection, user_id: str, days: int, category: Optional[str] = None,
+                    start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[Dict]:
+    """Per-category totals over the last `days` calendar days (today included), largest first.
+
+    Pass start/end (day boundaries, end exclusive) for a fixed range instead.
+    """
+    if start is not None:
+        match = {"user_id": user_id, "day": {"$gte": day_start(start), "$lt": end}}
+    else:
+        match = {"user_id": user_id, "day": {"$gte": window_start(days)}}
+    if category:
+        match["category_norm"] = normalize_category(category)
+    return await rollups_collection.aggregate([
+        {"$match": match},
+        {"$group": {"_id": "$category_norm", "category": {"$first": "$category"},
+                    "total": {"$sum": "$total"}, "count": {"$sum": "$count"}}},
+        {"$sort": {"total": -1}},
+    ])
+
+
+async def compute_from_expenses(expenses_collection, user_id: Optional[str] = None) -> Dict[tuple, Dict]:
+    """Recompute rollup rows from the raw collection (projection only, no full documents)."""
+    query = {"user_id": user_id} if user_id else {}
+    expenses = await expenses_collection.find(query, {"_id": 0, "user_id": 1, "date": 1, "category": 1, "amount": 1})
+    return group_expenses(expenses)
+
+
+async def list_users(expenses_collection) -> List[str]:
+    return [doc["_id"] for doc in await expenses_collection.aggregate([{"$group": {"_id": "$user_id"}}])]
+
+
+async def rebuild_user(expenses_collection, rollups_collection, user_id: str) -> int:
+    """Replace one user's rollup rows with totals recomputed from their expenses.
+
+    Rows are overwritten in place with $set upserts and rows with no expenses
+    left are deleted, so the user's summaries never read an empty rollup
+    mid-rebuild. An expense recorded between the recompute and the write can
+    still be counted twice or missed; the pass repeats until a consistency
+    check for the user comes back clean (ROLLUPS_REBUILD_ATTEMPTS at most).
+    """
+    for _ in range(max(ROLLUPS_REBUILD_ATTEMPTS, 1)):
+        rows = await compute_from_expenses(expenses_collection, user_id)
+        if rows:
+            await _bulk_upsert(rollups_collection, [
+                ({"user_id": u, "day": d, "category_norm": c},
+                 {"$set": {"total": row["total"], "count": row["count"], "category": row["category"]}})
+                for (u, d, c), row in rows.items()])
+        stored = await rollups_collection.find({"user_id": user_id}, {"_id": 1, "day": 1, "category_norm": 1})
+        stale = [doc["_id"] for doc in stored if (user_id, doc["day"], doc["category_norm"]) not in rows]
+        if stale:
+            await rollups_collection.delete_many({"_id": {"$in": stale}})
+        if not await check_consistency(expenses_collection, rollups_collection, user_id):
+            break
+    return len(rows)
+
+
+async def rebuild(expenses_collection, rollups_collection, user_id: Optional[str] = None) -> int:
+    """rebuild_user for one user, or for every user with expenses."""
+    users = [user_id] if user_id else await list_users(expenses_collection)
+    count = 0
+    for user in users:
+        count += await rebuild_user(expenses_collection, rollups_collection, user)
+    return count
+
+
+async def ensure_backfilled(expenses_collection, rollups_collection, migrations_collection) -> int:
+    """Rebuild every user's rollups once per database, then let reads use them.
+
+    Returns the number of rows rebuilt (0 when the marker was already there,
+    or another worker holds the backfill lock; this one then watches for the
+    marker in the background). With ROLLUPS_ENABLED off, inserts skip the
+    rollups, so the marker is removed and the next enabled start backfills again.
+    """
+    global backfilled, _marker_watch
+    if not ROLLUPS_ENABLED:
+        await migrations_collection.delete_many({"_id": BACKFILL_MARKER})
+        return 0
+    if await migrations_collection.count_documents({"_id": BACKFILL_MARKER}):
+        backfilled = True
+        return 0
+    if not await _acquire_backfill_lock(migrations_collection):
+        if _marker_watch is None or _marker_watch.done():
+            _marker_watch = asyncio.get_running_loop().create_task(_watch_marker(migrations_collection))
+        return 0
+    try:
+        count = await rebuild(expenses_collection, rollups_collection)
+        await migrations_collection.update_one({"_id": BACKFILL_MARKER}, {"$set": {"completed_at": datetime.now()}},
+                                               upsert=True)
+    finally:
+        await migrations_collection.delete_many({"_id": BACKFILL_LOCK, "pid": os.getpid()})
+    backfilled = True
+    return count
+
+
+async def _acquire_backfill_lock(migrations_collection) -> bool:
+    """Atomically take the backfill lock; an expired lock can be taken over.
+
+    The upsert only matches an expired lock. A live one makes it insert a
+    second document with the same _id, which the server rejects.
+    """
+    now = datetime.now()
+    try:
+        await migrations_collection.update_one(
+            {"_id": BACKFILL_LOCK, "started_at": {"$lt": now - timedelta(seconds=ROLLUPS_BACKFILL_LOCK_S)}},
+            {"$set": {"started_at": now, "pid": os.getpid()}}, upsert=True)
+    except DuplicateKeyError:
+        return False
+    return True
+
+
+async def _watch_marker(migrations_collection) -> None:
+    global backfilled
+    while not await migrations_collection.count_documents({"_id": BACKFILL_MARKER}):
+        await asyncio.sleep(ROLLUPS_BACKFILL_POLL_S)
+    backfilled = True
+
+
+async def check_consistency(expenses_collection, rollups_collection, user_id: Optional[str] = None,
+                            tolerance: float = 0.005) -> List[Dict]:
+    """Return rows whose stored total/count differ from the raw collection."""
+    expected = await compute_from_expenses(expenses_collection, user_id)
+    stored_docs = await rollups_collection.find({"user_id": user_id} if user_id else {})
+    stored = {(d["user_id"], d["day"], d["category_norm"]): d for d in stored_docs}
+    mismatches = []
+    for key in set(expected) | set(stored):
+        want, have = expected.get(key), stored.get(key)
+        want_total, want_count = (want["total"], want["count"]) if want else (0.0, 0)
+        have_total, have_count = (have["total"], have["count"]) if have else (0.0, 0)
+        if want_count != have_count or abs(want_total - have_total) > tolerance:
+            mismatches.append({"user_id": key[0], "day": key[1], "category_norm": key[2],
+                               "expected": {"total": want_total, "count": want_count},
+                               "stored": {"total": have_total, "count": have_count}})
+    return mismatches
+
+
+async def _main(args):
+    import backend
+
+    backend.initialize_database()
+    if args.command == "rebuild":
+        count = await rebuild(backend.expenses_collection, backend.rollups_collection, args.user)
+        if not args.user:
+            await backend.migrations_collection.update_one(
+                {"_id": BACKFILL_MARKER}, {"$set": {"completed_at": datetime.now()}}, upsert=True)
+        print(f"✅ Rebuilt {count} rollup rows")
+    else:
+        mismatches = await check_consistency(backend.expenses_collection, backend.rollups_collection, args.user)
+        for m in mismatches[:20]:
+            print(f"❌ {m['user_id']} {m['day']:%Y-%m-%d} {m['category_norm']}: "
+                  f"expected {m['expected']} stored {m['stored']}")
+        print(f"{'✅' if not mismatches else '⚠'} {len(mismatches)} inconsistent rollup rows")
+        return 1 if mismatches else 0
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain FinVoice spending rollups")
+    parser.add_argument("command", choices=["rebuild", "check"])
+    parser.add_argument("--user", help="Limit to one user_id")
+    raise SystemExit(asyncio.run(_main(parser.parse_args())))
@@ -0,0 +1,21 @@
+# schemas.py - Structured output models shared by FinVoice modules
+from typing import Optional
+from pydantic import BaseModel, Field
+
+
+class ExpenseIntent(BaseModel):
+    action: str = Field(description="The action user wants: 'add_expense' or 'query_expense'")
+    amount: Optional[float] = Field(description="Expense amount if mentioned, otherwise null")
+    category: Optional[str] = Field(description="Expense category like Food, Transport, etc. or null")
+    description: Optional[str] = Field(description="Description of the expense or query")
+    date: Optional[str] = Field(description="Date if mentioned, otherwise null")
+
+
+class RoutedIntent(BaseModel):
+    """Single-shot router output: the specialist plus expense fields when relevant."""
+    selected_node: str = Field(description="One of: expense_manager, financial_insights, goal_advisor, conversation_manager, exit_handler")
+    action: Optional[str] = Field(default=None, description="Only for expense_manager: 'add_expense' or 'query_expense', otherwise null")
+    amount: Optional[float] = Field(default=None, description="Expense amount if mentioned, otherwise null")
+    category: Optional[str] = Field(default=None, description="Expense category like Food, Transport, etc. or null")
+    description: Optional[str] = Field(default=None, description="Description of the expense or query")
+    date: Optional[str] = Field(default=None, description="Date if mentioned, otherwise null")
@@ -0,0 +1,127 @@
+# serve.py - Production entrypoint for the FinVoice API: N worker processes serving main:app
+#
+# With gunicorn installed, workers are forked from a master that has already
+# imported main.py plus the heavy client/graph libraries (PRELOAD_MODULES), so
+# each extra worker starts in the time its lifespan takes instead of
+# re-importing ~2 s of modules. Without gunicorn, uvicorn's own process manager
+# spawns the workers and every one imports everything itself.
+#
+# Each worker builds its LLM clients, DB pool and compiled workflow in
+# main.lifespan and reports ready on /api/health once warm.
+#
+# Workers share nothing in memory. With more than one:
+#   - conversation history needs SESSION_REDIS_URL, or consecutive turns that
+#     land on different workers lose it (serve.py warns at startup);
+#   - LLM rate limits are split: LLM_RATE_WORKERS is set to the worker count, so
+#     each worker's token buckets get 1/N of LLM_DEFAULT_RPM / TPM and the
+#     fleet stays within the configured account limits;
+#   - /api/metrics and /api/*/stats describe the worker that answered (the
+#     pid is in finvoice_worker_info), not the whole server.
+#
+#   python serve.py --workers 4 --port 8000
+#   python serve.py --server uvicorn            # skip gunicorn even if installed
+#   python serve.py --reload                    # single development process
+import argparse
+import importlib
+import os
+import sys
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+APP = "main:app"
+# Imported in the gunicorn master so forked workers share them copy-on-write
+PRELOAD_MODULES = ("langchain_openai", "openai", "langgraph.graph", "main")
+
+# One by default: see above for what more workers need
+SERVER_WORKERS = int(os.getenv("WEB_CONCURRENCY", "1"))
+SERVER_HOST = os.getenv("HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("PORT", "8000"))
+# Seconds a worker gets to finish in-flight requests and drain the write queue
+SERVER_GRACEFUL_TIMEOUT_S = int(os.getenv("SERVER_GRACEFUL_TIMEOUT_S", "30"))
+SERVER_KEEPALIVE_S = int(os.getenv("SERVER_KEEPALIVE_S", "5"))
+
+
+def gunicorn_available() -> bool:
+    try:
+        import gunicorn  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def uvicorn_worker_class() -> str:
+    try:
+        import uvicorn_worker  # noqa: F401  (uvicorn >= 0.30 moved the worker here)
+        return "uvicorn_worker.UvicornWorker"
+    except ImportError:
+        return "uvicorn.workers.UvicornWorker"
+
+
+def run_gunicorn(args) -> None:
+    from gunicorn.app.base import BaseApplication
+
+    class FinVoiceServer(BaseApplication):
+        def load_config(self):
+            options = {
+                "bind": f"{args.host}:{args.port}",
+                "workers": args.workers,
+                "worker_class": uvicorn_worker_class(),
+                "preload_app": True,
+                "graceful_timeout": args.graceful_timeout,
+                "keepalive": SERVER_KEEPALIVE_S,
+                "loglevel": args.log_level,
+            }
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            # Runs once in the master (preload_app); nothing here may open sockets or event loops
+            for name in PRELOAD_MODULES:
+                importlib.import_module(name)
+            return importlib.import_module("main").app
+
+    FinVoiceServer().run()
+
+
+def run_uvicorn(args) -> None:
+    import uvicorn
+
+    uvicorn.run(APP, host=args.host, port=args.port, workers=None if args.reload else args.workers,
+                reload=args.reload, timeout_graceful_shutdown=args.graceful_timeout,
+                timeout_keep_alive=SERVER_KEEPALIVE_S, log_level=args.log_level)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Run the FinVoice API")
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS)
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--server", choices=("auto", "gunicorn", "uvicorn"), default="auto")
+    parser.add_argument("--graceful-timeout", type=int, default=SERVER_GRACEFUL_TIMEOUT_S)
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--reload", action="store_true", help="single development process with auto-reload")
+    args = parser.parse_args(argv)
+
+    # Workers import main.py by name
+    os.chdir(SERVER_DIR)
+    sys.path.insert(0, SERVER_DIR)
+    if args.server == "gunicorn" and not gunicorn_available():
+        parser.error("gunicorn is not installed (pip install gunicorn)")
+    use_gunicorn = not args.reload and args.server != "uvicorn" and gunicorn_available()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    workers = 1 if args.reload else args.workers
+    # Read by llm_scheduler in every worker (gunicorn's master imports it after this)
+    os.environ["LLM_RATE_WORKERS"] = str(workers)
+    if workers > 1 and not os.getenv("SESSION_REDIS_URL"):
+        print(f"⚠ {workers} workers without SESSION_REDIS_URL: each keeps its own in-memory conversation "
+              "history, so follow-up turns routed to another worker lose context")
+    mode = "reload" if args.reload else f"{args.workers} worker(s)"
+    print(f"🚀 Serving {APP} on {args.host}:{args.port} with {'gunicorn' if use_gunicorn else 'uvicorn'}, {mode}")
+    if use_gunicorn:
+        run_gunicorn(args)
+    else:
+        run_uvicorn(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+# sessions.py - Bounded per-user conversation history for FinVoice AI Assistant
+import os
+import sys
+import json
+import time
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Tuple
+
+SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", "20"))
+SESSION_IDLE_TTL_S = float(os.getenv("SESSION_IDLE_TTL_S", "1800"))
+SESSION_MAX_USERS = int(os.getenv("SESSION_MAX_USERS", "10000"))
+# Optional shared backend so every uvicorn worker sees the same history
+SESSION_REDIS_URL = os.getenv("SESSION_REDIS_URL")
+
+# Idle sessions are swept at most this often, piggy-backed on writes
+_SWEEP_INTERVAL_S = 30.0
+
+
+class Turn:
+    """One message; timestamps are epoch seconds rather than datetime objects."""
+
+    __slots__ = ("role", "content", "timestamp")
+
+    def __init__(self, role: str, content: str, timestamp: Optional[float] = None):
+        self.role = role
+        self.content = content
+        self.timestamp = time.time() if timestamp is None else timestamp
+
+    def to_dict(self) -> Dict:
+        return {"role": self.role, "content": self.content, "timestamp": self.timestamp}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Turn":
+        return cls(data["role"], data["content"], data.get("timestamp"))
+
+
+class Session:
+    __slots__ = ("turns", "last_seen", "summary", "summary_until")
+
+    def __init__(self, max_turns: int):
+        self.turns: deque = deque(maxlen=max_turns)
+        self.last_seen = time.monotonic()
+        # Rolling summary of turns up to (and including) timestamp summary_until
+        self.summary = ""
+        self.summary_until = 0.0
+
+
+# ------------------ Backends ------------------
+class InMemorySessionStore:
+    """Per-worker store: ring buffer of turns per user, idle users evicted oldest-first.
+
+    Sessions are kept in last-seen order, so both the idle sweep and the
+    max-users cap only ever pop from the front.
+    """
+
+    def __init__(self, max_turns: int = SESSION_MAX_TURNS, idle_ttl_s: float = SESSION_IDLE_TTL_S,
+                 max_users: int = SESSION_MAX_USERS):
+        self.max_turns = max_turns
+        self.idle_ttl_s = idle_ttl_s
+        self.max_users = max_users
+        self.evictions = 0
+        self.content_bytes = 0
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._last_sweep = time.monotonic()
+
+    async def append(self, user_id: str, role: str, content: str) -> None:
+        now = time.monotonic()
+        session = self._sessions.get(user_id)
+        if session is None:
+            session = self._sessions[user_id] = Session(self.max_turns)
+        if len(session.turns) == self.max_turns:
+            self.content_bytes -= len(session.turns[0].content)
+        session.turns.append(Turn(role, content))
+        self.content_bytes += len(content)
+        session.last_seen = now
+        self._sessions.move_to_end(user_id)
+
+        while len(self._sessions) > self.max_users:
+            self._drop(next(iter(self._sessions)))
+        if now - self._last_sweep >= _SWEEP_INTERVAL_S:
+            self.evict_idle(now)
+
+    async def history(self, user_id: str) -> List[Turn]:
+        session = self._sessions.get(user_id)
+        if session is None:
+            return []
+        if time.monotonic() - session.last_seen > self.idle_ttl_s:
+            self._drop(user_id)
+            return []
+        return list(session.turns)
+
+    async def get_summary(self, user_id: str) -> Tuple[str, float]:
+        session = self._sessions.get(user_id)
+        return (session.summary, session.summary_until) if session else ("", 0.0)
+
+    async def set_summary(self, user_id: str, summary: str, until: float) -> None:
+        session = self._sessions.get(user_id)
+        if session is not None:
+            self.content_bytes += len(summary) - len(session.summary)
+            session.summary, session.summary_until = summary, until
+
+    async def clear(self, user_id: str) -> None:
+        if user_id in self._sessions:
+            self._drop(user_id, evicted=False)
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        now = time.monotonic() if now is None else now
+        self._last_sweep = now
+        evicted = 0
+        while self._sessions:
+            user_id, session = next(iter(self._sessions.items()))
+            if now - session.last_seen <= self.idle_ttl_s:
+                break
+            self._drop(user_id)
+            evicted += 1
+        return evicted
+
+    def _drop(self, user_id: str, evicted: bool = True) -> None:
+        session = self._sessions.pop(user_id)
+        self.content_bytes -= sum(len(turn.content) for turn in session.turns) + len(session.summary)
+        if evicted:
+            self.evictions += 1
+
+    def snapshot(self) -> Dict:
+        turns = sum(len(s.turns) for s in self._sessions.values())
+        # Container overhead per turn/session plus the message text itself
+        approx_bytes = (self.content_bytes + turns * (sys.getsizeof(Turn("", "", 0.0)) + sys.getsizeof(""))
+                        + len(self._sessions) * (sys.getsizeof(Session(self.max_turns)) + sys.getsizeof(deque())))
+        return {"backend": "memory", "users": len(self._sessions), "turns": turns,
+                "evictions": self.evictions, "content_bytes": self.content_bytes, "approx_bytes": approx_bytes,
+                "max_turns": self.max_turns, "idle_ttl_s": self.idle_ttl_s, "max_users": self.max_users}
+
+
+class RedisSessionStore:
+    """Shared store: one capped Redis list per user, expiring after the idle TTL."""
+
+    def __init__(self, client, max_turns: int = SESSION_MAX_TURNS, idle_ttl_s: float = SESSION_IDLE_TTL_S,
+                 prefix: str = "finvoice:session:"):
+        self.client = client
+        self.max_turns = max_turns
+        self.idle_ttl_s = idle_ttl_s
+        self.prefix = prefix
+
+    async def append(self, user_id: str, role: str, content: str) -> None:
+        key = self.prefix + user_id
+        pipe = self.client.pipeline(transaction=False)
+        pipe.rpush(key, json.dumps(Turn(role, content).to_dict(), ensure_ascii=False))
+        pipe.ltrim(key, -self.max_turns, -1)
+        pipe.expire(key, int(self.idle_ttl_s))
+        await pipe.execute()
+
+    async def history(self, user_id: str) -> List[Turn]:
+        raw = await self.client.lrange(self.prefix + user_id, 0, -1)
+        return [Turn.from_dict(json.loads(item)) for item in raw]
+
+    async def get_summary(self, user_id: str) -> Tuple[str, float]:
+        raw = await self.client.hgetall(self.prefix + user_id + ":summary")
+        return (raw.get("text", ""), float(raw.get("until", 0.0))) if raw else ("", 0.0)
+
+    async def set_summary(self, user_id: str, summary: str, until: float) -> None:
+        key = self.prefix + user_id + ":summary"
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hset(key, mapping={"text": summary, "until": until})
+        pipe.expire(key, int(self.idle_ttl_s))
+        await pipe.execute()
+
+    async def clear(self, user_id: str) -> None:
+        await self.client.delete(self.prefix + user_id, self.prefix + user_id + ":summary")
+
+    def snapshot(self) -> Dict:
+        # Redis reports its own memory (INFO memory); only settings are known here
+        return {"backend": "redis", "max_turns": self.max_turns, "idle_ttl_s": self.idle_ttl_s}
+
+
+_store = None
+
+
+def get_session_store():
+    global _store
+    if _store is None:
+        if SESSION_REDIS_URL:
+            import redis.asyncio as redis_asyncio
+            _store = RedisSessionStore(redis_asyncio.from_url(SESSION_REDIS_URL, decode_responses=True))
+        else:
+            _store = InMemorySessionStore()
+    return _store
+
+
+def set_session_store(store) -> None:
+    global _store
+    _store = store
+
+
+async def record_turn(user_id: str, message: str, response: Optional[str]) -> None:
+    """Store a user message and, if there was one, the assistant's reply."""
+    store = get_session_store()
+    try:
+        await store.append(user_id, "user", message)
+        if response:
+            await store.append(user_id, "assistant", response)
+    except Exception as e:
+        # History is best-effort; a Redis outage must not fail the chat request
+        print(f"⚠ Could not record session turn: {e}")
+
+
+def session_snapshot() -> Dict:
+    return get_session_store().snapshot()
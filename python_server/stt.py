@@ -0,0 +1,184 @@
+# stt.py - Pluggable speech-to-text backends for FinVoice AI Assistant
+import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Union, Tuple, BinaryIO
+from dotenv import load_dotenv
+
+import metrics
+
+load_dotenv()
+
+# "openai" (remote whisper-1) or "local" (faster-whisper on CPU)
+STT_BACKEND = os.getenv("STT_BACKEND", "openai").lower()
+STT_LANGUAGE = os.getenv("STT_LANGUAGE", "en")
+STT_MAX_CONCURRENCY = int(os.getenv("STT_MAX_CONCURRENCY", "8"))
+STT_TIMEOUT_S = float(os.getenv("STT_TIMEOUT_S", "30"))
+
+OPENAI_STT_MODEL = os.getenv("OPENAI_STT_MODEL", "whisper-1")
+
+LOCAL_STT_MODEL = os.getenv("LOCAL_STT_MODEL", "base.en")
+LOCAL_STT_COMPUTE_TYPE = os.getenv("LOCAL_STT_COMPUTE_TYPE", "int8")
+LOCAL_STT_POOL_SIZE = int(os.getenv("LOCAL_STT_POOL_SIZE", "2"))
+LOCAL_STT_CPU_THREADS = int(os.getenv("LOCAL_STT_CPU_THREADS", "2"))
+
+# A file path, or (filename, open binary file) for uploads that never touch disk
+AudioSource = Union[str, Tuple[str, BinaryIO]]
+
+
+class STTBackend:
+    """Turns an audio file into text. Implementations must not block the event loop."""
+    name = "base"
+
+    async def warm_up(self) -> None:
+        pass
+
+    async def transcribe(self, audio: AudioSource) -> str:
+        raise NotImplementedError
+
+
+class OpenAIWhisperBackend(STTBackend):
+    name = "openai"
+
+    def __init__(self, client=None):
+        self.client = client
+
+    async def _create(self, file) -> str:
+        transcription = await self.client.audio.transcriptions.create(
+            model=OPENAI_STT_MODEL,
+            file=file,
+            language=STT_LANGUAGE
+        )
+        return transcription.text
+
+    async def warm_up(self) -> None:
+        if self.client is None:
+            from openai import AsyncOpenAI
+            self.client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), timeout=STT_TIMEOUT_S)
+
+    async def transcribe(self, audio: AudioSource) -> str:
+        await self.warm_up()
+        if not isinstance(audio, str):
+            # The filename tells Whisper the container format (webm, m4a, ...)
+            return await self._create(audio)
+        with open(audio, "rb") as audio_file:
+            return await self._create(audio_file)
+
+
+class LocalWhisperBackend(STTBackend):
+    """faster-whisper models loaded once and shared by all requests through a pool.
+
+    Each pooled model runs on its own executor thread, so at most
+    pool_size transcriptions decode at once and none of them touch the loop.
+    """
+    name = "local"
+
+    def __init__(self, model_size: str = LOCAL_STT_MODEL, pool_size: int = LOCAL_STT_POOL_SIZE,
+                 compute_type: str = LOCAL_STT_COMPUTE_TYPE, cpu_threads: int = LOCAL_STT_CPU_THREADS):
+        self.model_size = model_size
+        self.pool_size = pool_size
+        self.compute_type = compute_type
+        self.cpu_threads = cpu_threads
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="finvoice-stt")
+        self._pool: Optional[asyncio.Queue] = None
+        self._lock = asyncio.Lock()
+
+    def _load_models(self):
+        from faster_whisper import WhisperModel
+        return [WhisperModel(self.model_size, device="cpu", compute_type=self.compute_type,
+                             cpu_threads=self.cpu_threads) for _ in range(self.pool_size)]
+
+    async def warm_up(self) -> None:
+        async with self._lock:
+            if self._pool is not None:
+                return
+            print(f"🔄 Loading local STT model {self.model_size} ({self.compute_type}) x{self.pool_size}...")
+            models = await asyncio.get_running_loop().run_in_executor(self._executor, self._load_models)
+            pool = asyncio.Queue()
+            for model in models:
+                pool.put_nowait(model)
+            self._pool = pool
+            print("✅ Local STT models ready")
+
+    @staticmethod
+    def _run(model, audio: AudioSource) -> str:
+        source = audio if isinstance(audio, str) else audio[1]
+        segments, _info = model.transcribe(source, language=STT_LANGUAGE, beam_size=1, vad_filter=True)
+        return " ".join(segment.text.strip() for segment in segments).strip()
+
+    async def transcribe(self, audio: AudioSource) -> str:
+        """Decode on a pooled model; the model goes back to the pool when decoding ends.
+
+        A cancelled caller (the STT timeout) stops waiting, but the thread keeps
+        the model until it has finished with it, so no two decodes share one.
+        """
+        await self.warm_up()
+        loop, pool = asyncio.get_running_loop(), self._pool
+        model = await pool.get()
+
+        def release():
+            try:
+                loop.call_soon_threadsafe(pool.put_nowait, model)
+            except RuntimeError:
+                # The loop closed first (sync wrappers); nothing else is using the queue
+                pool.put_nowait(model)
+
+        def run():
+            try:
+                return self._run(model, audio)
+            finally:
+                release()
+
+        future = self._executor.submit(run)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # Still queued behind other decodes: it will never run, so hand the model back here
+            if future.cancel():
+                pool.put_nowait(model)
+            raise
+
+
+STT_BACKENDS = {"openai": OpenAIWhisperBackend, "local": LocalWhisperBackend}
+
+_backend: Optional[STTBackend] = None
+# Caps concurrent transcriptions per worker; extra requests wait their turn
+_semaphore = asyncio.Semaphore(STT_MAX_CONCURRENCY)
+
+
+def create_stt_backend(name: str = STT_BACKEND) -> STTBackend:
+    if name not in STT_BACKENDS:
+        raise ValueError(f"Unknown STT_BACKEND '{name}', expected one of {sorted(STT_BACKENDS)}")
+    return STT_BACKENDS[name]()
+
+
+def get_stt_backend() -> STTBackend:
+    global _backend
+    if _backend is None:
+        _backend = create_stt_backend()
+    return _backend
+
+
+def set_stt_backend(backend: STTBackend) -> None:
+    global _backend
+    _backend = backend
+
+
+async def transcribe(audio: AudioSource) -> str:
+    """Transcribe with the configured backend under the concurrency cap and timeout.
+
+    On timeout the awaiting request is cancelled; a local model already
+    decoding stays out of the pool until its thread finishes.
+    """
+    backend = get_stt_backend()
+    async with _semaphore:
+        started = time.perf_counter()
+        try:
+            with metrics.span("stt.transcribe", backend=backend.name):
+                text = await asyncio.wait_for(backend.transcribe(audio), timeout=STT_TIMEOUT_S)
+        except Exception:
+            metrics.record_stt(backend.name, time.perf_counter() - started, error=True)
+            raise
+        metrics.record_stt(backend.name, time.perf_counter() - started)
+        return text
@@ -0,0 +1,273 @@
+# time_resolver.py - Fast date / period resolution for FinVoice AI Assistant
+#
+# Spoken and typed time expressions ("yesterday", "last 3 weeks", "on
+# monday", "in september", "05/10") are matched by precompiled patterns and
+# turned into day-granular spans. Results are memoized on (phrase, reference
+# day); dateparser is only imported for phrases the fast path doesn't know.
+import re
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Dict, NamedTuple, Optional
+
+RESOLVER_CACHE_SIZE = 4096
+
+_NUMBER_WORDS = {"a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+                 "eight": 8, "nine": 9, "ten": 10, "couple of": 2, "few": 3}
+_UNIT_DAYS = {"day": 1, "week": 7, "month": 30, "year": 365}
+_WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+_MONTHS = ["january", "february", "march", "april", "may", "june", "july", "august", "september", "october",
+           "november", "december"]
+
+_NUM = r"(?P<n>\d+|" + "|".join(sorted(map(re.escape, _NUMBER_WORDS), key=len, reverse=True)) + r")"
+_UNIT = r"(?P<unit>day|week|month|year)s?"
+_WEEKDAY = r"(?P<weekday>" + "|".join(w[:3] + f"(?:{w[3:]})?" for w in _WEEKDAYS) + r")"
+_MONTH = r"(?P<month>" + "|".join(m[:3] + f"(?:{m[3:]})?" for m in _MONTHS) + r")"
+
+
+class TimeSpan(NamedTuple):
+    """[start, end) in whole days. trailing=True means it ends today ("last 7 days");
+    lookback=True marks "last/past N units", whose point date is the start."""
+    start: datetime
+    end: datetime
+    trailing: bool
+    label: str
+    lookback: bool = False
+
+    @property
+    def days(self) -> int:
+        return (self.end - self.start).days
+
+
+def _day(value: date) -> datetime:
+    return datetime(value.year, value.month, value.day)
+
+
+def _trailing(today: datetime, days: int, label: str, lookback: bool = False) -> TimeSpan:
+    return TimeSpan(today - timedelta(days=max(days, 1) - 1), today + timedelta(days=1), True, label, lookback)
+
+
+def _point(day: datetime, today: datetime) -> TimeSpan:
+    return TimeSpan(day, day + timedelta(days=1), day == today, day.strftime("%d %b %Y"))
+
+
+def _month_span(month: int, year: Optional[int], today: datetime) -> TimeSpan:
+    if year is None:
+        # A bare month name means its most recent occurrence
+        year = today.year if month <= today.month else today.year - 1
+    start = datetime(year, month, 1)
+    end = datetime(year + (month == 12), month % 12 + 1, 1)
+    if start <= today < end:
+        return TimeSpan(start, today + timedelta(days=1), True, start.strftime("%B %Y"))
+    return TimeSpan(start, end, False, start.strftime("%B %Y"))
+
+
+def _count(match) -> int:
+    n = match.group("n")
+    return int(n) if n.isdigit() else _NUMBER_WORDS[n]
+
+
+def _weekday(match, today: datetime) -> TimeSpan:
+    target = next(i for i, w in enumerate(_WEEKDAYS) if w.startswith(match.group("weekday")[:3]))
+    back = (today.weekday() - target) % 7
+    if back == 0 and match.group(0).startswith("last"):
+        back = 7
+    return _point(today - timedelta(days=back), today)
+
+
+def _numeric_date(match, today: datetime) -> Optional[TimeSpan]:
+    d, m, y = int(match.group("d")), int(match.group("m")), match.group("y")
+    year = today.year if y is None else int(y) + (2000 if len(y) == 2 else 0)
+    try:
+        day = datetime(year, m, d)
+    except ValueError:
+        return None
+    if y is None and day > today:
+        day = day.replace(year=year - 1)
+    return _point(day, today)
+
+
+def _day_month(match, today: datetime) -> Optional[TimeSpan]:
+    month = next(i for i, m in enumerate(_MONTHS, 1) if m.startswith(match.group("month")[:3]))
+    y = match.group("y")
+    try:
+        day = datetime(int(y) if y else today.year, month, int(match.group("d")))
+    except ValueError:
+        return None
+    if not y and day > today:
+        day = day.replace(year=day.year - 1)
+    return _point(day, today)
+
+
+def _month_name(match, today: datetime) -> TimeSpan:
+    month = next(i for i, m in enumerate(_MONTHS, 1) if m.startswith(match.group("month")[:3]))
+    year = match.group("year")
+    return _month_span(month, int(year) if year else None, today)
+
+
+def _build_rules(search: bool):
+    """(pattern, handler(match, today)) pairs; the first full match wins, so longer
+    phrases come before their prefixes.
+
+    Searching free text is stricter: abbreviations ("sat", "may") and "12.5"
+    style dates are too easily confused with ordinary words and amounts.
+    """
+    if search:
+        weekday = r"(?P<weekday>" + "|".join(_WEEKDAYS) + r")"
+        month = r"(?P<month>" + "|".join(_MONTHS) + r")"
+        bare_month = rf"(?:(?P<prep>in|during|for|of) )?{month}(?: (?P<year>\d{{4}}))?"
+        # "in september" / "september 2026" only; a bare "may" is usually the verb
+        month_handler = lambda m, t: _month_name(m, t) if m.group("prep") or m.group("year") else None
+        separators = "[/-]"
+    else:
+        weekday, month = _WEEKDAY, _MONTH
+        bare_month = rf"(?:in |during |for )?{month}(?: (?P<year>\d{{4}}))?"
+        month_handler = _month_name
+        separators = "[/.-]"
+    # In a question "now" is the end of a range ("spent till now"), not a day of its own
+    today = (r"today|tonight|this (?:morning|afternoon|evening)" if search
+             else r"today|tonight|this (?:morning|afternoon|evening)|right now|just now|now")
+    return [
+        (r"day before yesterday", lambda m, t: _point(t - timedelta(days=2), t)),
+        (today, lambda m, t: _point(t, t)),
+        (r"yesterday|last night", lambda m, t: _point(t - timedelta(days=1), t)),
+        (rf"(?:last|past|previous) {_NUM} {_UNIT}",
+         lambda m, t: _trailing(t, _count(m) * _UNIT_DAYS[m.group("unit")], m.group(0), lookback=True)),
+        (rf"{_NUM} {_UNIT} ago",
+         lambda m, t: _point(t - timedelta(days=_count(m) * _UNIT_DAYS[m.group("unit")]), t)),
+        (rf"(?:last|past|previous) {_UNIT}",
+         lambda m, t: _trailing(t, _UNIT_DAYS[m.group("unit")], m.group(0), lookback=True)),
+        (r"this week", lambda m, t: _trailing(t, t.weekday() + 1, "this week")),
+        (r"this month", lambda m, t: _month_span(t.month, t.year, t)),
+        (r"this year", lambda m, t: _trailing(t, t.timetuple().tm_yday, "this year")),
+        (rf"(?:on |last )?{weekday}", _weekday),
+        (r"(?P<y>\d{4})-(?P<m>\d{1,2})-(?P<d>\d{1,2})", _numeric_date),
+        (rf"(?P<d>\d{{1,2}}){separators}(?P<m>\d{{1,2}})(?:{separators}(?P<y>\d{{4}}|\d{{2}}))?", _numeric_date),
+        (rf"(?P<d>\d{{1,2}})(?:st|nd|rd|th)? (?:of )?{month}(?: (?P<y>\d{{4}}))?", _day_month),
+        (rf"{month} (?P<d>\d{{1,2}})(?:st|nd|rd|th)?(?: (?P<y>\d{{4}}))?", _day_month),
+        (bare_month, month_handler),
+    ]
+
+
+_FULL = [(re.compile(rf"^(?:{pattern})$"), handler) for pattern, handler in _build_rules(search=False)]
+_SEARCH = [(re.compile(rf"\b(?:{pattern})\b"), handler) for pattern, handler in _build_rules(search=True)]
+# "since monday" / "since 5th oct": from that day up to and including today
+_SINCE = re.compile(r"\bsince (?P<rest>.+)$")
+
+
+def _since(span: Optional[TimeSpan], today: datetime) -> Optional[TimeSpan]:
+    if span is None or span.start > today:
+        return None
+    label = span.label if span.label.startswith(("last ", "past ", "previous ", "this ")) else f"since {span.label}"
+    return TimeSpan(span.start, today + timedelta(days=1), True, label)
+
+
+# ------------------ Metrics ------------------
+class ResolverStats:
+    """How phrases were resolved: fast path, dateparser fallback, or not at all."""
+
+    def __init__(self):
+        self.counts = defaultdict(int)
+
+    def record(self, outcome: str):
+        self.counts[outcome] += 1
+
+    def snapshot(self) -> Dict:
+        info = _resolve.cache_info()
+        return {**self.counts, "cache_hits": info.hits, "cache_misses": info.misses}
+
+
+resolver_stats = ResolverStats()
+
+
+def _normalize(phrase: str) -> str:
+    return " ".join(phrase.lower().replace(",", " ").split())
+
+
+@lru_cache(maxsize=RESOLVER_CACHE_SIZE)
+def _resolve(phrase: str, today: date, fallback: bool = True) -> Optional[TimeSpan]:
+    midnight = _day(today)
+    since = _SINCE.match(phrase)
+    if since:
+        return _since(_resolve(since.group("rest"), today, fallback), midnight)
+    for pattern, handler in _FULL:
+        match = pattern.match(phrase)
+        if match:
+            span = handler(match, midnight)
+            if span is not None:
+                resolver_stats.record("fast")
+                return span
+    if not fallback:
+        resolver_stats.record("unresolved")
+        return None
+    import dateparser  # slow to import; only phrases the patterns don't cover get here
+    parsed = dateparser.parse(phrase, settings={"PREFER_DATES_FROM": "past", "DATE_ORDER": "DMY",
+                                                "RELATIVE_BASE": midnight})
+    if parsed is None:
+        resolver_stats.record("unresolved")
+        return None
+    resolver_stats.record("dateparser")
+    return _point(_day(parsed.date()), midnight)
+
+
+def resolve_span(phrase: Optional[str], ref: Optional[datetime] = None, fallback: bool = True) -> Optional[TimeSpan]:
+    """Resolve a whole phrase ("last 2 weeks", "5th oct") to a span, or None.
+
+    fallback=False skips dateparser: only the precompiled patterns are tried.
+    """
+    if not phrase or not phrase.strip():
+        return None
+    return _resolve(_normalize(phrase), (ref or datetime.now()).date(), fallback)
+
+
+def resolve_date(phrase: Optional[str], ref: Optional[datetime] = None, fallback: bool = True) -> Optional[datetime]:
+    """Point in time for an expense date: `ref` itself for "today"/"this week",
+    otherwise the span's first day ("last week" -> a week ago)."""
+    ref = ref or datetime.now()
+    span = resolve_span(phrase, ref, fallback)
+    if span is None:
+        return None
+    return ref if span.start <= ref < span.end and not span.lookback else span.start
+
+
+# A spending question's date slot holding only these means "up to now": no span, the caller's default applies
+_OPEN_ENDED = {"now", "right now", "just now", "till now", "until now", "up to now", "so far", "till date", "to date"}
+
+
+def resolve_query_span(phrase: Optional[str], ref: Optional[datetime] = None) -> Optional[TimeSpan]:
+    """resolve_span for the period of a spending question, where a bare "now" isn't a single day."""
+    if phrase and _normalize(phrase) in _OPEN_ENDED:
+        return None
+    return resolve_span(phrase, ref)
+
+
+@lru_cache(maxsize=RESOLVER_CACHE_SIZE)
+def _find(text: str, today: date) -> Optional[TimeSpan]:
+    midnight = _day(today)
+    since = _SINCE.search(text)
+    if since:
+        span = _since(_find(since.group("rest"), today), midnight)
+        if span is not None:
+            return span
+    candidates = []
+    for order, (pattern, handler) in enumerate(_SEARCH):
+        match = pattern.search(text)
+        if match:
+            candidates.append((match.start(), order, match, handler))
+    for _, _, match, handler in sorted(candidates, key=lambda c: c[:2]):
+        span = handler(match, midnight)
+        if span is not None:
+            return span
+    return None
+
+
+def find_span(text: Optional[str], ref: Optional[datetime] = None) -> Optional[TimeSpan]:
+    """First time expression inside free text ("how much on food last month?").
+
+    "since <day>" runs from that day through today; "now" on its own ("spent
+    till now") is not a time expression here. Fast path only: free text is
+    never handed to dateparser.
+    """
+    if not text:
+        return None
+    return _find(_normalize(text), (ref or datetime.now()).date())
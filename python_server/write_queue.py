@@ -0,0 +1,93 @@
+# write_queue.py - Fire-and-forget persistence for FinVoice AI Assistant
+#
+# Writes the reply doesn't depend on (goal history, ...) are queued and run
+# by a few worker tasks after the response has gone out. The queue is
+# bounded: when it is full a producer waits up to WRITE_QUEUE_PUT_TIMEOUT_S
+# for room and otherwise performs the write itself, so a slow database
+# slows requests down instead of growing memory without limit.
+import os
+import asyncio
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict
+
+WRITE_QUEUE_ENABLED = os.getenv("WRITE_QUEUE_ENABLED", "true").lower() in ("1", "true", "yes")
+WRITE_QUEUE_MAX_SIZE = int(os.getenv("WRITE_QUEUE_MAX_SIZE", "1000"))
+WRITE_QUEUE_WORKERS = int(os.getenv("WRITE_QUEUE_WORKERS", "2"))
+WRITE_QUEUE_PUT_TIMEOUT_S = float(os.getenv("WRITE_QUEUE_PUT_TIMEOUT_S", "0.05"))
+
+Write = Callable[[], Awaitable]
+
+
+class WriteQueue:
+    def __init__(self, max_size: int = WRITE_QUEUE_MAX_SIZE, workers: int = WRITE_QUEUE_WORKERS,
+                 put_timeout_s: float = WRITE_QUEUE_PUT_TIMEOUT_S):
+        self.max_size = max_size
+        self.workers = workers
+        self.put_timeout_s = put_timeout_s
+        self.counts = defaultdict(int)
+        self.max_depth = 0
+        self._queue = None
+        self._loop = None
+        self._tasks = []
+
+    def _ensure_started(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # First use, or a new event loop (process_message_sync): old workers died with theirs
+            self._queue = asyncio.Queue(maxsize=self.max_size)
+            self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+            self._loop = loop
+
+    async def submit(self, name: str, write: Write) -> None:
+        """Queue `write` (a zero-argument coroutine function); returns once it is queued."""
+        if not WRITE_QUEUE_ENABLED:
+            self.counts["inline"] += 1
+            await self._run(name, write)
+            return
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((name, write))
+        except asyncio.QueueFull:
+            try:
+                await asyncio.wait_for(self._queue.put((name, write)), self.put_timeout_s)
+            except asyncio.TimeoutError:
+                self.counts["inline"] += 1
+                await self._run(name, write)
+                return
+        self.counts["queued"] += 1
+        self.max_depth = max(self.max_depth, self._queue.qsize())
+
+    async def _run(self, name: str, write: Write) -> None:
+        try:
+            await write()
+            self.counts["written"] += 1
+        except Exception as e:
+            self.counts["failed"] += 1
+            print(f"⚠ Background write '{name}' failed: {e}")
+
+    async def _worker(self) -> None:
+        while True:
+            name, write = await self._queue.get()
+            try:
+                await self._run(name, write)
+            finally:
+                self._queue.task_done()
+
+    async def drain(self, timeout_s: float = 5.0) -> bool:
+        """Wait for queued writes to finish (shutdown, sync wrappers); False on timeout."""
+        if self._queue is None or self._loop is not asyncio.get_running_loop():
+            return True
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout_s)
+            return True
+        except asyncio.TimeoutError:
+            print(f"⚠ {self._queue.qsize()} background write(s) still pending after {timeout_s}s")
+            return False
+
+    def snapshot(self) -> Dict:
+        return {"enabled": WRITE_QUEUE_ENABLED, "depth": self._queue.qsize() if self._queue else 0,
+                "max_depth": self.max_depth, "max_size": self.max_size, "workers": self.workers,
+                **{k: self.counts[k] for k in ("queued", "inline", "written", "failed")}}
+
+
+write_queue = WriteQueue()